@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/1.10/ref/settings/
 """
 
 import os
+from datetime import timedelta
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -267,6 +268,21 @@ REDIS_SETTINGS = {
         }
 }
 
+# Redis连接池配置（每个worker进程、每个db共用一个连接池）
+REDIS_POOL_SETTINGS = {
+    'socket_timeout': 5,               # 读写超时（秒）
+    'socket_connect_timeout': 2,       # 连接超时（秒）
+    'max_connections': 64,             # 连接池最大连接数
+    'health_check_interval': 30,       # 连接空闲超过该时间（秒），使用前先检查连接
+}
+
+# 进程内缓存（每个worker进程一份）配置
+LOCAL_CACHE_SETTINGS = {
+    'max_entries': 10000,              # 最大缓存条数
+    'max_bytes': 32 * 1024 * 1024,     # 最大占用内存（字节）
+    'timeout': 60,                     # 过期时间（秒）
+}
+
 # CELERY STUFF
 BROKER_URL = 'redis://%s:%d' % (REDIS_SETTINGS['host'], REDIS_SETTINGS['port'])
 CELERY_RESULT_BACKEND = 'redis://%s:%d' % (REDIS_SETTINGS['host'], REDIS_SETTINGS['port'])
@@ -275,5 +291,58 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'Africa/Nairobi'
 
+# 定时任务
+CELERYBEAT_SCHEDULE = {
+    # 资源相关数量（浏览、点赞、收藏及评论数量）从缓存批量写回数据库
+    'flush-relevant-count-to-db': {
+        'task': 'media.tasks.flush_relevant_count_to_db',
+        'schedule': timedelta(seconds=30),
+    },
+    # 资源相关数量数据校正
+    'reconcile-relevant-count': {
+        'task': 'media.tasks.reconcile_relevant_count',
+        'schedule': timedelta(days=1),
+    },
+    # 热门搜索结果预热
+    'warm-hot-search-queries': {
+        'task': 'media.tasks.warm_hot_search_queries',
+        'schedule': timedelta(minutes=5),
+    },
+    # 重建联想索引
+    'rebuild-suggest-index': {
+        'task': 'media.tasks.rebuild_suggest_index',
+        'schedule': timedelta(hours=1),
+    },
+    # 全量重新计算相关资源（推荐资源、相关案例、相关文章）
+    'rebuild-related-items': {
+        'task': 'media.tasks.rebuild_related_items',
+        'schedule': timedelta(days=1),
+    },
+}
+
+# 批量资源匹配的计分进程池（每个uwsgi worker一个）的进程数，0为不使用进程池
+MATCH_BATCH_PROCESSES = 0
+
+# 日志：未单独配置的日志（如缓存更新失败）输出到标准错误（uwsgi日志）
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'verbose': {
+            'format': '%(asctime)s %(levelname)s %(name)s %(message)s',
+        },
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'verbose',
+        },
+    },
+    'root': {
+        'handlers': ['console'],
+        'level': 'WARNING',
+    },
+}
+
 # 默认文件存储器
 DEFAULT_FILE_STORAGE = 'horizon.storage.YSFileSystemStorage'
@@ -92,4 +92,20 @@ class Collect(models.Model):
         instances = cls.filter_objects(**kwargs)
         if isinstance(instances, Exception):
             return 0
-        return len(instances)
+        return instances.count()
+
+    @classmethod
+    def get_collection_count_dict(cls, source_type, source_ids=None):
+        """
+        获取某类资源的收藏数字典（以资源ID为Key，收藏数为Value）
+        source_ids: 只统计这些资源（为None时统计全部资源）
+        """
+        kwargs = {'source_type': source_type}
+        if source_ids is not None:
+            kwargs['source_id__in'] = source_ids
+        instances = cls.filter_objects(**kwargs)
+        if isinstance(instances, Exception):
+            return instances
+        # 清除Meta.ordering，否则排序字段会加入GROUP BY，同一资源被拆成多行
+        count_list = instances.order_by().values('source_id').annotate(count=models.Count('id'))
+        return {item['source_id']: item['count'] for item in count_list}
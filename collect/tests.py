@@ -1,3 +1,27 @@
+# -*- coding:utf8 -*-
+from __future__ import unicode_literals
+
+import datetime
+
 from django.test import TestCase
+from django.utils.timezone import now
+
+from collect.models import Collect
+
+
+class CollectionCountTestCase(TestCase):
+    def test_get_collection_count_dict(self):
+        updated = now()
+        rows = [(1, 1, 10), (2, 1, 10), (3, 1, 10), (1, 1, 11), (2, 1, 11), (1, 2, 10)]
+        for index, (user_id, source_type, source_id) in enumerate(rows):
+            ins = Collect.objects.create(user_id=user_id, source_type=source_type,
+                                         source_id=source_id)
+            # 每行的更新时间不同（Meta.ordering的字段）
+            Collect.objects.filter(pk=ins.pk).update(
+                updated=updated - datetime.timedelta(minutes=index))
+        # 已取消的收藏不计数
+        Collect.objects.create(user_id=4, source_type=1, source_id=10, status=0)
 
-# Create your tests here.
+        self.assertEqual(Collect.get_collection_count_dict(1), {10: 3, 11: 2})
+        self.assertEqual(Collect.get_collection_count_dict(2), {10: 1})
+        self.assertEqual(Collect.get_collection_count_dict(3), {})
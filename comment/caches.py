@@ -3,8 +3,9 @@ from __future__ import unicode_literals
 import json
 import datetime
 
-from django.conf import settings
-from horizon import redis
+from horizon.caches import BaseCache
+from horizon.serializers import LazyList
+from horizon.pagination import keyset_page
 from django.utils.timezone import now
 
 from comment.models import (Comment,
@@ -16,88 +17,70 @@ EXPIRES_24_HOURS = 24 * 60 * 60
 EXPIRES_10_HOURS = 10 * 60 * 60
 
 
-class CommentCache(object):
-    def __init__(self):
-        pool = redis.ConnectionPool(host=settings.REDIS_SETTINGS['host'],
-                                    port=settings.REDIS_SETTINGS['port'],
-                                    db=settings.REDIS_SETTINGS['db_set']['web'])
-        self.handle = redis.Redis(connection_pool=pool)
+class CommentCache(BaseCache):
+    use_local_cache = True
 
     def get_comment_list_user_id_key(self, user_id):
-        return 'comment:list:user_id:%s' % user_id
+        return self.make_key('comment:list:user_id', user_id)
 
     def get_comment_list_source_id_key(self, source_type, source_id):
-        return 'comment:list:source_id:%s-%s' % (source_type, source_id)
+        return self.make_key('comment:list:source_id:%s' % source_type, source_id)
 
     def get_comment_detail_id_key(self, comment_id):
-        return 'comment_detail:comment_id:%s' % comment_id
-
-    def set_instance_to_cache(self, key, data):
-        self.handle.set(key, data)
-        self.handle.expire(key, EXPIRES_24_HOURS)
-
-    def get_instance_from_cache(self, key):
-        return self.handle.get(key)
-
-    def set_list_to_cache(self, key, *list_data):
-        self.handle.delete(key)
-        self.handle.rpush(key, *list_data)
-        self.handle.expire(key, EXPIRES_24_HOURS)
-
-    def get_list_from_cache(self, key, start=0, end=-1):
-        return self.handle.lrange(key, start, end)
-
-    def get_perfect_data(self, key, model_function, **kwargs):
-        data = self.get_instance_from_cache(key)
-        if not data:
-            data = model_function(**kwargs)
-            if isinstance(data, Exception):
-                return data
-            self.set_instance_to_cache(key, data)
-        return data
+        return self.make_key('comment_detail:comment_id', comment_id)
 
     def get_perfect_list_data(self, key, model_function, **kwargs):
-        list_data = self.get_list_from_cache(key)
-        if not list_data:
+        strings = self.get_list_strings_from_cache(key)
+        if not strings:
             list_data = model_function(**kwargs)
             if isinstance(list_data, Exception):
                 return list_data
 
-            # 把每条评论逐次添加都缓存中
-            for item_data in list_data:
-                detail_key = self.get_comment_detail_id_key(item_data['id'])
-                if not self.get_instance_from_cache(detail_key):
-                    self.set_instance_to_cache(detail_key, item_data)
+            # 评论详情在一个pipeline中批量写入缓存
+            self.set_instances_to_cache({self.get_comment_detail_id_key(item_data['id']): item_data
+                                         for item_data in list_data})
             # 生成评论列表
             perfect_list_data = [item['id'] for item in list_data]
             self.set_list_to_cache(key, *perfect_list_data)
             return perfect_list_data
-        return list_data
+        return self.translate_list_strings(strings)
 
-    # 获取用户评论列表
+    # 获取用户评论列表（LazyList，分页时只获取当前页的评论详情）
     def get_comment_list_by_user_id(self, user_id):
         key = self.get_comment_list_user_id_key(user_id)
         kwargs = {'user_id': user_id}
         ids_list = self.get_perfect_list_data(key, Comment.filter_details, **kwargs)
-        return self.get_perfect_list_data_by_ids(ids_list)
+        if isinstance(ids_list, Exception):
+            return ids_list
+        return LazyList(ids_list, self.get_perfect_list_data_by_ids)
 
-    # 获取资源的评论列表
+    # 获取资源的评论列表（LazyList，分页时只获取当前页的评论详情）
     def get_comment_list_by_source_id(self, source_type, source_id):
         key = self.get_comment_list_source_id_key(source_type, source_id)
         kwargs = {'source_type': source_type,
                   'source_id': source_id}
         ids_list = self.get_perfect_list_data(key, Comment.filter_details, **kwargs)
-        return self.get_perfect_list_data_by_ids(ids_list)
+        if isinstance(ids_list, Exception):
+            return ids_list
+        return LazyList(ids_list, self.get_perfect_list_data_by_ids)
+
+    # 游标分页获取评论列表，返回：(当前页的评论详情列表, 下一页的游标)
+    def get_comment_list_by_cursor(self, cursor, page_size, **kwargs):
+        instances = Comment.filter_objects(**kwargs)
+        if isinstance(instances, Exception):
+            return instances
+        result = keyset_page(instances.only('id', 'created'), cursor, page_size)
+        if isinstance(result, Exception):
+            return result
+        instances, next_cursor = result
+        return self.get_perfect_list_data_by_ids([ins.id for ins in instances]), next_cursor
 
     def get_perfect_list_data_by_ids(self, ids_list):
-        perfect_list_data = []
-        for comment_id in ids_list:
-            id_key = self.get_comment_detail_id_key(comment_id)
-            kwargs = {'id': comment_id}
-            detail = self.get_perfect_data(id_key, Comment.get_detail, **kwargs)
-            if isinstance(detail, Exception):
-                continue
-            perfect_list_data.append(detail)
+        perfect_list_data = self.get_perfect_data_by_ids(ids_list,
+                                                         self.get_comment_detail_id_key,
+                                                         Comment.filter_details)
+        if isinstance(perfect_list_data, Exception):
+            return []
         return perfect_list_data
 
     # 从用户评论列表中删除评论数据
@@ -114,19 +97,23 @@ class CommentCache(object):
         ids_list = self.get_list_from_cache(key)
         if comment_id in ids_list:
             ids_list.remove(comment_id)
-            self.set_list_to_cache(key, ids_list)
+            self.set_list_to_cache(key, *ids_list)
             return 1
         return 0
 
     # 往用户评论列表中添加评论数据
     def add_comment_to_user_comment_list(self, user_id, comment_id):
         key = self.get_comment_list_user_id_key(user_id)
-        return self.handle.lpushx(key, comment_id)
+        result = self.handle.lpushx(key, comment_id)
+        self.invalidate_local_cache(key)
+        return result
 
     # 往资源评论列表中添加评论数据
     def add_comment_to_source_comment_list(self, source_type, source_id, comment_id):
         key = self.get_comment_list_source_id_key(source_type, source_id)
-        return self.handle.lpushx(key, comment_id)
+        result = self.handle.lpushx(key, comment_id)
+        self.invalidate_local_cache(key)
+        return result
 
 
 class CommentOpinionModelAction(object):
@@ -16,6 +16,8 @@ class CommentInputForm(forms.Form):
 class CommentListForm(forms.Form):
     page_index = forms.IntegerField(min_value=1, required=False)
     page_size = forms.IntegerField(min_value=1, required=False)
+    # 游标分页：第一页传"start"，之后传上一页返回的next_cursor
+    cursor = forms.CharField(max_length=128, required=False)
 
 
 class CommentDetailForm(forms.Form):
@@ -31,6 +33,8 @@ class CommentForResourceListForm(forms.Form):
     source_id = forms.IntegerField()
     page_index = forms.IntegerField(min_value=1, required=False)
     page_size = forms.IntegerField(min_value=1, required=False)
+    # 游标分页：第一页传"start"，之后传上一页返回的next_cursor
+    cursor = forms.CharField(max_length=128, required=False)
 
 
 class CommentOpinionActionForm(forms.Form):
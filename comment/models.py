@@ -131,12 +131,15 @@ class Comment(models.Model):
     @classmethod
     def filter_details(cls, **kwargs):
         instances = cls.filter_objects(**kwargs)
+        if isinstance(instances, Exception):
+            return instances
+
         details = []
         for ins in instances:
             per_detail = ins.perfect_detail
             if isinstance(per_detail, Exception):
                 continue
-            details.append(ins.perfect_detail)
+            details.append(per_detail)
         return details
 
     @classmethod
@@ -156,7 +159,23 @@ class Comment(models.Model):
         instances = cls.filter_objects(**kwargs)
         if isinstance(instances, Exception):
             return 0
-        return len(instances)
+        return instances.count()
+
+    @classmethod
+    def get_comment_count_dict(cls, source_type, source_ids=None):
+        """
+        获取某类资源的评论数字典（以资源ID为Key，评论数为Value）
+        source_ids: 只统计这些资源（为None时统计全部资源）
+        """
+        kwargs = {'source_type': source_type}
+        if source_ids is not None:
+            kwargs['source_id__in'] = source_ids
+        instances = cls.filter_objects(**kwargs)
+        if isinstance(instances, Exception):
+            return instances
+        # 清除Meta.ordering，否则排序字段会加入GROUP BY，同一资源被拆成多行
+        count_list = instances.order_by().values('source_id').annotate(count=models.Count('id'))
+        return {item['source_id']: item['count'] for item in count_list}
 
 
 class ReplyComment(models.Model):
@@ -1,3 +1,27 @@
+# -*- coding:utf8 -*-
+from __future__ import unicode_literals
+
+import datetime
+
 from django.test import TestCase
+from django.utils.timezone import now
+
+from comment.models import Comment
+
+
+class CommentCountTestCase(TestCase):
+    def test_get_comment_count_dict(self):
+        created = now()
+        rows = [(1, 1, 10), (2, 1, 10), (3, 1, 10), (1, 1, 11), (2, 1, 11), (1, 3, 10)]
+        for index, (user_id, source_type, source_id) in enumerate(rows):
+            # 每行的创建时间不同（Meta.ordering的字段）
+            Comment.objects.create(user_id=user_id, source_type=source_type,
+                                   source_id=source_id, content='content',
+                                   created=created - datetime.timedelta(minutes=index))
+        # 已删除的点评不计数
+        Comment.objects.create(user_id=4, source_type=1, source_id=10,
+                               content='content', status=0)
 
-# Create your tests here.
+        self.assertEqual(Comment.get_comment_count_dict(1), {10: 3, 11: 2})
+        self.assertEqual(Comment.get_comment_count_dict(3), {10: 1})
+        self.assertEqual(Comment.get_comment_count_dict(2), {})
@@ -2,6 +2,7 @@
 from rest_framework import generics
 from rest_framework.response import Response
 from rest_framework import status
+from django.conf import settings
 
 from horizon.views import APIView
 from comment.serializers import (CommentSerializer,
@@ -107,17 +108,30 @@ class CommentList(generics.GenericAPIView):
         return CommentCache().get_comment_list_by_user_id(request.user.id)
         # return Comment.filter_details(user_id=request.user.id)
 
+    def get_cursor_response(self, request, cld):
+        page_size = min(cld.get('page_size') or settings.PAGE_SIZE, settings.MAX_PAGE_SIZE)
+        result = CommentCache().get_comment_list_by_cursor(cld['cursor'], page_size,
+                                                           user_id=request.user.id)
+        if isinstance(result, Exception):
+            return Response({'Detail': result.args}, status=status.HTTP_400_BAD_REQUEST)
+        details, next_cursor = result
+        serializer = CommentListSerializer(data=details)
+        if not serializer.is_valid():
+            return Response({'Detail': serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(serializer.cursor_data(next_cursor), status=status.HTTP_200_OK)
+
     def post(self, request, *args, **kwargs):
         form = CommentListForm(request.data)
         if not form.is_valid():
             return Response({'Detail': form.errors}, status=status.HTTP_400_BAD_REQUEST)
 
         cld = form.cleaned_data
+        if cld.get('cursor'):
+            return self.get_cursor_response(request, cld)
         details = self.get_comment_detail_list(request)
-        serializer = CommentListSerializer(data=details)
-        if not serializer.is_valid():
-            return Response({'Detail': serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
-        data_list = serializer.list_data(**cld)
+        if isinstance(details, Exception):
+            return Response({'Detail': details.args}, status=status.HTTP_400_BAD_REQUEST)
+        data_list = CommentListSerializer.lazy_list_data(details, **cld)
         if isinstance(data_list, Exception):
             return Response({'Detail': data_list.args}, status=status.HTTP_400_BAD_REQUEST)
         return Response(data_list, status=status.HTTP_200_OK)
@@ -159,17 +173,31 @@ class CommentForResourceList(APIView):
         return CommentCache().get_comment_list_by_source_id(**kwargs)
         # return Comment.filter_details(**kwargs)
 
+    def get_cursor_response(self, cld):
+        page_size = min(cld.get('page_size') or settings.PAGE_SIZE, settings.MAX_PAGE_SIZE)
+        result = CommentCache().get_comment_list_by_cursor(cld['cursor'], page_size,
+                                                           source_type=cld['source_type'],
+                                                           source_id=cld['source_id'])
+        if isinstance(result, Exception):
+            return Response({'Detail': result.args}, status=status.HTTP_400_BAD_REQUEST)
+        details, next_cursor = result
+        serializer = CommentListSerializer(data=details)
+        if not serializer.is_valid():
+            return Response({'Detail': serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(serializer.cursor_data(next_cursor), status=status.HTTP_200_OK)
+
     def post(self, request, *args, **kwargs):
         form = CommentForResourceListForm(request.data)
         if not form.is_valid():
             return Response({'Detail': form.errors}, status=status.HTTP_400_BAD_REQUEST)
 
         cld = form.cleaned_data
+        if cld.get('cursor'):
+            return self.get_cursor_response(cld)
         comment_list = self.get_comment_list(cld['source_type'], cld['source_id'])
-        serializer = CommentListSerializer(data=comment_list)
-        if not serializer.is_valid():
-            return Response({'Detail': serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
-        list_data = serializer.list_data(**cld)
+        if isinstance(comment_list, Exception):
+            return Response({'Detail': comment_list.args}, status=status.HTTP_400_BAD_REQUEST)
+        list_data = CommentListSerializer.lazy_list_data(comment_list, **cld)
         if isinstance(list_data, Exception):
             return Response({'Detail': list_data.args}, status=status.HTTP_400_BAD_REQUEST)
         return Response(list_data, status=status.HTTP_200_OK)
@@ -0,0 +1,35 @@
+# -*- coding:utf8 -*-
+"""
+命名空间代数加1，使该命名空间下的全部缓存失效（旧Key等待过期后自动删除）
+
+用法：
+    python manage.py bump_cache_generation media:id                 # 全部媒体资源详情
+    python manage.py bump_cache_generation comment:list:source_id:2  # 案例的全部评论列表
+    python manage.py bump_cache_generation --list                   # 查看各命名空间当前代数
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from horizon.caches import BaseCache
+
+
+class Command(BaseCommand):
+    help = 'Bump the generation of cache namespaces to invalidate all their keys.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('namespaces', nargs='*',
+                            help='Namespaces to bump, e.g. media:id or comment:list:source_id:2.')
+        parser.add_argument('--list', action='store_true', dest='list', default=False,
+                            help='Show the current generation of every bumped namespace.')
+
+    def handle(self, *args, **options):
+        cache = BaseCache()
+        if options['list']:
+            for namespace, generation in sorted(cache.get_generations().items()):
+                self.stdout.write('%s\t%d' % (namespace, generation))
+            return
+
+        if not options['namespaces']:
+            raise CommandError('Give at least one namespace, or --list.')
+        for namespace in options['namespaces']:
+            generation = cache.bump_generation(namespace)
+            self.stdout.write('%s -> g%d' % (namespace, generation))
@@ -1,3 +1,4 @@
+# -*- coding:utf8 -*-
 from __future__ import unicode_literals
 
 from django.apps import AppConfig
@@ -5,3 +6,7 @@ from django.apps import AppConfig
 
 class DimensionsConfig(AppConfig):
     name = 'dimensions'
+
+    def ready(self):
+        # 注册配置变更时使匹配索引失效的信号处理函数
+        import dimensions.signals
@@ -1,10 +1,10 @@
 # -*- coding:utf8 -*-
 from __future__ import unicode_literals
+import hashlib
 import json
 import datetime
 
-from django.conf import settings
-from horizon import redis
+from horizon.caches import BaseCache
 from django.utils.timezone import now
 
 from dimensions.models import (Dimension,
@@ -12,71 +12,39 @@ from dimensions.models import (Dimension,
                                Tag,
                                TagConfigure,
                                AdjustCoefficient)
+from dimensions.match_index import MatchIndex
+from dimensions.taxonomy import TaxonomyCache
 
 # 过期时间（单位：秒）
 EXPIRES_24_HOURS = 24 * 60 * 60
 EXPIRES_10_HOURS = 10 * 60 * 60
+# 资源匹配结果的过期时间（资源热度的变化最多延迟该时间反映到匹配结果中）
+MATCH_RESULT_EXPIRES = 10 * 60
 
 
-class DimensionCache(object):
-    def __init__(self):
-        pool = redis.ConnectionPool(host=settings.REDIS_SETTINGS['host'],
-                                    port=settings.REDIS_SETTINGS['port'],
-                                    db=settings.REDIS_SETTINGS['db_set']['web'])
-        self.handle = redis.Redis(connection_pool=pool)
+class DimensionCache(BaseCache):
+    use_local_cache = True
 
     def get_dimension_id_key(self, dimension_id):
-        return 'dimension:id:%s' % dimension_id
+        return self.make_key('dimension:id', dimension_id)
 
     def get_dimension_list_key(self):
-        return 'dimension_list'
+        return self.make_key('dimension_list')
 
     def get_attribute_id_key(self, attribute_id):
-        return 'attribute:id:%s' % attribute_id
+        return self.make_key('attribute:id', attribute_id)
 
     def get_attribute_list(self):
-        return 'attribute_list'
+        return self.make_key('attribute_list')
 
     def get_tag_id_key(self, tag_id):
-        return 'tag:id:%s' % tag_id
+        return self.make_key('tag:id', tag_id)
 
     def get_tag_list_key(self, dimension_id):
-        return 'tag_list:dimension_id:%s' % dimension_id
+        return self.make_key('tag_list:dimension_id', dimension_id)
 
     def get_adjust_coefficient_name_key(self, name):
-        return 'adjust_coefficient:name:%s' % name
-
-    def set_instance_to_cache(self, key, data):
-        self.handle.set(key, data)
-        self.handle.expire(key, EXPIRES_24_HOURS)
-
-    def get_instance_from_cache(self, key):
-        return self.handle.get(key)
-
-    def set_list_to_cache(self, key, *list_data):
-        self.handle.rpush(key, *list_data)
-        self.handle.expire(key, EXPIRES_24_HOURS)
-
-    def get_list_from_cache(self, key, start=0, end=-1):
-        return self.handle.lrange(key, start, end)
-
-    def get_perfect_data(self, key, model_function, **kwargs):
-        data = self.get_instance_from_cache(key)
-        if not data:
-            data = model_function(**kwargs)
-            if isinstance(data, Exception):
-                return data
-            self.set_instance_to_cache(key, data)
-        return data
-
-    def get_perfect_list_data(self, key, model_function, **kwargs):
-        list_data = self.get_list_from_cache(key)
-        if not list_data:
-            list_data = model_function(**kwargs)
-            if isinstance(list_data, Exception) or not list_data:
-                return list_data
-            self.set_list_to_cache(key, *list_data)
-        return list_data
+        return self.make_key('adjust_coefficient:name', name)
 
     # 获取维度Model Instance
     def get_dimension_by_id(self, dimension_id):
@@ -114,3 +82,70 @@ class DimensionCache(object):
         return self.get_perfect_data(key, AdjustCoefficient.get_object, **kwargs)
 
 
+def get_match_profile_hash(first_dimension_id, tags_list, media_type=None):
+    """
+    匹配条件的规范化摘要：同一维度出现多次时以最后一次为准（与匹配计算一致），
+    按维度ID排序，标签ID去重排序，使用默认标签时忽略标签ID
+    """
+    dimension_items = {}
+    for item in tags_list:
+        if item['is_default_tag']:
+            dimension_items[item['dimension_id']] = [True, []]
+        else:
+            dimension_items[item['dimension_id']] = [False, sorted(set(item['tag_ids']))]
+    profile = [first_dimension_id, media_type or None,
+               [[dimension_id] + dimension_items[dimension_id]
+                for dimension_id in sorted(dimension_items)]]
+    string = json.dumps(profile, separators=(',', ':'))
+    return hashlib.md5(string).hexdigest()
+
+
+class MatchResultCache(BaseCache):
+    """
+    资源匹配结果：[{'media_id': x, 'total': x}, ...]（已排序）
+    Key中包含维度分类快照及媒体资源属性配置的代数，配置变更后自动使用新的Key
+    """
+    use_local_cache = True
+    expires = MATCH_RESULT_EXPIRES
+    # 批量读取不检查剩余时间，缩短过期后仍保留的时间
+    stale_ttl = 60
+
+    def get_match_result_key(self, profile_hash):
+        return self.make_key('match_result',
+                             't%d' % self.get_generation(TaxonomyCache.namespace),
+                             'm%d' % self.get_generation(MatchIndex.namespace),
+                             profile_hash)
+
+    def get_match_result(self, match_function, first_dimension_id, tags_list, media_type=None):
+        key = self.get_match_result_key(
+            get_match_profile_hash(first_dimension_id, tags_list, media_type))
+        kwargs = {'first_dimension_id': first_dimension_id,
+                  'tags_list': tags_list,
+                  'media_type': media_type}
+        return self.get_perfect_data(key, match_function, **kwargs)
+
+    def get_match_results(self, match_function, profiles):
+        """
+        批量读取匹配结果：缓存一次批量读取，未命中的条件调用一次match_function(未命中的条件列表)
+        计算后写回缓存
+        profiles: [{'first_dimension_id': x, 'tags_list': x, 'media_type': x}, ...]
+        返回：与profiles顺序一致的匹配结果列表
+        """
+        keys = [self.get_match_result_key(get_match_profile_hash(**profile))
+                for profile in profiles]
+        results = self.get_instances_from_cache(keys)
+        # 相同的条件只计算一次
+        miss_indexes = {}
+        for index, result in enumerate(results):
+            if result is None:
+                miss_indexes.setdefault(keys[index], index)
+        if miss_indexes:
+            miss_keys = list(miss_indexes)
+            miss_results = match_function([profiles[miss_indexes[key]] for key in miss_keys])
+            if isinstance(miss_results, Exception):
+                return miss_results
+            data_dict = dict(zip(miss_keys, miss_results))
+            self.set_instances_to_cache(data_dict)
+            results = [data_dict[key] if result is None else result
+                       for key, result in zip(keys, results)]
+        return results
@@ -22,3 +22,12 @@ class ResourceMatchActionForm(forms.Form):
     tags_list = forms.CharField()
     # 资源类型：10：电影 20：电视剧 30：综艺节目
     media_type = forms.IntegerField(min_value=1, required=False)
+
+
+class ResourceMatchBatchActionForm(forms.Form):
+    # profiles：多组匹配条件，数据格式为JSON，数据示例：
+    # [{'first_dimension_id': 1,
+    #   'tags_list': [{'tag_ids': [1, 2], 'dimension_id': 1, 'is_default_tag': false}, ...],
+    #   'media_type': 10}, ...
+    # ]
+    profiles = forms.CharField()
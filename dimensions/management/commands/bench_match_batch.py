@@ -0,0 +1,107 @@
+# -*- coding:utf8 -*-
+"""
+资源匹配吞吐量（条件数/秒）：逐个调用单条匹配 vs 批量匹配 vs 批量匹配（进程池）
+使用数据库中的维度分类及媒体资源属性配置，随机生成匹配条件，不读写匹配结果缓存
+
+用法：
+    python manage.py bench_match_batch                          # 200组条件
+    python manage.py bench_match_batch --profiles 500 --distinct 50 --processes 4
+"""
+from __future__ import division, unicode_literals
+
+import copy
+import multiprocessing
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from dimensions.matching import get_process_pool
+from dimensions.taxonomy import TaxonomyCache
+from dimensions.views import ResourceMatchAction, ResourceMatchBatchAction
+
+
+def make_profiles(taxonomy, count, distinct, seed=0):
+    """
+    随机生成匹配条件：共distinct组不同的条件，重复抽取出count组
+    """
+    randomizer = random.Random(seed)
+    dimension_ids = [dimension_id for dimension_id in taxonomy.dimension_ids
+                     if taxonomy.get_tag_ids(dimension_id)]
+    if not dimension_ids:
+        return []
+    profiles = []
+    for _ in range(distinct):
+        tags_list = []
+        for dimension_id in dimension_ids:
+            is_default_tag = randomizer.random() < 0.2
+            tag_ids = []
+            if not is_default_tag:
+                tag_ids = list(taxonomy.get_tag_ids(dimension_id))
+                tag_ids = randomizer.sample(tag_ids, randomizer.randint(1, min(3, len(tag_ids))))
+            tags_list.append({'dimension_id': dimension_id,
+                              'is_default_tag': is_default_tag,
+                              'tag_ids': tag_ids})
+        profiles.append({'first_dimension_id': randomizer.choice(dimension_ids),
+                         'tags_list': tags_list,
+                         'media_type': None})
+    return [copy.deepcopy(randomizer.choice(profiles)) for _ in range(count)]
+
+
+class Command(BaseCommand):
+    help = 'Measure resource matching throughput (profiles/second), single vs batch.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', type=int, default=200, help='Profiles per measurement.')
+        parser.add_argument('--distinct', type=int, default=None,
+                            help='Distinct profiles among them (default: all distinct).')
+        parser.add_argument('--processes', type=int, default=None,
+                            help='Process pool size (default: CPU count).')
+
+    def measure(self, function, profiles):
+        profiles = copy.deepcopy(profiles)
+        start = time.time()
+        results = function(profiles)
+        seconds = time.time() - start
+        return len(profiles) / seconds if seconds else float('inf'), results
+
+    def handle(self, *args, **options):
+        taxonomy = TaxonomyCache().get_snapshot()
+        if isinstance(taxonomy, Exception):
+            raise CommandError('Load taxonomy failed: %s' % (taxonomy.args,))
+        profiles = make_profiles(taxonomy, options['profiles'],
+                                 options['distinct'] or options['profiles'])
+        if not profiles:
+            raise CommandError('No dimension has tags.')
+
+        single_action = ResourceMatchAction()
+        batch_action = ResourceMatchBatchAction()
+
+        def run_single(items):
+            return [[{'media_id': item['media_id'], 'total': item['data']['total']}
+                     for item in single_action.match_action(taxonomy, profile['first_dimension_id'],
+                                                            profile['tags_list'])]
+                    for profile in items]
+
+        processes = options['processes'] or multiprocessing.cpu_count()
+
+        def run_batch(items):
+            return batch_action.get_batch_match_results(taxonomy, items, processes=0)
+
+        def run_batch_pool(items):
+            return batch_action.get_batch_match_results(taxonomy, items, processes=processes)
+
+        # 进程池的创建不计入时间
+        get_process_pool(processes)
+        line_format = '%-16s %14s'
+        self.stdout.write(line_format % ('implementation', 'profiles/s'))
+        expected = None
+        for name, function in (('single', run_single),
+                               ('batch', run_batch),
+                               ('batch + pool', run_batch_pool)):
+            throughput, results = self.measure(function, profiles)
+            if expected is None:
+                expected = results
+            elif results != expected:
+                self.stderr.write('%s: results differ from single.' % name)
+            self.stdout.write(line_format % (name, '%.1f' % throughput))
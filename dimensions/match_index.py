@@ -0,0 +1,38 @@
+# -*- coding:utf8 -*-
+"""
+资源匹配使用的进程内索引（匹配时不再查询数据库）：(维度ID, 属性ID) -> 媒体资源ID（array('i')）
+
+每个进程首次使用时用一次查询建立；MediaConfigure变更后增加命名空间代数，
+各进程发现代数变化后重新建立。标签的属性匹配值见dimensions.taxonomy。
+"""
+from __future__ import unicode_literals
+
+from array import array
+
+from horizon.caches import BaseSnapshotCache
+from media.models import MediaConfigure
+
+
+class MatchIndexData(object):
+    def __init__(self):
+        self.attribute_media_ids = {}
+
+    def load(self):
+        instances = MediaConfigure.filter_objects()
+        if isinstance(instances, Exception):
+            return instances
+        rows = instances.order_by('id').values_list('dimension_id', 'attribute_id', 'media_id')
+        for dimension_id, attribute_id, media_id in rows.iterator():
+            self.attribute_media_ids.setdefault(
+                (dimension_id, attribute_id), array(str('i'))).append(media_id)
+        return self
+
+    def get_media_ids(self, dimension_id, attribute_id):
+        return self.attribute_media_ids.get((dimension_id, attribute_id), ())
+
+
+class MatchIndex(BaseSnapshotCache):
+    namespace = 'dimension_match_index'
+
+    def load_snapshot(self):
+        return MatchIndexData().load()
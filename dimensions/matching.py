@@ -0,0 +1,200 @@
+# -*- coding:utf8 -*-
+"""
+资源匹配的计分
+
+属性得分只与该属性匹配到的标签匹配值有关，与媒体资源无关，每个属性只计算一次；
+媒体资源的维度得分为其所属属性得分的平均值（没有匹配属性的维度记为DEFAULT_DIMENSION_VALUE），
+总分 = (各维度得分之和 + 热度) * alpha，取总分前FIRST_ROUND_COUNT个，
+再按首选维度得分取前RESULT_COUNT个做beta调整，最后按总分取前RESULT_COUNT个。
+"""
+from __future__ import unicode_literals
+
+import atexit
+import heapq
+import multiprocessing
+import os
+import threading
+
+from django.conf import settings
+
+try:
+    from uwsgidecorators import postfork
+except ImportError:
+    # 不在uwsgi中运行（如manage.py、celery）
+    postfork = None
+
+# 单个属性的得分上限
+MAX_ATTRIBUTE_VALUE = 5
+# 没有匹配属性的维度得分
+DEFAULT_DIMENSION_VALUE = 3
+# 使用默认标签（全部标签）时的匹配值
+DEFAULT_TAG_MATCH_VALUE = 3.0
+# 第一轮（按总分）保留的数量
+FIRST_ROUND_COUNT = 10
+# 返回结果的数量
+RESULT_COUNT = 3
+# beta调整的基数（满分）
+BETA_BASE = 78.75
+# 批量匹配一次最多的条件数量
+MATCH_BATCH_MAX_PROFILES = 200
+# 使用进程池的最少条件数量（数量较少时进程间传输数据的开销大于计分本身）
+PROCESS_POOL_MIN_PROFILES = 8
+
+# 当前进程的计分进程池：{'pid': 创建进程池的进程ID, 'processes': 进程数, 'pool': 进程池}
+_process_pool = {}
+_process_pool_lock = threading.Lock()
+
+
+def compute_attribute_value(values_list):
+    """
+    属性得分：最大匹配值 + 其余匹配值之和 / 10，不超过MAX_ATTRIBUTE_VALUE
+    """
+    values_list = sorted(values_list)
+    offset_value = 0
+    for item in values_list[:-1]:
+        offset_value += item
+    attr_value = values_list[-1] + offset_value / 10
+    if attr_value > MAX_ATTRIBUTE_VALUE:
+        attr_value = MAX_ATTRIBUTE_VALUE
+    return attr_value
+
+
+def build_media_attribute_values(dimension_dict):
+    """
+    dimension_dict: {维度ID: {属性ID: {'tag_config': [{'tag_id': x, 'match_value': x}, ...],
+                                      'media_ids': [媒体资源ID, ...]}}}
+    返回：{媒体资源ID: {维度ID: {属性ID: 属性得分}}}
+    """
+    media_match_dict = {}
+    for dimension_id, item_dict in dimension_dict.items():
+        for attribute_id, attr_conf_item in item_dict.items():
+            if not attr_conf_item['media_ids']:
+                continue
+            attr_value = compute_attribute_value(
+                [item['match_value'] for item in attr_conf_item['tag_config']])
+            for media_id in attr_conf_item['media_ids']:
+                media_dict_item = media_match_dict.setdefault(media_id, {})
+                media_dict_item.setdefault(dimension_id, {})[attribute_id] = attr_value
+    return media_match_dict
+
+
+def compute_dimension_values(media_match_dict, dimension_ids):
+    """
+    返回：{媒体资源ID: {维度ID: 维度得分}}
+    """
+    media_value_result = {}
+    for media_id, dime_dict_item in media_match_dict.items():
+        media_compute_dict_item = {}
+        for dime_id in dimension_ids:
+            if dime_id in dime_dict_item:
+                dime_value = 0
+                for attr_value in dime_dict_item[dime_id].values():
+                    dime_value += attr_value
+                dime_value = dime_value / len(dime_dict_item[dime_id])
+            else:
+                dime_value = DEFAULT_DIMENSION_VALUE
+            media_compute_dict_item[dime_id] = dime_value
+        media_value_result[media_id] = media_compute_dict_item
+    return media_value_result
+
+
+def select_top_media(media_value_result, temperatures, first_dimension_id, alpha, beta):
+    """
+    temperatures: {媒体资源ID: 热度}（不在其中的媒体资源不参与排序）
+    返回：[{'media_id': x, 'data': {'total': x, 'first_dimension_value': x}}, ...]
+    """
+    media_sum_result = []
+    for media_id, value_dict in media_value_result.items():
+        if media_id not in temperatures:
+            continue
+        sum_value = 0
+        for value in value_dict.values():
+            sum_value += value
+        total = (sum_value + temperatures[media_id]) * alpha
+        media_sum_result.append(
+            {'media_id': media_id,
+             'data': {'total': total,
+                      'first_dimension_value': value_dict[first_dimension_id]}
+             })
+
+    # 与sorted(..., reverse=True)[:n]结果相同（相等时保持原有顺序），但不对全部数据排序
+    media_tmp = heapq.nlargest(FIRST_ROUND_COUNT, media_sum_result,
+                               key=lambda x: x['data']['total'])
+    media_tmp = sorted(media_tmp,
+                       key=lambda x: x['data']['first_dimension_value'], reverse=True)
+    for tmp_item in media_tmp[:RESULT_COUNT]:
+        tmp_item['data']['total'] = (tmp_item['data']['total'] * beta) / BETA_BASE * 100
+    return sorted(media_tmp, key=lambda x: x['data']['total'], reverse=True)[:RESULT_COUNT]
+
+
+def match_media(dimension_dict, dimension_ids, temperatures, first_dimension_id, alpha, beta):
+    media_match_dict = build_media_attribute_values(dimension_dict)
+    media_value_result = compute_dimension_values(media_match_dict, dimension_ids)
+    return select_top_media(media_value_result, temperatures, first_dimension_id, alpha, beta)
+
+
+def score_profile(args):
+    """
+    计算一组匹配条件（参数为match_media的参数元组，可在进程池中执行）
+    """
+    return match_media(*args)
+
+
+def get_pool_processes():
+    """
+    计分进程池的进程数（settings.MATCH_BATCH_PROCESSES，默认0，即不使用进程池）
+    """
+    return getattr(settings, 'MATCH_BATCH_PROCESSES', 0) or 0
+
+
+def get_process_pool(processes):
+    """
+    当前进程的计分进程池（线程安全，每个进程只保留一个）：
+    fork后从父进程继承的进程池不可用，在当前进程中重新创建；进程数变化时关闭原有的进程池
+    """
+    pid = os.getpid()
+    if _process_pool.get('pid') != pid or _process_pool.get('processes') != processes:
+        with _process_pool_lock:
+            if _process_pool.get('pid') != pid:
+                # 继承的进程池的工作进程属于父进程，只丢弃引用
+                _process_pool.clear()
+            if _process_pool.get('processes') != processes:
+                if _process_pool:
+                    _process_pool['pool'].close()
+                _process_pool.update({'pid': pid,
+                                      'processes': processes,
+                                      'pool': multiprocessing.Pool(processes=processes)})
+    return _process_pool['pool']
+
+
+def close_process_pool():
+    """
+    进程退出时结束当前进程创建的进程池
+    """
+    with _process_pool_lock:
+        if _process_pool.get('pid') == os.getpid():
+            _process_pool['pool'].terminate()
+        _process_pool.clear()
+
+
+atexit.register(close_process_pool)
+
+if postfork is not None:
+    @postfork
+    def create_process_pool():
+        """
+        uwsgi fork出worker后即创建进程池（不在master进程中创建，避免worker继承）
+        """
+        processes = get_pool_processes()
+        if processes > 0:
+            get_process_pool(processes)
+
+
+def score_profiles(jobs, processes=0):
+    """
+    计算多组匹配条件，jobs: [match_media的参数元组, ...]
+    processes大于0且数量足够时在进程池中并行计算
+    """
+    if processes > 0 and len(jobs) >= PROCESS_POOL_MIN_PROFILES:
+        return get_process_pool(processes).map(score_profile, jobs)
+    return [score_profile(job) for job in jobs]
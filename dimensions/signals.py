@@ -0,0 +1,38 @@
+# -*- coding:utf8 -*-
+"""
+维度分类数据、媒体资源属性配置变更时使资源匹配的进程内快照失效（在事务提交后执行）
+"""
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from dimensions.models import (Dimension,
+                               Attribute,
+                               Tag,
+                               TagConfigure,
+                               AdjustCoefficient)
+from dimensions.match_index import MatchIndex
+from dimensions.taxonomy import TaxonomyCache
+from media.models import MediaConfigure, MediaType
+
+
+@receiver(post_save, sender=Dimension)
+@receiver(post_delete, sender=Dimension)
+@receiver(post_save, sender=Attribute)
+@receiver(post_delete, sender=Attribute)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=TagConfigure)
+@receiver(post_delete, sender=TagConfigure)
+@receiver(post_save, sender=AdjustCoefficient)
+@receiver(post_delete, sender=AdjustCoefficient)
+@receiver(post_save, sender=MediaType)
+@receiver(post_delete, sender=MediaType)
+def taxonomy_changed(sender, instance, **kwargs):
+    transaction.on_commit(lambda: TaxonomyCache().invalidate_snapshot())
+
+
+@receiver(post_save, sender=MediaConfigure)
+@receiver(post_delete, sender=MediaConfigure)
+def media_configure_changed(sender, instance, **kwargs):
+    transaction.on_commit(lambda: MatchIndex().invalidate_snapshot())
@@ -0,0 +1,109 @@
+# -*- coding:utf8 -*-
+"""
+维度分类的进程内快照：维度、属性、标签、维度的标签、标签的属性匹配值、调整系数及资源类型
+
+每张表一次查询整体建立，建立后只读；任一数据变更后增加命名空间代数，
+各进程发现代数变化后重新建立并整体替换。
+"""
+from __future__ import unicode_literals
+
+import random
+
+from horizon.caches import BaseSnapshotCache
+from dimensions.models import (Dimension,
+                               Attribute,
+                               Tag,
+                               TagConfigure,
+                               AdjustCoefficient)
+from media.models import MediaType
+
+# 调整系数不存在时使用的值
+DEFAULT_ADJUST_COEFFICIENT = 1
+
+
+class TaxonomySnapshot(object):
+    def __init__(self):
+        # 维度（按Dimension.filter_objects的排序）
+        self.dimensions = ()
+        self.dimension_ids = ()
+        self.attributes = {}
+        self.tags = {}
+        # {维度ID: (标签ID, ...)}（按标签的默认排序）及对应的集合
+        self.dimension_tag_ids = {}
+        self.dimension_tag_id_sets = {}
+        # {标签ID: ((属性ID, 匹配值), ...)}（按属性ID排序，与TagConfigure的默认排序一致）
+        self.tag_attributes = {}
+        # {调整系数名称（小写）: 值}
+        self.adjust_coefficients = {}
+        self.media_type_ids = frozenset()
+
+    def load(self):
+        dimensions = Dimension.filter_objects()
+        attributes = Attribute.filter_objects()
+        tags = Tag.filter_objects()
+        tag_configs = TagConfigure.filter_objects()
+        coefficients = AdjustCoefficient.filter_objects()
+        media_types = MediaType.filter_objects()
+        for instances in (dimensions, attributes, tags, tag_configs, coefficients, media_types):
+            if isinstance(instances, Exception):
+                return instances
+
+        self.dimensions = tuple(dimensions)
+        self.dimension_ids = tuple(ins.id for ins in self.dimensions)
+        self.attributes = {ins.id: ins for ins in attributes}
+        tags = list(tags)
+        self.tags = {ins.id: ins for ins in tags}
+
+        tag_attributes = {}
+        dimension_tag_id_sets = {}
+        rows = tag_configs.order_by('tag_id', 'attribute_id').values_list(
+            'tag_id', 'attribute_id', 'match_value')
+        for tag_id, attribute_id, match_value in rows:
+            tag_attributes.setdefault(tag_id, []).append((attribute_id, match_value))
+            attribute = self.attributes.get(attribute_id)
+            if attribute is not None and tag_id in self.tags:
+                dimension_tag_id_sets.setdefault(attribute.dimension_id, set()).add(tag_id)
+        self.tag_attributes = {tag_id: tuple(values) for tag_id, values in tag_attributes.items()}
+        self.dimension_tag_id_sets = {dimension_id: frozenset(tag_ids)
+                                      for dimension_id, tag_ids in dimension_tag_id_sets.items()}
+        self.dimension_tag_ids = {dimension_id: tuple(ins.id for ins in tags if ins.id in tag_ids)
+                                  for dimension_id, tag_ids in self.dimension_tag_id_sets.items()}
+
+        for ins in coefficients:
+            self.adjust_coefficients[ins.name.lower()] = ins.value
+        self.media_type_ids = frozenset(ins.id for ins in media_types)
+        return self
+
+    def has_dimension(self, dimension_id):
+        return dimension_id in self.dimension_ids
+
+    def get_tag_ids(self, dimension_id):
+        return self.dimension_tag_ids.get(dimension_id, ())
+
+    def get_tag_id_set(self, dimension_id):
+        return self.dimension_tag_id_sets.get(dimension_id, frozenset())
+
+    def get_tags(self, dimension_id):
+        return [self.tags[tag_id] for tag_id in self.get_tag_ids(dimension_id)]
+
+    def sample_tags(self, dimension_id, count):
+        """
+        随机取出维度的count个标签（不足count个时返回全部）
+        """
+        tag_ids = self.get_tag_ids(dimension_id)
+        if len(tag_ids) > count:
+            tag_ids = random.sample(tag_ids, count)
+        return [self.tags[tag_id] for tag_id in tag_ids]
+
+    def get_tag_attributes(self, tag_id):
+        return self.tag_attributes.get(tag_id, ())
+
+    def get_adjust_coefficient(self, name):
+        return self.adjust_coefficients.get(name.lower(), DEFAULT_ADJUST_COEFFICIENT)
+
+
+class TaxonomyCache(BaseSnapshotCache):
+    namespace = 'dimension_taxonomy'
+
+    def load_snapshot(self):
+        return TaxonomySnapshot().load()
@@ -1,3 +1,215 @@
-from django.test import TestCase
+# -*- coding:utf8 -*-
+from __future__ import unicode_literals
 
-# Create your tests here.
+import copy
+import random
+
+from django.test import SimpleTestCase
+
+from dimensions.caches import MatchResultCache, get_match_profile_hash
+from dimensions.matching import (PROCESS_POOL_MIN_PROFILES,
+                                 close_process_pool,
+                                 get_process_pool,
+                                 match_media,
+                                 score_profiles)
+from dimensions.taxonomy import TaxonomySnapshot
+from dimensions.views import ResourceMatchAction
+from media.tests import RedisTestCase
+
+
+def legacy_match(dimension_dict, dimension_ids, temperatures, first_dimension_id, alpha, beta):
+    """
+    改写前ResourceMatchAction.match_action的计分部分（原样保留，用于比对）
+    """
+    media_match_dict = {}
+    for dimension_id, item_dict in dimension_dict.items():
+        for attribute_id, attr_conf_item in item_dict.items():
+            for media_id in attr_conf_item['media_ids']:
+                media_dict_item = media_match_dict.get(media_id, {})
+                media_dime_dict_item = media_dict_item.get(dimension_id, {})
+                match_value_list = [item2['match_value']
+                                    for item2 in attr_conf_item['tag_config']]
+                media_dime_dict_item[attribute_id] = match_value_list
+                media_dict_item[dimension_id] = media_dime_dict_item
+                media_match_dict[media_id] = media_dict_item
+
+    media_value_result = {}
+    for media_id, dime_dict_item in media_match_dict.items():
+        media_compute_dict_item = {}
+        for dime_id in dimension_ids:
+            if dime_id in dime_dict_item:
+                dime_value = 0
+                for attr_id, values_list in dime_dict_item[dime_id].items():
+                    values_list = sorted(values_list)
+                    max_value = values_list[-1]
+                    offset_value = 0
+                    for item in values_list[:-1]:
+                        offset_value += item
+                    offset_value = offset_value / 10
+                    attr_value = max_value + offset_value
+                    if attr_value > 5:
+                        attr_value = 5
+                    dime_value += attr_value
+                dime_value = dime_value / (len(dime_dict_item[dime_id]))
+            else:
+                dime_value = 3
+            media_compute_dict_item[dime_id] = dime_value
+        media_value_result[media_id] = media_compute_dict_item
+
+    media_sum_result = []
+    for media_id, value_dict in media_value_result.items():
+        if media_id not in temperatures:
+            continue
+        sum_value = 0
+        for key, value in value_dict.items():
+            sum_value += value
+        total = (sum_value + temperatures[media_id]) * alpha
+        media_sum_result.append(
+            {'media_id': media_id,
+             'data': {'total': total,
+                      'first_dimension_value': value_dict[first_dimension_id]}
+             })
+
+    media_tmp = sorted(media_sum_result, key=lambda x: x['data']['total'], reverse=True)[:10]
+    media_tmp = sorted(media_tmp,
+                       key=lambda x: x['data']['first_dimension_value'], reverse=True)
+    for tmp_item in media_tmp[:3]:
+        tmp_item['data']['total'] = (tmp_item['data']['total'] * beta) / 78.75 * 100
+    return sorted(media_tmp, key=lambda x: x['data']['total'], reverse=True)[:3]
+
+
+def make_dimension_dict(randomizer, dimension_ids, media_count, attribute_count):
+    dimension_dict = {}
+    attribute_id = 0
+    for dimension_id in dimension_ids:
+        attribute_dict = {}
+        for _ in range(attribute_count):
+            attribute_id += 1
+            tag_config = [{'tag_id': tag_id,
+                           'match_value': randomizer.choice([0.5, 1.0, 1.5, 2.0, 2.5, 3.0, 4.0])}
+                          for tag_id in range(randomizer.randint(1, 4))]
+            media_ids = randomizer.sample(range(1, media_count + 1),
+                                          randomizer.randint(0, media_count // 4))
+            attribute_dict[attribute_id] = {'tag_config': tag_config, 'media_ids': media_ids}
+        dimension_dict[dimension_id] = attribute_dict
+    return dimension_dict
+
+
+class MatchingTestCase(SimpleTestCase):
+    def test_golden_output(self):
+        dimension_dict = {
+            1: {11: {'tag_config': [{'tag_id': 1, 'match_value': 4.0},
+                                    {'tag_id': 2, 'match_value': 2.0}],
+                     'media_ids': [101, 102]},
+                12: {'tag_config': [{'tag_id': 3, 'match_value': 4.5},
+                                    {'tag_id': 4, 'match_value': 3.0},
+                                    {'tag_id': 5, 'match_value': 2.0}],
+                     'media_ids': [102, 103]}},
+            2: {21: {'tag_config': [{'tag_id': 6, 'match_value': 1.0}],
+                     'media_ids': [101, 103, 104]}},
+        }
+        temperatures = {101: 10, 102: 20, 103: 15}
+        result = match_media(dimension_dict, [1, 2, 3], temperatures, 1, alpha=1.0, beta=1.0)
+        self.assertEqual([item['media_id'] for item in result], [102, 103, 101])
+        self.assertAlmostEqual(result[0]['data']['total'], (4.6 + 3 + 3 + 20) / 78.75 * 100)
+        self.assertAlmostEqual(result[1]['data']['first_dimension_value'], 5)
+        self.assertAlmostEqual(result[2]['data']['first_dimension_value'], 4.2)
+        self.assertEqual(result, legacy_match(dimension_dict, [1, 2, 3], temperatures, 1,
+                                              alpha=1.0, beta=1.0))
+
+    def test_same_as_legacy(self):
+        randomizer = random.Random(0)
+        dimension_ids = [1, 2, 3, 4, 5]
+        for _ in range(50):
+            dimension_dict = make_dimension_dict(randomizer, dimension_ids, 200, 6)
+            temperatures = {media_id: randomizer.randint(0, 100)
+                            for media_id in range(1, 201) if randomizer.random() < 0.8}
+            first_dimension_id = randomizer.choice(dimension_ids)
+            alpha = randomizer.choice([1, 0.8, 1.2])
+            beta = randomizer.choice([1, 0.5, 1.5])
+            expected = legacy_match(copy.deepcopy(dimension_dict), dimension_ids, temperatures,
+                                    first_dimension_id, alpha, beta)
+            result = match_media(dimension_dict, dimension_ids, temperatures,
+                                 first_dimension_id, alpha, beta)
+            self.assertEqual(result, expected)
+
+    def test_process_pool(self):
+        randomizer = random.Random(1)
+        dimension_ids = [1, 2, 3]
+        jobs = []
+        for _ in range(PROCESS_POOL_MIN_PROFILES):
+            temperatures = {media_id: randomizer.randint(0, 100) for media_id in range(1, 51)}
+            jobs.append((make_dimension_dict(randomizer, dimension_ids, 50, 4), dimension_ids,
+                         temperatures, 1, 1, 1))
+        self.addCleanup(close_process_pool)
+        self.assertEqual(score_profiles(jobs, processes=2), score_profiles(jobs))
+        pool = get_process_pool(2)
+        self.assertIs(get_process_pool(2), pool)
+        self.assertIsNot(get_process_pool(1), pool)
+
+
+class ProfileTestCase(SimpleTestCase):
+    def make_taxonomy(self):
+        taxonomy = TaxonomySnapshot()
+        taxonomy.dimension_ids = (1, 2)
+        taxonomy.dimension_tag_id_sets = {1: frozenset([11, 12]), 2: frozenset([21])}
+        taxonomy.media_type_ids = frozenset([10])
+        return taxonomy
+
+    def test_profile_hash(self):
+        tags_list = [{'dimension_id': 2, 'is_default_tag': True, 'tag_ids': [21]},
+                     {'dimension_id': 1, 'is_default_tag': False, 'tag_ids': [12, 11, 12]}]
+        same_tags_list = [{'dimension_id': 1, 'is_default_tag': False, 'tag_ids': [11]},
+                          {'dimension_id': 1, 'is_default_tag': False, 'tag_ids': [11, 12]},
+                          {'dimension_id': 2, 'is_default_tag': True, 'tag_ids': []}]
+        profile_hash = get_match_profile_hash(1, tags_list)
+        self.assertEqual(get_match_profile_hash(1, same_tags_list), profile_hash)
+        self.assertEqual(get_match_profile_hash(1, tags_list, media_type=0), profile_hash)
+        self.assertNotEqual(get_match_profile_hash(2, tags_list), profile_hash)
+        self.assertNotEqual(get_match_profile_hash(1, tags_list, media_type=10), profile_hash)
+        self.assertNotEqual(get_match_profile_hash(1, tags_list[1:]), profile_hash)
+
+    def test_profile_valid(self):
+        taxonomy = self.make_taxonomy()
+        action = ResourceMatchAction()
+
+        def is_valid(tag_ids, media_type=None, first_dimension_id=1):
+            tags_list = [{'dimension_id': 1, 'is_default_tag': False, 'tag_ids': tag_ids}]
+            return action.is_profile_valid(taxonomy, first_dimension_id, tags_list,
+                                           media_type)[0]
+
+        self.assertTrue(is_valid([11, 12]))
+        self.assertTrue(is_valid([11], media_type=10))
+        self.assertFalse(is_valid([21]))
+        self.assertFalse(is_valid([True]))
+        self.assertFalse(is_valid('11'))
+        self.assertFalse(is_valid({'11': 1}))
+        self.assertFalse(is_valid([11], media_type=20))
+        self.assertFalse(is_valid([11], media_type=[10]))
+        self.assertFalse(is_valid([11], media_type={'id': 10}))
+        self.assertFalse(is_valid([11], first_dimension_id=True))
+
+
+class MatchResultCacheTestCase(RedisTestCase):
+    def test_miss_deduplication(self):
+        tags_list = [{'dimension_id': 1, 'is_default_tag': False, 'tag_ids': [11, 12]}]
+        same_tags_list = [{'dimension_id': 1, 'is_default_tag': False, 'tag_ids': [12, 11]}]
+        profiles = [{'first_dimension_id': 1, 'tags_list': tags_list, 'media_type': None},
+                    {'first_dimension_id': 2, 'tags_list': tags_list, 'media_type': None},
+                    {'first_dimension_id': 1, 'tags_list': same_tags_list, 'media_type': None}]
+        calls = []
+
+        def match_function(miss_profiles):
+            calls.append(miss_profiles)
+            return [[{'media_id': profile['first_dimension_id'], 'total': 1.0}]
+                    for profile in miss_profiles]
+
+        cache = MatchResultCache()
+        expected = [[{'media_id': 1, 'total': 1.0}], [{'media_id': 2, 'total': 1.0}],
+                    [{'media_id': 1, 'total': 1.0}]]
+        self.assertEqual(cache.get_match_results(match_function, profiles), expected)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(profile['first_dimension_id'] for profile in calls[0]), [1, 2])
+
+        self.assertEqual(cache.get_match_results(match_function, profiles), expected)
+        self.assertEqual(len(calls), 1)
@@ -9,21 +9,35 @@ from dimensions.serializers import (DimensionListSerializer,
                                     MediaSerializer,
                                     MatchActionListSerializer)
 from dimensions.permissions import IsOwnerOrReadOnly
-from dimensions.models import (Dimension, Attribute, Tag,
-                               TagConfigure, AdjustCoefficient)
+from dimensions.models import Dimension, Attribute
 from dimensions.forms import (DimensionListForm,
                               TagsListForm,
-                              ResourceMatchActionForm)
-from dimensions.caches import DimensionCache
-from media.models import Media, MediaConfigure, MediaType
+                              ResourceMatchActionForm,
+                              ResourceMatchBatchActionForm)
+from dimensions.caches import DimensionCache, MatchResultCache
+from dimensions.match_index import MatchIndex
+from dimensions.taxonomy import TaxonomyCache
+from dimensions.matching import (DEFAULT_TAG_MATCH_VALUE,
+                                 MATCH_BATCH_MAX_PROFILES,
+                                 build_media_attribute_values,
+                                 compute_dimension_values,
+                                 select_top_media,
+                                 get_pool_processes,
+                                 score_profiles)
+from media.models import Media
 from media.serializers import MediaDetailSerializer
+from media.caches import MediaCache
 
 
-from horizon.main import select_random_element_from_array
-
+from functools import partial
 import json
 
 
+def is_int(value):
+    # JSON中的true/false解析为bool（int的子类），不作为ID
+    return isinstance(value, (int, long)) and not isinstance(value, bool)
+
+
 class DimensionList(APIView):
     """
     维度列表
@@ -54,11 +68,11 @@ class TagList(APIView):
     标签列表
     """
     def get_tags_list(self, **kwargs):
-        instances = DimensionCache().get_tag_list_by_dimension_id(dimension_id=kwargs['dimension_id'])
-        # instances = Tag.filter_objects_by_dimension_id(dimension_id=kwargs['dimension_id'])
+        taxonomy = TaxonomyCache().get_snapshot()
+        if isinstance(taxonomy, Exception):
+            return taxonomy
         # 随机取出一定数量的元素
-        new_instances = select_random_element_from_array(list(instances), kwargs['count'])
-        return new_instances
+        return taxonomy.sample_tags(kwargs['dimension_id'], kwargs['count'])
 
     def post(self, request, *args, **kwargs):
         form = TagsListForm(request.data)
@@ -67,6 +81,8 @@ class TagList(APIView):
 
         cld = form.cleaned_data
         instances = self.get_tags_list(**cld)
+        if isinstance(instances, Exception):
+            return Response({'Detail': instances.args}, status=status.HTTP_400_BAD_REQUEST)
         serializer = TagListSerializer(instances)
         list_data = serializer.list_data(**cld)
         if isinstance(list_data, Exception):
@@ -78,170 +94,145 @@ class ResourceMatchAction(APIView):
     """
     资源匹配
     """
-    def get_dimension_list(self):
-        return DimensionCache().get_dimension_list()
-        # return Dimension.filter_objects()
-
-    def get_adjust_coefficient_value_by_name(self, name):
-        # kwargs = {'name': name.lower()}
-        instance = DimensionCache().get_adjust_coefficient_by_name(adjust_coefficient_name=name.lower())
-        # instance = AdjustCoefficient.get_object(**kwargs)
-        if isinstance(instance, Exception):
-            return 1
-        return instance.value
-
-    def is_request_data_valid(self, **kwargs):
-        dimension_instances = self.get_dimension_list()
-        dimensions_dict = {ins.id: ins for ins in dimension_instances}
-
-        if kwargs['first_dimension_id'] not in dimensions_dict:
+    def is_request_data_valid(self, taxonomy, **kwargs):
+        if not taxonomy.has_dimension(kwargs['first_dimension_id']):
             return False, 'Params "first_dimension_id" is incorrect.'
         try:
             tags_list = json.loads(kwargs['tags_list'])
         except Exception as e:
             return False, e.args
-
-        tag_ids_dict = {}
-        for dimension_id in dimensions_dict:
-            item_tags = Tag.filter_objects_by_dimension_id(dimension_id)
-            tag_ids_dict[dimension_id] = [ins.id for ins in item_tags]
+        return self.is_profile_valid(taxonomy, kwargs['first_dimension_id'], tags_list,
+                                     kwargs.get('media_type'))
+
+    def is_profile_valid(self, taxonomy, first_dimension_id, tags_list, media_type=None):
+        """
+        校验一组匹配条件（tags_list为解析后的列表）
+        """
+        if not is_int(first_dimension_id) or not taxonomy.has_dimension(first_dimension_id):
+            return False, 'Params "first_dimension_id" is incorrect.'
 
         item_keys = ['tag_ids', 'dimension_id', 'is_default_tag']
         error_message_for_tags_list = 'Params [tags_list] is incorrect.'
+        if not isinstance(tags_list, list):
+            return False, error_message_for_tags_list
         for item in tags_list:
-            if sorted(item.keys()) != sorted(item_keys):
+            if not isinstance(item, dict) or sorted(item.keys()) != sorted(item_keys):
                 return False, error_message_for_tags_list
-            if item['dimension_id'] not in tag_ids_dict:
+            if not is_int(item['dimension_id']) or not taxonomy.has_dimension(item['dimension_id']):
                 return False, error_message_for_tags_list
             if not item['is_default_tag']:
+                if not isinstance(item['tag_ids'], list):
+                    return False, error_message_for_tags_list
+                tag_id_set = taxonomy.get_tag_id_set(item['dimension_id'])
                 for tag_id in item['tag_ids']:
-                    if tag_id not in tag_ids_dict[item['dimension_id']]:
+                    if not is_int(tag_id) or tag_id not in tag_id_set:
                         return False, error_message_for_tags_list
 
         # 判断资源类型是否正确
-        media_type = kwargs.get('media_type')
+        if media_type is not None and not is_int(media_type):
+            return False, 'Params [media_type] is not incorrect.'
         if media_type:
-            media_type_ids = [media_type_instance.id
-                              for media_type_instance in MediaType.filter_objects()]
-            if media_type not in media_type_ids:
+            if media_type not in taxonomy.media_type_ids:
                 return False, 'Params [media_type] is not incorrect.'
         return True, None
 
-    def match_action(self, first_dimension_id, tags_list, media_type=None):
+    def get_dimension_attribute_dict(self, taxonomy, tags_list, match_index=None,
+                                     attribute_dicts=None):
+        """
+        返回：{维度ID: {属性ID: {'tag_config': [{'tag_id': x, 'match_value': x}, ...],
+                                'media_ids': [媒体资源ID, ...]}}}
+        标签配置及媒体资源属性配置从进程内快照及索引读取，不查询数据库
+        attribute_dicts: 批量匹配时传入，相同的(维度, 标签)只计算一次（结果只读，可被多组条件共用）
+        """
+        if match_index is None:
+            match_index = MatchIndex().get_snapshot()
+            if isinstance(match_index, Exception):
+                return match_index
+
         dimension_dict = {}
-        media_match_dict = {}
         # 查找属性ID
         for item in tags_list:
             if item['is_default_tag']:
-                tags_list = DimensionCache().get_tag_list_by_dimension_id(item['dimension_id'])
-                item['tag_ids'] = [tag.id for tag in tags_list]
-                # dimension_dict[item['dimension_id']] = {}
-                # continue
-
-            tag_config_instances = TagConfigure.filter_objects(tag_id__in=item['tag_ids'])
-            attribute_dict = {}
-            for item2 in tag_config_instances:
-                attr_dict = attribute_dict.get(item2.attribute_id, {})
-                tag_config_list = attr_dict.get('tag_config', [])
-
-                match_value = item2.match_value
-                if item['is_default_tag']:
-                    match_value = 3.0
-                tag_config_list.append({'tag_id': item2.tag_id,
-                                        'match_value': match_value})
-                attr_dict['tag_config'] = tag_config_list
-
-                media_ids = attr_dict.get('media_ids', [])
-                if not media_ids:
-                    media_ins = MediaConfigure.filter_objects(dimension_id=item['dimension_id'],
-                                                              attribute_id=item2.attribute_id)
-                    media_ids = [item3.media_id for item3 in media_ins]
-                    attr_dict['media_ids'] = media_ids
-                attribute_dict[item2.attribute_id] = attr_dict
+                item['tag_ids'] = taxonomy.get_tag_ids(item['dimension_id'])
+            tag_ids = tuple(sorted(set(item['tag_ids'])))
+
+            key = (item['dimension_id'], bool(item['is_default_tag']), tag_ids)
+            attribute_dict = None if attribute_dicts is None else attribute_dicts.get(key)
+            if attribute_dict is None:
+                attribute_dict = self.get_attribute_dict(taxonomy, match_index,
+                                                         item['dimension_id'], tag_ids,
+                                                         item['is_default_tag'])
+                if attribute_dicts is not None:
+                    attribute_dicts[key] = attribute_dict
             dimension_dict[item['dimension_id']] = attribute_dict
-
-        # 生成匹配数据
-        for dimension_id, item_dict in dimension_dict.items():
-            for attribute_id, attr_conf_item in item_dict.items():
-                for media_id in attr_conf_item['media_ids']:
-                    media_dict_item = media_match_dict.get(media_id, {})
-                    media_dime_dict_item = media_dict_item.get(dimension_id, {})
-                    match_value_list = [item2['match_value']
-                                        for item2 in attr_conf_item['tag_config']]
-                    media_dime_dict_item[attribute_id] = match_value_list
-                    media_dict_item[dimension_id] = media_dime_dict_item
-                    media_match_dict[media_id] = media_dict_item
+        return dimension_dict
+
+    def get_attribute_dict(self, taxonomy, match_index, dimension_id, tag_ids, is_default_tag):
+        """
+        一个维度的匹配属性：{属性ID: {'tag_config': [...], 'media_ids': [...]}}
+        tag_ids: 已排序的标签ID
+        """
+        attribute_dict = {}
+        for tag_id in tag_ids:
+            for attribute_id, match_value in taxonomy.get_tag_attributes(tag_id):
+                if is_default_tag:
+                    match_value = DEFAULT_TAG_MATCH_VALUE
+                attr_dict = attribute_dict.get(attribute_id)
+                if attr_dict is None:
+                    media_ids = match_index.get_media_ids(dimension_id, attribute_id)
+                    attr_dict = {'tag_config': [], 'media_ids': media_ids}
+                    attribute_dict[attribute_id] = attr_dict
+                attr_dict['tag_config'].append({'tag_id': tag_id,
+                                                'match_value': match_value})
+        return attribute_dict
+
+    def match_action(self, taxonomy, first_dimension_id, tags_list, media_type=None):
+        dimension_dict = self.get_dimension_attribute_dict(taxonomy, tags_list)
+        if isinstance(dimension_dict, Exception):
+            return dimension_dict
+        media_match_dict = build_media_attribute_values(dimension_dict)
 
         # 匹配计算
-        dimension_instances = self.get_dimension_list()
-        dimension_ids = [ins.id for ins in dimension_instances]
-        media_value_result = {}
-        for media_id, dime_dict_item in media_match_dict.items():
-            media_compute_dict_item = {}
-            for dime_id in dimension_ids:
-                if dime_id in dime_dict_item:
-                    dime_value = 0
-                    for attr_id, values_list in dime_dict_item[dime_id].items():
-                        values_list = sorted(values_list)
-                        max_value = values_list[-1]
-                        offset_value = 0
-                        for item in values_list[:-1]:
-                            offset_value += item
-                        offset_value = offset_value / 10
-                        attr_value = max_value + offset_value
-                        if attr_value > 5:
-                            attr_value = 5
-                        dime_value += attr_value
-                    dime_value = dime_value / (len(dime_dict_item[dime_id]))
-                else:
-                    dime_value = 3
-                media_compute_dict_item[dime_id] = dime_value
-            media_value_result[media_id] = media_compute_dict_item
-
-        # 对计算结果进行"阿尔法"调整优化
+        media_value_result = compute_dimension_values(media_match_dict, taxonomy.dimension_ids)
+
         kwargs = {'id__in': media_value_result.keys()}
         if media_type:
             kwargs['media_type'] = media_type
         media_instances = Media.filter_objects(**kwargs)
-        media_instances_dict = {ins.id: ins for ins in media_instances}
-        media_sum_result = []
-        for media_id, value_dict in media_value_result.items():
-            if media_id not in media_instances_dict:
-                continue
-            sum_value = 0
-            for key, value in value_dict.items():
-                sum_value += value
-            # 从数据中读取"阿尔法"值
-            alpha = self.get_adjust_coefficient_value_by_name(name='alpha')
-            total = (sum_value + media_instances_dict[media_id].temperature) * alpha
-            media_sum_result.append(
-                {'media_id': media_id,
-                 'data': {'total': total,
-                          'first_dimension_value': value_dict[first_dimension_id]}
-                 })
-
-        # 对计算结果进行"贝塔"调整优化
-        media_result = []
-        media_tmp = sorted(media_sum_result, key=lambda x: x['data']['total'], reverse=True)[:10]
-        media_tmp = sorted(media_tmp,
-                           key=lambda x: x['data']['first_dimension_value'], reverse=True)
-        # 从数据中读取"贝塔"值
-        beta = self.get_adjust_coefficient_value_by_name(name='beta')
-        for tmp_item in media_tmp[:3]:
-            tmp_item['data']['total'] = (tmp_item['data']['total'] * beta) / 78.75 * 100
-        media_result = sorted(media_tmp, key=lambda x: x['data']['total'], reverse=True)[:3]
-
-        return media_result
-
-    def get_media_list(self, **kwargs):
-        return Media.filter_details(**kwargs)
+        if isinstance(media_instances, Exception):
+            return media_instances
+        temperatures = {ins.id: ins.temperature
+                        for ins in media_instances.only('id', 'temperature')}
+
+        # 从数据中读取"阿尔法"值及"贝塔"值，对计算结果进行调整优化
+        alpha = taxonomy.get_adjust_coefficient('alpha')
+        beta = taxonomy.get_adjust_coefficient('beta')
+        return select_top_media(media_value_result, temperatures, first_dimension_id,
+                                alpha, beta)
+
+    def get_match_result(self, taxonomy, first_dimension_id, tags_list, media_type=None):
+        """
+        返回：[{'media_id': x, 'total': x}, ...]（用于缓存）
+        """
+        match_result = self.match_action(taxonomy, first_dimension_id, tags_list,
+                                         media_type=media_type)
+        if isinstance(match_result, Exception):
+            return match_result
+        return [{'media_id': item['media_id'], 'total': item['data']['total']}
+                for item in match_result]
+
+    def get_media_list(self, media_ids):
+        return MediaCache().get_media_details_by_ids(media_ids)
 
     def get_perfect_media_result(self, match_result, media_list):
         media_dict = {item['id']: item for item in media_list}
         perfect_result = []
         for item in match_result:
+            # 缓存结果中的资源可能已被删除
+            if item['media_id'] not in media_dict:
+                continue
             serializer = MediaDetailSerializer(media_dict[item['media_id']])
-            item_dict = {'match_degree': '%.2f' % item['data']['total'],
+            item_dict = {'match_degree': '%.2f' % item['total'],
                          'data': serializer.data}
             perfect_result.append(item_dict)
         return perfect_result
@@ -252,16 +243,25 @@ class ResourceMatchAction(APIView):
             return Response({'Detail': form.errors}, status=status.HTTP_400_BAD_REQUEST)
 
         cld = form.cleaned_data
-        is_valid, error_message = self.is_request_data_valid(**cld)
+        taxonomy = TaxonomyCache().get_snapshot()
+        if isinstance(taxonomy, Exception):
+            return Response({'Detail': taxonomy.args}, status=status.HTTP_400_BAD_REQUEST)
+        is_valid, error_message = self.is_request_data_valid(taxonomy, **cld)
         if not is_valid:
             return Response({'Detail': error_message}, status=status.HTTP_400_BAD_REQUEST)
 
         tags_list = json.loads(cld['tags_list'])
-        match_result = self.match_action(cld['first_dimension_id'],
-                                         tags_list,
-                                         media_type=cld.get('media_type'))
+        # 相同的匹配条件直接使用缓存的结果
+        match_result = MatchResultCache().get_match_result(partial(self.get_match_result, taxonomy),
+                                                           cld['first_dimension_id'],
+                                                           tags_list,
+                                                           media_type=cld.get('media_type'))
+        if isinstance(match_result, Exception):
+            return Response({'Detail': match_result.args}, status=status.HTTP_400_BAD_REQUEST)
         media_ids = [item['media_id'] for item in match_result]
-        media_list = self.get_media_list(id__in=media_ids)
+        media_list = self.get_media_list(media_ids)
+        if isinstance(media_list, Exception):
+            return Response({'Detail': media_list.args}, status=status.HTTP_400_BAD_REQUEST)
         media_result = self.get_perfect_media_result(match_result, media_list)
 
         serializer = MatchActionListSerializer(data=media_result)
@@ -271,3 +271,127 @@ class ResourceMatchAction(APIView):
         if isinstance(list_data, Exception):
             return Response(list_data.args, status=status.HTTP_400_BAD_REQUEST)
         return Response(list_data, status=status.HTTP_200_OK)
+
+
+class ResourceMatchBatchAction(ResourceMatchAction):
+    """
+    批量资源匹配：多组匹配条件共用维度分类快照、属性索引，资源热度及资源详情各查询一次，
+    settings.MATCH_BATCH_PROCESSES大于0时在进程池中并行计分
+    """
+    def get_batch_match_results(self, taxonomy, profiles, processes=None):
+        """
+        processes: 计分进程池的进程数（默认使用settings.MATCH_BATCH_PROCESSES，0为不使用进程池）
+        返回：与profiles顺序一致的[{'media_id': x, 'total': x}, ...]列表
+        """
+        match_index = MatchIndex().get_snapshot()
+        if isinstance(match_index, Exception):
+            return match_index
+
+        attribute_dicts = {}
+        dimension_dicts = []
+        media_ids = set()
+        for profile in profiles:
+            dimension_dict = self.get_dimension_attribute_dict(taxonomy, profile['tags_list'],
+                                                               match_index=match_index,
+                                                               attribute_dicts=attribute_dicts)
+            dimension_dicts.append(dimension_dict)
+        for attribute_dict in attribute_dicts.values():
+            for attr_dict in attribute_dict.values():
+                media_ids.update(attr_dict['media_ids'])
+
+        # 全部条件的资源热度一次查询
+        media_instances = Media.filter_objects(id__in=list(media_ids))
+        if isinstance(media_instances, Exception):
+            return media_instances
+        media_rows = list(media_instances.values_list('id', 'temperature', 'media_type'))
+
+        alpha = taxonomy.get_adjust_coefficient('alpha')
+        beta = taxonomy.get_adjust_coefficient('beta')
+        temperatures_dict = {}
+        jobs = []
+        for profile, dimension_dict in zip(profiles, dimension_dicts):
+            media_type = profile['media_type']
+            if media_type not in temperatures_dict:
+                temperatures_dict[media_type] = {
+                    media_id: temperature for media_id, temperature, item_media_type in media_rows
+                    if not media_type or item_media_type == media_type}
+            # 只传递该组条件用到的资源（进程池中执行时减少传输的数据）
+            profile_media_ids = set()
+            for attribute_dict in dimension_dict.values():
+                for attr_dict in attribute_dict.values():
+                    profile_media_ids.update(attr_dict['media_ids'])
+            temperatures = temperatures_dict[media_type]
+            temperatures = {media_id: temperatures[media_id] for media_id in profile_media_ids
+                            if media_id in temperatures}
+            jobs.append((dimension_dict, taxonomy.dimension_ids, temperatures,
+                         profile['first_dimension_id'], alpha, beta))
+
+        if processes is None:
+            processes = get_pool_processes()
+        results = score_profiles(jobs, processes=processes)
+        return [[{'media_id': item['media_id'], 'total': item['data']['total']}
+                 for item in match_result] for match_result in results]
+
+    def get_perfect_profiles(self, taxonomy, profiles):
+        """
+        校验并整理全部匹配条件，返回：(条件列表, 错误信息)
+        """
+        if not isinstance(profiles, list) or not profiles:
+            return None, 'Params [profiles] is incorrect.'
+        if len(profiles) > MATCH_BATCH_MAX_PROFILES:
+            return None, 'Params [profiles] can not exceed %d items.' % MATCH_BATCH_MAX_PROFILES
+
+        perfect_profiles = []
+        for index, profile in enumerate(profiles):
+            if (not isinstance(profile, dict) or 'first_dimension_id' not in profile or
+                    'tags_list' not in profile):
+                return None, 'Params [profiles][%d] is incorrect.' % index
+            is_valid, error_message = self.is_profile_valid(taxonomy,
+                                                            profile['first_dimension_id'],
+                                                            profile['tags_list'],
+                                                            profile.get('media_type'))
+            if not is_valid:
+                return None, {'index': index, 'error': error_message}
+            perfect_profiles.append({'first_dimension_id': profile['first_dimension_id'],
+                                     'tags_list': profile['tags_list'],
+                                     'media_type': profile.get('media_type') or None})
+        return perfect_profiles, None
+
+    def post(self, request, *args, **kwargs):
+        form = ResourceMatchBatchActionForm(request.data)
+        if not form.is_valid():
+            return Response({'Detail': form.errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        cld = form.cleaned_data
+        try:
+            profiles = json.loads(cld['profiles'])
+        except Exception as e:
+            return Response({'Detail': e.args}, status=status.HTTP_400_BAD_REQUEST)
+        taxonomy = TaxonomyCache().get_snapshot()
+        if isinstance(taxonomy, Exception):
+            return Response({'Detail': taxonomy.args}, status=status.HTTP_400_BAD_REQUEST)
+        profiles, error_message = self.get_perfect_profiles(taxonomy, profiles)
+        if error_message:
+            return Response({'Detail': error_message}, status=status.HTTP_400_BAD_REQUEST)
+
+        # 已缓存的条件直接使用缓存的结果，其余条件一起计算
+        match_function = partial(self.get_batch_match_results, taxonomy)
+        match_results = MatchResultCache().get_match_results(match_function, profiles)
+        if isinstance(match_results, Exception):
+            return Response({'Detail': match_results.args}, status=status.HTTP_400_BAD_REQUEST)
+
+        media_ids = set()
+        for match_result in match_results:
+            media_ids.update(item['media_id'] for item in match_result)
+        media_list = self.get_media_list(list(media_ids))
+        if isinstance(media_list, Exception):
+            return Response({'Detail': media_list.args}, status=status.HTTP_400_BAD_REQUEST)
+
+        data = []
+        for index, match_result in enumerate(match_results):
+            media_result = self.get_perfect_media_result(match_result, media_list)
+            serializer = MatchActionListSerializer(data=media_result)
+            if not serializer.is_valid():
+                return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+            data.append({'index': index, 'results': serializer.perfect_result()})
+        return Response({'count': len(data), 'data': data}, status=status.HTTP_200_OK)
@@ -0,0 +1,637 @@
+# -*- coding:utf8 -*-
+import math
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist
+
+from horizon import redis
+
+# 过期时间（单位：秒）
+EXPIRES_24_HOURS = 24 * 60 * 60
+EXPIRES_10_HOURS = 10 * 60 * 60
+
+# 空数据（0、空列表、空字典等）的过期时间
+EMPTY_EXPIRES = 5 * 60
+# 数据不存在（DoesNotExist）的过期时间
+NOT_FOUND_EXPIRES = 60
+
+# 数据过期后仍可返回旧数据的时间（重新生成数据期间或数据库不可用时使用）
+STALE_TTL = 10 * 60
+# 重新生成数据的锁的过期时间
+RECOMPUTE_LOCK_TIMEOUT = 10
+# 缓存不存在时，等待其他请求生成数据的最长时间
+RECOMPUTE_WAIT_TIMEOUT = 2
+# 提前刷新系数（XFetch算法中的beta，值越大越早刷新）
+EARLY_REFRESH_BETA = 1.0
+# 未记录生成耗时时使用的默认耗时（秒）
+DEFAULT_RECOMPUTE_SECONDS = 0.1
+
+# 各类数据（按Key去掉最后一段的前缀区分）最近一次生成耗时（秒），用于提前刷新
+_recompute_seconds = {}
+
+# 全量建立索引的锁的过期时间及等待时间（秒）
+INDEX_BUILD_LOCK_TIMEOUT = 5 * 60
+INDEX_BUILD_WAIT_TIMEOUT = 30
+# 删除旧索引时每批删除的Key数量
+INDEX_DELETE_BATCH_SIZE = 1000
+# 进程内代数缓存的过期时间（秒，失效通知丢失时最多使用旧代数的时间）
+GENERATION_CACHE_TIMEOUT = 60
+# 切换代数后旧索引保留的时间（秒）：大于进程内代数缓存的过期时间，
+# 仍在使用旧代数的进程及正在执行的查询可以继续读取旧索引
+INDEX_RETIRE_TIMEOUT = 5 * GENERATION_CACHE_TIMEOUT
+
+# 各命名空间当前代数的Hash：代数加1后，该命名空间下的旧Key不再被使用，等待过期后自动删除
+CACHE_GENERATION_KEY = 'cache_generation'
+
+# 进程内共享的Redis客户端（每个db一个连接池，所有缓存类共用）
+client_registry = redis.ClientRegistry(**getattr(settings, 'REDIS_POOL_SETTINGS', {}))
+
+# 进程内缓存（每个worker进程一份，所有缓存类共用）
+local_cache = redis.LocalCache(**getattr(settings, 'LOCAL_CACHE_SETTINGS', {}))
+
+# 进程内的命名空间代数缓存（代数变更时通过失效通知删除）
+generation_cache = redis.LocalCache(max_entries=10000, max_bytes=1024 * 1024,
+                                    timeout=GENERATION_CACHE_TIMEOUT)
+
+# 进程内快照：{命名空间: (代数, 建立时间, 快照)}
+_snapshots = {}
+_snapshot_lock = threading.Lock()
+
+
+def get_redis_client(db_name='web'):
+    return client_registry.get_client(host=settings.REDIS_SETTINGS['host'],
+                                      port=settings.REDIS_SETTINGS['port'],
+                                      db=settings.REDIS_SETTINGS['db_set'][db_name])
+
+
+def get_redis_pool_stats():
+    """
+    当前进程的Redis连接池使用情况
+    """
+    return client_registry.get_stats()
+
+
+def get_local_cache_stats():
+    """
+    当前进程的本地缓存命中统计
+    """
+    return local_cache.get_stats()
+
+
+class BaseCache(object):
+    """
+    缓存基类：数据序列化后存放在Redis中，use_local_cache为True时，
+    在Redis之前增加一层进程内缓存
+    """
+    db_name = 'web'
+    use_local_cache = False
+    expires = EXPIRES_24_HOURS
+    empty_expires = EMPTY_EXPIRES
+    not_found_expires = NOT_FOUND_EXPIRES
+    stale_ttl = STALE_TTL
+
+    def __init__(self):
+        self.handle = get_redis_client(self.db_name)
+        self.local_cache = local_cache if self.use_local_cache else None
+        if self.local_cache is not None:
+            self.local_cache.bind(self.handle)
+        generation_cache.bind(self.handle)
+
+    def get_generation_local_key(self, namespace):
+        return '%s:%s:%s' % (CACHE_GENERATION_KEY, self.db_name, namespace)
+
+    def get_generation(self, namespace):
+        """
+        命名空间的当前代数（进程内缓存）
+        """
+        local_key = self.get_generation_local_key(namespace)
+        generation = generation_cache.get(local_key)
+        if generation is None:
+            generation = self.handle.hget(CACHE_GENERATION_KEY, namespace) or b'0'
+            generation_cache.set(local_key, generation)
+        return int(generation)
+
+    def bump_generation(self, namespace):
+        """
+        命名空间代数加1，使该命名空间下的全部缓存失效，返回新的代数
+        """
+        generation = self.handle.hincrby(CACHE_GENERATION_KEY, namespace, 1)
+        generation_cache.invalidate(self.get_generation_local_key(namespace))
+        return generation
+
+    def refresh_generation(self, namespace):
+        """
+        丢弃进程内缓存的代数，下次使用时从Redis读取
+        """
+        generation_cache.delete(self.get_generation_local_key(namespace))
+
+    def get_generations(self):
+        """
+        全部命名空间的当前代数：{namespace: generation}
+        """
+        return {namespace: int(generation) for namespace, generation
+                in self.handle.hgetall(CACHE_GENERATION_KEY).items()}
+
+    def make_key(self, namespace, *args):
+        """
+        生成带命名空间代数的Key，格式：<namespace>:g<代数>[:<args>...]
+        """
+        parts = [namespace, 'g%d' % self.get_generation(namespace)]
+        parts.extend('%s' % arg for arg in args)
+        return ':'.join(parts)
+
+    def set_instance_to_cache(self, key, data, expires=None):
+        string = self.handle.translate_ins_to_str_for_string(data)
+        self.handle.set_string(key, string, ex=(expires or self.expires) + self.stale_ttl)
+        if self.local_cache is not None:
+            self.local_cache.set(key, string)
+            self.local_cache.publish_invalidation(key)
+
+    def get_instance_from_cache(self, key):
+        """
+        缓存不存在时返回None，数据不存在的标记返回redis.NOT_FOUND
+        """
+        string = None
+        if self.local_cache is not None:
+            string = self.local_cache.get(key)
+        if string is None:
+            string = self.handle.get_string(key)
+            if string and self.local_cache is not None:
+                self.local_cache.set(key, string)
+        if not string:
+            return None
+        return self.handle.translate_str_to_ins_for_string(string)
+
+    def set_instances_to_cache(self, data_dict, expires=None):
+        """
+        批量写入缓存（一个pipeline）
+        data_dict: {key: data}
+        """
+        if not data_dict:
+            return
+        strings = {key: self.handle.translate_ins_to_str_for_string(data)
+                   for key, data in data_dict.items()}
+        self.handle.set_strings_many(strings, ex=(expires or self.expires) + self.stale_ttl)
+        if self.local_cache is not None:
+            for key, string in strings.items():
+                self.local_cache.set(key, string)
+            self.local_cache.publish_invalidation(*strings.keys())
+
+    def get_instances_from_cache(self, keys):
+        """
+        批量读取缓存（本地缓存 + 一次MGET）
+        返回：与keys顺序一致的列表，未命中的Key对应None
+        """
+        strings = [None] * len(keys)
+        if self.local_cache is not None:
+            strings = [self.local_cache.get(key) for key in keys]
+        miss_indexes = [index for index, string in enumerate(strings) if string is None]
+        if miss_indexes:
+            miss_strings = self.handle.mget_strings([keys[index] for index in miss_indexes])
+            for index, string in zip(miss_indexes, miss_strings):
+                strings[index] = string
+                if string and self.local_cache is not None:
+                    self.local_cache.set(keys[index], string)
+        return [self.handle.translate_str_to_ins_for_string(string) if string else None
+                for string in strings]
+
+    def set_list_to_cache(self, key, *list_data):
+        """
+        空列表保存为只含NOT_FOUND标记的列表（过期时间为empty_expires），
+        之后lpushx/rpushx添加的数据仍可正常读取
+        """
+        pipe = self.handle.pipeline()
+        pipe.delete(key)
+        if list_data:
+            strings = self.handle.translate_instance_to_str(*list_data)
+            pipe.rpush(key, *strings)
+            pipe.expire(key, self.expires)
+        else:
+            pipe.rpush(key, self.handle.translate_ins_to_str_for_string(redis.NOT_FOUND))
+            pipe.expire(key, self.empty_expires)
+        pipe.execute()
+        if self.local_cache is not None:
+            self.local_cache.invalidate(key)
+
+    def get_list_from_cache(self, key, start=0, end=-1):
+        strings = self.get_list_strings_from_cache(key, start, end)
+        return self.translate_list_strings(strings)
+
+    def translate_list_strings(self, strings):
+        return [item for item in self.handle.translate_str_to_instance(*strings)
+                if item is not redis.NOT_FOUND]
+
+    def get_list_strings_from_cache(self, key, start=0, end=-1):
+        """
+        读取列表的原始字符串，列表不存在时返回空列表
+        """
+        strings = None
+        use_local_cache = self.local_cache is not None and (start, end) == (0, -1)
+        if use_local_cache:
+            strings = self.local_cache.get(key)
+        if strings is None:
+            strings = self.handle.lrange_strings(key, start, end)
+            if strings and use_local_cache:
+                self.local_cache.set(key, tuple(strings))
+        return strings
+
+    def delete_data_from_cache(self, *keys):
+        if not keys:
+            return 0
+        result = self.handle.delete(*keys)
+        self.invalidate_local_cache(*keys)
+        return result
+
+    def invalidate_local_cache(self, *keys):
+        """
+        直接通过self.handle修改了缓存数据后，需调用此方法使各进程的本地缓存失效
+        """
+        if self.local_cache is not None:
+            self.local_cache.invalidate(*keys)
+
+    def get_string_with_ttl(self, key):
+        """
+        读取原始字符串及剩余有效时间（一次往返）
+        有效时间已扣除stale_ttl，小于等于0表示已过期（旧数据），None表示永不过期
+        """
+        pipe = self.handle.pipeline(transaction=False)
+        pipe.get(key)
+        pipe.pttl(key)
+        string, pttl = pipe.execute()
+        if not string:
+            return None, None
+        if pttl is None or pttl < 0:
+            return string, None
+        return string, pttl / 1000.0 - self.stale_ttl
+
+    def get_recompute_lock_key(self, key):
+        return 'recompute_lock:%s' % key
+
+    def should_recompute(self, key, ttl):
+        """
+        过期后必须重新生成；过期前按XFetch算法随机提前刷新，生成耗时越长、越接近过期越容易刷新
+        """
+        if ttl is None:
+            return False
+        if ttl <= 0:
+            return True
+        delta = _recompute_seconds.get(key.rsplit(':', 1)[0], DEFAULT_RECOMPUTE_SECONDS)
+        return delta * EARLY_REFRESH_BETA * -math.log(1.0 - random.random()) >= ttl
+
+    def recompute_data(self, key, model_function, **kwargs):
+        """
+        重新生成数据并写入缓存：空数据及数据不存在也写入缓存（使用较短的过期时间），
+        其他错误（如数据库不可用）不写入缓存
+        """
+        start = time.time()
+        data = model_function(**kwargs)
+        if isinstance(data, ObjectDoesNotExist):
+            self.set_instance_to_cache(key, redis.NOT_FOUND, expires=self.not_found_expires)
+            return data
+        if isinstance(data, Exception):
+            return data
+        _recompute_seconds[key.rsplit(':', 1)[0]] = time.time() - start
+        self.set_instance_to_cache(key, data, expires=None if data else self.empty_expires)
+        return data
+
+    def perfect_cache_data(self, data):
+        if data is redis.NOT_FOUND:
+            return ObjectDoesNotExist('Matching data does not exist.')
+        return data
+
+    def get_perfect_data(self, key, model_function, **kwargs):
+        """
+        读取缓存，缓存不存在或已过期时重新生成：
+        同一时间只有一个请求重新生成数据，其他请求返回旧数据或等待生成结果；
+        重新生成失败（如数据库不可用）时，在stale_ttl时间内继续返回旧数据
+        """
+        if self.local_cache is not None:
+            string = self.local_cache.get(key)
+            if string:
+                return self.perfect_cache_data(self.handle.translate_str_to_ins_for_string(string))
+
+        string, ttl = self.get_string_with_ttl(key)
+        data = self.handle.translate_str_to_ins_for_string(string) if string else None
+        if data is not None:
+            if not self.should_recompute(key, ttl):
+                if self.local_cache is not None:
+                    self.local_cache.set(key, string)
+                return self.perfect_cache_data(data)
+            lock = self.handle.lock(self.get_recompute_lock_key(key),
+                                    timeout=RECOMPUTE_LOCK_TIMEOUT)
+            if not lock.acquire(blocking=False):
+                return self.perfect_cache_data(data)
+            try:
+                new_data = self.recompute_data(key, model_function, **kwargs)
+            except Exception as e:
+                new_data = e
+            finally:
+                self.release_lock(lock)
+            if (isinstance(new_data, Exception) and
+                    not isinstance(new_data, ObjectDoesNotExist)):
+                return self.perfect_cache_data(data)
+            return new_data
+
+        # 缓存不存在：等待获得锁的请求生成数据，超时后自行生成
+        lock = self.handle.lock(self.get_recompute_lock_key(key),
+                                timeout=RECOMPUTE_LOCK_TIMEOUT)
+        if not lock.acquire(blocking=True, blocking_timeout=RECOMPUTE_WAIT_TIMEOUT):
+            return self.recompute_data(key, model_function, **kwargs)
+        try:
+            data = self.get_instance_from_cache(key)
+            if data is None:
+                return self.recompute_data(key, model_function, **kwargs)
+        finally:
+            self.release_lock(lock)
+        return self.perfect_cache_data(data)
+
+    def update_instance_in_cache(self, key, update_function):
+        """
+        原地修改缓存中的数据（与重新生成数据使用同一把锁，避免并发修改丢失）：
+        update_function接收缓存中的数据，返回修改后的数据；缓存不存在时不处理
+        """
+        lock = self.handle.lock(self.get_recompute_lock_key(key),
+                                timeout=RECOMPUTE_LOCK_TIMEOUT)
+        if not lock.acquire(blocking=True, blocking_timeout=RECOMPUTE_WAIT_TIMEOUT):
+            # 无法获得锁时删除缓存，下次读取时重新生成
+            self.delete_data_from_cache(key)
+            return False
+        try:
+            string = self.handle.get_string(key)
+            data = self.handle.translate_str_to_ins_for_string(string) if string else None
+            if data is None or data is redis.NOT_FOUND:
+                return False
+            self.set_instance_to_cache(key, update_function(data))
+        finally:
+            self.release_lock(lock)
+        return True
+
+    def release_lock(self, lock):
+        try:
+            lock.release()
+        except redis.LockError:
+            # 锁已超时被释放（或已被其他请求获得）
+            pass
+
+    def get_perfect_list_data(self, key, model_function, **kwargs):
+        strings = self.get_list_strings_from_cache(key)
+        if strings:
+            return self.translate_list_strings(strings)
+
+        list_data = model_function(**kwargs)
+        if isinstance(list_data, Exception):
+            return list_data
+        self.set_list_to_cache(key, *list_data)
+        return list_data
+
+    def get_perfect_data_by_ids(self, ids_list, key_function, model_function, **kwargs):
+        """
+        批量获取详情：缓存批量读取，未命中的数据通过一次id__in查询从数据库读取，
+        并在一个pipeline中写回缓存
+        model_function: 批量查询函数（如Media.filter_details），返回含id字段的详情列表
+        返回：与ids_list顺序一致的详情列表（数据库中不存在的数据被忽略，并缓存为NOT_FOUND）
+        """
+        keys = [key_function(item_id) for item_id in ids_list]
+        data_list = self.get_instances_from_cache(keys)
+        miss_ids = list(set(item_id for item_id, data in zip(ids_list, data_list)
+                            if data is None))
+        if miss_ids:
+            kwargs['id__in'] = miss_ids
+            db_data_list = model_function(**kwargs)
+            if isinstance(db_data_list, Exception):
+                return db_data_list
+            db_data_dict = {item['id']: item for item in db_data_list}
+            self.set_instances_to_cache({key_function(item_id): item
+                                         for item_id, item in db_data_dict.items()})
+            self.set_instances_to_cache({key_function(item_id): redis.NOT_FOUND
+                                         for item_id in miss_ids
+                                         if item_id not in db_data_dict},
+                                        expires=self.not_found_expires)
+            data_list = [db_data_dict.get(item_id) if data is None else data
+                         for item_id, data in zip(ids_list, data_list)]
+        return [data for data in data_list if data is not None and data is not redis.NOT_FOUND]
+
+
+class BaseSnapshotCache(BaseCache):
+    """
+    进程内只读快照：首次使用时调用load_snapshot()整体建立，命名空间代数变化或建立超过
+    snapshot_max_age（防止数据不经过本项目修改）后重新建立，建立完成后整体替换，
+    读取方不会看到建立到一半的数据
+    """
+    namespace = None
+    snapshot_max_age = 10 * 60
+
+    def load_snapshot(self):
+        """
+        返回快照对象，数据库查询失败时返回Exception
+        """
+        raise NotImplementedError
+
+    def is_snapshot_valid(self, entry, generation):
+        return (entry is not None and entry[0] == generation and
+                time.time() - entry[1] < self.snapshot_max_age)
+
+    def get_snapshot(self):
+        generation = self.get_generation(self.namespace)
+        entry = _snapshots.get(self.namespace)
+        if self.is_snapshot_valid(entry, generation):
+            return entry[2]
+        with _snapshot_lock:
+            entry = _snapshots.get(self.namespace)
+            if self.is_snapshot_valid(entry, generation):
+                return entry[2]
+            built = time.time()
+            snapshot = self.load_snapshot()
+            if isinstance(snapshot, Exception):
+                return snapshot
+            _snapshots[self.namespace] = (generation, built, snapshot)
+        return snapshot
+
+    def invalidate_snapshot(self):
+        """
+        数据变更后调用，各进程下次使用时重新建立
+        """
+        return self.bump_generation(self.namespace)
+
+
+class BaseIndexCache(BaseCache):
+    """
+    Redis索引基类：索引的Key以"<命名空间>:g<代数>"为前缀，args为区分索引的参数（如资源类型）
+    全量建立：持有建立锁，写入下一代数的Key，完成后切换代数，旧索引在INDEX_RETIRE_TIMEOUT后过期；
+    建立期间building Key记录下一代数的前缀，增量更新同时写入当前索引及正在建立的索引，
+    并记录变更的数据，切换代数前按数据库中的最新数据重新写入（全量建立时读取的可能是旧数据）
+    子类实现get_index_namespace、write_index及write_index_item
+    """
+    build_lock_timeout = INDEX_BUILD_LOCK_TIMEOUT
+    build_wait_timeout = INDEX_BUILD_WAIT_TIMEOUT
+
+    def get_index_namespace(self, *args):
+        raise NotImplementedError
+
+    def write_index(self, prefix, *args):
+        """
+        把全部数据写入prefix下的Key，返回写入的数量，数据库查询失败时返回Exception
+        """
+        raise NotImplementedError
+
+    def write_index_item(self, prefix, member, *args):
+        """
+        按数据库中的最新数据重新写入一条数据（member为调用update_index_item时的标识）
+        """
+        raise NotImplementedError
+
+    def make_index_prefix(self, namespace, generation):
+        return '%s:g%d' % (namespace, generation)
+
+    def get_index_prefix(self, *args):
+        namespace = self.get_index_namespace(*args)
+        return self.make_index_prefix(namespace, self.get_generation(namespace))
+
+    def get_built_key(self, prefix):
+        return '%s:built' % prefix
+
+    def get_changed_key(self, prefix):
+        return '%s:changed' % prefix
+
+    def get_building_key(self, namespace):
+        return '%s:building' % namespace
+
+    def get_build_lock_key(self, namespace):
+        return '%s:build_lock' % namespace
+
+    def is_index_built(self, prefix):
+        return self.handle.exists(self.get_built_key(prefix))
+
+    def build_index(self, *args):
+        """
+        全量建立索引，返回写入的数量；等待其他进程建立超时时返回Exception
+        """
+        namespace = self.get_index_namespace(*args)
+        lock = self.handle.lock(self.get_build_lock_key(namespace),
+                                timeout=self.build_lock_timeout)
+        if not lock.acquire(blocking=True, blocking_timeout=self.build_wait_timeout):
+            return Exception('Index %s is being built by another process.' % namespace)
+        try:
+            return self.build_next_generation(namespace, *args)
+        finally:
+            self.release_lock(lock)
+
+    def ensure_index(self, *args):
+        """
+        索引尚未建立时全量建立（多个进程同时调用时只建立一次），返回当前索引的前缀
+        """
+        prefix = self.get_index_prefix(*args)
+        if self.is_index_built(prefix):
+            return prefix
+        namespace = self.get_index_namespace(*args)
+        lock = self.handle.lock(self.get_build_lock_key(namespace),
+                                timeout=self.build_lock_timeout)
+        if not lock.acquire(blocking=True, blocking_timeout=self.build_wait_timeout):
+            return prefix
+        try:
+            # 等待期间可能已由其他进程建立
+            self.refresh_generation(namespace)
+            prefix = self.get_index_prefix(*args)
+            if not self.is_index_built(prefix):
+                self.build_next_generation(namespace, *args)
+                prefix = self.get_index_prefix(*args)
+        finally:
+            self.release_lock(lock)
+        return prefix
+
+    def build_next_generation(self, namespace, *args):
+        """
+        写入下一代数的索引并切换代数（调用方需持有建立锁）
+        """
+        self.refresh_generation(namespace)
+        old_generation = self.get_generation(namespace)
+        old_prefix = self.make_index_prefix(namespace, old_generation)
+        prefix = self.make_index_prefix(namespace, old_generation + 1)
+        building_key = self.get_building_key(namespace)
+        # 上次建立中断时可能残留部分Key
+        self.delete_index(prefix)
+        # 上次切换后仍使用旧代数的进程可能在旧索引中写入了新Key（没有过期时间）
+        if old_generation > 0:
+            self.expire_index(self.make_index_prefix(namespace, old_generation - 1),
+                              INDEX_RETIRE_TIMEOUT)
+        # 先记录正在建立的索引再读取数据库，此后的增量更新都会写入新索引
+        self.handle.set_string(building_key, prefix, ex=self.build_lock_timeout)
+        try:
+            count = self.write_index(prefix, *args)
+            if isinstance(count, Exception):
+                self.delete_index(prefix)
+                return count
+            self.replay_changes(prefix, *args)
+            self.handle.set_string(self.get_built_key(prefix), count)
+            self.bump_generation(namespace)
+        finally:
+            self.handle.delete(building_key, self.get_changed_key(prefix))
+        # 其他进程的代数缓存更新前仍会查询旧索引，不立即删除
+        self.expire_index(old_prefix, INDEX_RETIRE_TIMEOUT)
+        return count
+
+    def replay_changes(self, prefix, *args):
+        """
+        建立期间变更的数据按数据库中的最新数据重新写入
+        """
+        changed_key = self.get_changed_key(prefix)
+        member = self.handle.spop(changed_key)
+        while member is not None:
+            self.write_index_item(prefix, member.decode('utf8'), *args)
+            member = self.handle.spop(changed_key)
+
+    def update_index_item(self, member, write_function, *args):
+        """
+        增量更新一条数据：write_function(prefix)写入当前索引（已建立时）及正在建立的索引
+        member: 数据的标识（正在建立索引时记录，用于replay_changes）
+        返回：是否写入了索引（索引尚未建立时不处理，首次查询时全量建立）
+        """
+        namespace = self.get_index_namespace(*args)
+        # 从Redis读取当前代数，不写入已被替换的旧索引
+        self.refresh_generation(namespace)
+        prefix = self.get_index_prefix(*args)
+        pipe = self.handle.pipeline(transaction=False)
+        pipe.exists(self.get_built_key(prefix))
+        pipe.get(self.get_building_key(namespace))
+        is_built, building_prefix = pipe.execute()
+
+        prefixes = [prefix] if is_built else []
+        if building_prefix and building_prefix.decode('utf8') != prefix:
+            building_prefix = building_prefix.decode('utf8')
+            changed_key = self.get_changed_key(building_prefix)
+            pipe = self.handle.pipeline(transaction=False)
+            pipe.sadd(changed_key, member)
+            pipe.expire(changed_key, self.build_lock_timeout)
+            pipe.execute()
+            prefixes.append(building_prefix)
+        for item_prefix in prefixes:
+            write_function(item_prefix)
+        return bool(prefixes)
+
+    def expire_index(self, prefix, timeout):
+        """
+        为prefix下的全部Key设置过期时间（SCAN分批设置，不阻塞Redis）
+        """
+        pipe = self.handle.pipeline(transaction=False)
+        for index, key in enumerate(self.handle.scan_iter(match='%s:*' % prefix,
+                                                          count=INDEX_DELETE_BATCH_SIZE)):
+            pipe.expire(key, timeout)
+            if (index + 1) % INDEX_DELETE_BATCH_SIZE == 0:
+                pipe.execute()
+        pipe.execute()
+
+    def delete_index(self, prefix):
+        """
+        删除prefix下的全部Key（SCAN分批删除，不阻塞Redis）
+        """
+        keys = []
+        for key in self.handle.scan_iter(match='%s:*' % prefix, count=INDEX_DELETE_BATCH_SIZE):
+            keys.append(key)
+            if len(keys) >= INDEX_DELETE_BATCH_SIZE:
+                self.handle.delete(*keys)
+                keys = []
+        if keys:
+            self.handle.delete(*keys)
@@ -0,0 +1,81 @@
+# -*- coding:utf8 -*-
+"""
+游标（keyset）分页：游标记录上一页最后一条数据的(排序值, ID)，下一页只读取排在其后的数据，
+数据修改或新增时不会导致翻页错位，且每页的开销与页数无关。
+
+请求参数cursor：第一页传CURSOR_START，之后传上一页返回的next_cursor。
+"""
+import base64
+import datetime
+import json
+import math
+
+from django.db.models import Q
+
+# 第一页的游标
+CURSOR_START = 'start'
+
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+
+def encode_cursor(sort_value, item_id):
+    if isinstance(sort_value, datetime.datetime):
+        sort_value = {'dt': sort_value.strftime(DATETIME_FORMAT)}
+    string = json.dumps([sort_value, item_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(string).rstrip('=')
+
+
+def decode_cursor(cursor, sort_type):
+    """
+    sort_type: 排序值的类型，float（Redis有序集合的分数）或datetime.datetime（数据库时间字段）
+    返回：(排序值, ID)，第一页返回(None, None)，游标不正确（包括排序值类型不符）时返回Exception
+    """
+    if cursor == CURSOR_START:
+        return None, None
+    error = Exception('Params [cursor] is incorrect.')
+    try:
+        string = base64.urlsafe_b64decode(str(cursor) + '=' * (-len(cursor) % 4))
+        sort_value, item_id = json.loads(string)
+    except Exception:
+        return error
+    if isinstance(item_id, bool) or not isinstance(item_id, (int, long)):
+        return error
+
+    if sort_type is datetime.datetime:
+        if (not isinstance(sort_value, dict) or list(sort_value.keys()) != ['dt'] or
+                not isinstance(sort_value['dt'], basestring)):
+            return error
+        try:
+            sort_value = datetime.datetime.strptime(sort_value['dt'], DATETIME_FORMAT)
+        except ValueError:
+            return error
+    elif sort_type is float:
+        if isinstance(sort_value, bool) or not isinstance(sort_value, (int, long, float)):
+            return error
+        sort_value = float(sort_value)
+        if math.isinf(sort_value) or math.isnan(sort_value):
+            return error
+    else:
+        raise ValueError('Sort type %r is not supported.' % sort_type)
+    return sort_value, item_id
+
+
+def keyset_page(queryset, cursor, page_size, sort_field='created'):
+    """
+    数据库游标分页：按(sort_field, id)倒序，读取游标之后的page_size条数据
+    （sort_field为时间字段；需要(过滤条件, sort_field, id)上的索引才能只扫描一页的范围）
+    返回：(当前页的数据列表, 下一页的游标（没有下一页时为None）)，游标不正确时返回Exception
+    """
+    last_position = decode_cursor(cursor, datetime.datetime)
+    if isinstance(last_position, Exception):
+        return last_position
+    sort_value, item_id = last_position
+    if sort_value is not None:
+        queryset = queryset.filter(Q(**{'%s__lt' % sort_field: sort_value}) |
+                                   Q(**{sort_field: sort_value, 'id__lt': item_id}))
+    instances = list(queryset.order_by('-%s' % sort_field, '-id')[:page_size + 1])
+    next_cursor = None
+    if len(instances) > page_size:
+        instances = instances[:page_size]
+        next_cursor = encode_cursor(getattr(instances[-1], sort_field), instances[-1].id)
+    return instances, next_cursor
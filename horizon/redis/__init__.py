@@ -1,2 +1,7 @@
 from redis import *
-from .client import Redis
\ No newline at end of file
+from redis.exceptions import LockError
+from .client import Redis
+from .codec import JsonCodec, PickleCodec, NOT_FOUND, encode_value, decode_value
+from .counter import HashCounter
+from .local_cache import LocalCache
+from .registry import ClientRegistry, HealthCheckConnectionPool
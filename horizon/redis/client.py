@@ -1,30 +1,34 @@
 # -*- coding:utf8 -*-
 import redis
-import pickle
-from horizon.storage import yinshi_storage
-from django.db.models.fields.files import FieldFile, FileField
-from django.db.models import Model
+from horizon.redis.codec import encode_value, decode_value
 
 
 class Redis(redis.Redis):
     def __init__(self, *args, **kwargs):
+        # 写入缓存时使用的编码方式，默认为带版本号的JSON格式（horizon.redis.codec）
+        self.codec = kwargs.pop('codec', None)
         super(Redis, self).__init__(*args, **kwargs)
+        # 同一连接池上不经过编码的原生客户端（用于分布式锁）
+        self.raw_client = redis.StrictRedis(connection_pool=self.connection_pool)
+
+    def lock(self, name, *args, **kwargs):
+        """
+        分布式锁：Lock用SET写入token、释放时与原始token比较，token不能经过编码，
+        因此使用原生客户端（与本客户端共用连接池）
+        """
+        return self.raw_client.lock(name, *args, **kwargs)
 
     def incr(self, name, amount=1):
-        current_count = self.get(name) if self.get(name) else 0
-        value = current_count + amount
-        if self.set(name, value):
-            return value
-        else:
-            return current_count
+        """
+        原子自增（服务端INCRBY），计数值以整数原样存储，不经过pickle序列化
+        """
+        return super(Redis, self).incr(name, amount)
 
     def decr(self, name, amount=1):
-        current_count = self.get(name) if self.get(name) else 0
-        value = current_count + amount
-        if self.set(name, value):
-            return value
-        else:
-            return current_count
+        """
+        原子自减（服务端DECRBY），计数值以整数原样存储，不经过pickle序列化
+        """
+        return super(Redis, self).decr(name, amount)
 
     def rpush(self, name, *values):
         pk_values = self.translate_instance_to_str(*values)
@@ -56,30 +60,60 @@ class Redis(redis.Redis):
             return string
         return self.translate_str_to_ins_for_string(string)
 
+    def mget(self, keys, *args):
+        strings = super(Redis, self).mget(keys, *args)
+        return [self.translate_str_to_ins_for_string(string) if string else string
+                for string in strings]
+
+    def set_string(self, name, string, **kwargs):
+        """
+        写入已序列化的字符串
+        """
+        return super(Redis, self).set(name, string, **kwargs)
+
+    def get_string(self, name):
+        """
+        读取未反序列化的原始字符串
+        """
+        return super(Redis, self).get(name)
+
+    def mget_strings(self, keys, *args):
+        """
+        批量读取未反序列化的原始字符串（一次MGET），不存在的Key对应None
+        """
+        return super(Redis, self).mget(keys, *args)
+
+    def set_strings_many(self, mapping, ex=None):
+        """
+        批量写入已序列化的字符串（一个pipeline，一次往返）
+        """
+        if not mapping:
+            return []
+        pipe = self.pipeline(transaction=False)
+        for name, string in mapping.items():
+            pipe.set(name, string, ex=ex)
+        return pipe.execute()
+
+    def lrange_strings(self, name, start=0, end=-1):
+        """
+        读取未反序列化的原始字符串列表
+        """
+        return super(Redis, self).lrange(name, start, end)
+
     def translate_ins_to_str_for_string(self, value):
-        return pickle.dumps(value)
+        return encode_value(value, self.codec)
 
     def translate_str_to_ins_for_string(self, string):
-        return self.get_perfect_object_data(string)
+        return decode_value(string)
 
     def translate_instance_to_str(self, *values):
-        return [pickle.dumps(arg) for arg in values]
+        return [encode_value(arg, self.codec) for arg in values]
 
     def translate_str_to_instance(self, *values):
-        return [self.get_perfect_object_data(arg) for arg in values]
+        return [decode_value(arg) for arg in values]
 
     def get_perfect_object_data(self, value):
         """
-        解决反序列化数据后，文件的storage属性丢失的问题
-        """
-        object_data = pickle.loads(value)
-        if isinstance(object_data, dict):
-            for key, item in object_data.items():
-                if issubclass(type(item), (FieldFile, FileField)):
-                    if not hasattr(item, 'storage'):
-                        setattr(object_data[key], 'storage', yinshi_storage)
-        elif issubclass(type(object_data), Model):
-            for field in object_data._meta.fields:
-                if issubclass(type(field), (FieldFile, FileField)):
-                    setattr(getattr(object_data, field.name), 'storage', yinshi_storage)
-        return object_data
+        反序列化数据（兼容旧的pickle格式）
+        """
+        return decode_value(value)
@@ -0,0 +1,179 @@
+# -*- coding:utf8 -*-
+"""
+缓存数据编解码
+
+JsonCodec：首字节为版本号，之后为紧凑的JSON数据。
+    Model实例只保存各字段的原始值（文件字段只保存文件名），读取时按当前的Model结构重建，
+    Model增加字段后旧缓存仍可读取（缺少的字段按延迟加载处理）；
+    文件字段读取时重建为绑定默认存储器的FieldFile，图片URL在使用时才生成。
+PickleCodec：旧的pickle格式，仅用于读取历史缓存及无法用JSON表示的数据。
+"""
+import datetime
+import json
+import pickle
+from decimal import Decimal
+
+from django.apps import apps
+from django.db import models, router
+from django.db.models.fields.files import FieldFile, FileField, ImageFieldFile
+
+from horizon.storage import yinshi_storage
+
+JSON_CODEC_VERSION = b'\x01'
+# "数据不存在"标记的编码（与JSON及pickle格式的首字节都不相同）
+NOT_FOUND_STRING = b'\x00'
+
+# 重建FieldFile时使用的文件字段（只用于提供storage）
+_lazy_file_field = models.ImageField(storage=yinshi_storage)
+
+
+class NotFound(object):
+    """
+    缓存中"数据不存在"的标记（布尔值为False）
+    """
+    def __nonzero__(self):
+        return False
+
+    def __repr__(self):
+        return 'NOT_FOUND'
+
+
+NOT_FOUND = NotFound()
+
+
+class PickleCodec(object):
+    """
+    pickle格式（无版本号）
+    """
+    def encode(self, value):
+        return pickle.dumps(value)
+
+    def decode(self, string):
+        """
+        解决反序列化数据后，文件的storage属性丢失的问题
+        """
+        object_data = pickle.loads(string)
+        if isinstance(object_data, dict):
+            for key, item in object_data.items():
+                if issubclass(type(item), (FieldFile, FileField)):
+                    if not hasattr(item, 'storage'):
+                        setattr(object_data[key], 'storage', yinshi_storage)
+        elif issubclass(type(object_data), models.Model):
+            for field in object_data._meta.fields:
+                if issubclass(type(field), (FieldFile, FileField)):
+                    setattr(getattr(object_data, field.name), 'storage', yinshi_storage)
+        return object_data
+
+
+class JsonCodec(object):
+    """
+    带版本号的JSON格式
+    """
+    version = JSON_CODEC_VERSION
+
+    def encode(self, value):
+        string = json.dumps(self.to_plain(value), separators=(',', ':'), ensure_ascii=False)
+        if isinstance(string, unicode):
+            string = string.encode('utf8')
+        return self.version + string
+
+    def decode(self, string):
+        return json.loads(string[len(self.version):].decode('utf8'),
+                          object_hook=self.from_plain)
+
+    def to_plain(self, value):
+        if value is None or isinstance(value, (bool, int, long, float, basestring)):
+            return value
+        if isinstance(value, dict):
+            if all(isinstance(key, basestring) and not key.startswith('__')
+                   for key in value):
+                return {key: self.to_plain(item) for key, item in value.items()}
+            # 其他类型的Key（如元组）解码后无法作为字典的Key，改用pickle格式
+            for key in value:
+                if not (key is None or isinstance(key, (bool, int, long, float, basestring))):
+                    raise TypeError('%r is not supported as a key by JsonCodec' % type(key))
+            return {'__d__': [[key, self.to_plain(item)] for key, item in value.items()]}
+        if isinstance(value, list):
+            return [self.to_plain(item) for item in value]
+        if isinstance(value, tuple):
+            return {'__t__': [self.to_plain(item) for item in value]}
+        if isinstance(value, datetime.datetime):
+            return {'__dt__': value.strftime('%Y-%m-%dT%H:%M:%S.%f')}
+        if isinstance(value, datetime.date):
+            return {'__date__': value.strftime('%Y-%m-%d')}
+        if isinstance(value, Decimal):
+            return {'__dec__': str(value)}
+        if isinstance(value, FieldFile):
+            return {'__f__': value.name}
+        if isinstance(value, models.Model):
+            return {'__m__': value._meta.label, 'v': self.model_to_plain(value)}
+        raise TypeError('%r is not supported by JsonCodec' % type(value))
+
+    def model_to_plain(self, instance):
+        values = {}
+        for field in instance._meta.concrete_fields:
+            value = getattr(instance, field.attname)
+            if isinstance(value, FieldFile):
+                value = value.name
+            values[field.attname] = self.to_plain(value)
+        return values
+
+    def from_plain(self, obj):
+        if len(obj) == 1:
+            key, value = next(iter(obj.items()))
+            if key == '__dt__':
+                return datetime.datetime.strptime(value, '%Y-%m-%dT%H:%M:%S.%f')
+            if key == '__date__':
+                return datetime.datetime.strptime(value, '%Y-%m-%d').date()
+            if key == '__dec__':
+                return Decimal(value)
+            if key == '__f__':
+                return ImageFieldFile(None, _lazy_file_field, value)
+            if key == '__d__':
+                return {item_key: item for item_key, item in value}
+            if key == '__t__':
+                return tuple(value)
+        elif len(obj) == 2 and '__m__' in obj and 'v' in obj:
+            return self.model_from_plain(obj['__m__'], obj['v'])
+        return obj
+
+    def model_from_plain(self, label, values):
+        model_class = apps.get_model(label)
+        field_names = []
+        field_values = []
+        for field in model_class._meta.concrete_fields:
+            if field.attname in values:
+                field_names.append(field.attname)
+                field_values.append(values[field.attname])
+        return model_class.from_db(router.db_for_read(model_class), field_names, field_values)
+
+
+pickle_codec = PickleCodec()
+json_codec = JsonCodec()
+
+# 写入缓存使用的编码方式
+default_codec = json_codec
+
+
+def encode_value(value, codec=None):
+    """
+    编码：无法用JSON表示的数据自动改用pickle格式
+    """
+    if value is NOT_FOUND:
+        return NOT_FOUND_STRING
+    codec = codec or default_codec
+    try:
+        return codec.encode(value)
+    except (TypeError, ValueError):
+        return pickle_codec.encode(value)
+
+
+def decode_value(string):
+    """
+    解码：根据首字节判断编码格式（pickle数据的首字节不会是版本号）
+    """
+    if string == NOT_FOUND_STRING:
+        return NOT_FOUND
+    if string[:len(JSON_CODEC_VERSION)] == JSON_CODEC_VERSION:
+        return json_codec.decode(string)
+    return pickle_codec.decode(string)
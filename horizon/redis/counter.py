@@ -0,0 +1,146 @@
+# -*- coding:utf8 -*-
+"""
+基于Redis Hash的计数器：同一资源的多个计数字段存放在一个Hash中，
+加减操作在服务端原子完成（Lua脚本 + HINCRBY），一次往返返回全部计数。
+"""
+
+# 计数器不存在时返回nil，由调用方从数据库初始化后重试
+COUNTER_INCR_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return false
+end
+redis.call('HINCRBY', KEYS[1], ARGV[1], ARGV[2])
+if #KEYS > 1 then
+    redis.call('SADD', KEYS[2], KEYS[1])
+end
+if tonumber(ARGV[3]) > 0 then
+    redis.call('EXPIRE', KEYS[1], ARGV[3])
+end
+return redis.call('HMGET', KEYS[1], unpack(ARGV, 4))
+"""
+
+# 初始化计数器：使用HSETNX，不会覆盖并发请求已经写入的计数
+COUNTER_INIT_SCRIPT = """
+for i = 2, #ARGV, 2 do
+    redis.call('HSETNX', KEYS[1], ARGV[i], ARGV[i + 1])
+end
+if tonumber(ARGV[1]) > 0 then
+    redis.call('EXPIRE', KEYS[1], ARGV[1])
+end
+return 1
+"""
+
+# 校正计数：只修改仍等于读取时的值的字段（读取后并发的加减操作不会被覆盖），返回修改的字段数量
+COUNTER_COMPARE_AND_SET_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+local count = 0
+for i = 1, #ARGV, 3 do
+    if redis.call('HGET', KEYS[1], ARGV[i]) == ARGV[i + 1] then
+        redis.call('HSET', KEYS[1], ARGV[i], ARGV[i + 2])
+        count = count + 1
+    end
+end
+return count
+"""
+
+# 批量取出待写回数据库的计数器Key（取出即删除，多个写回进程不会重复处理）
+COUNTER_POP_DIRTY_SCRIPT = """
+local keys = redis.call('SRANDMEMBER', KEYS[1], ARGV[1])
+if #keys > 0 then
+    redis.call('SREM', KEYS[1], unpack(keys))
+end
+return keys
+"""
+
+
+class HashCounter(object):
+    def __init__(self, handle, fields, expires=0, dirty_set_key=None):
+        """
+        dirty_set_key: 记录有变动的计数器Key的集合（用于异步写回数据库），为None时不记录
+        """
+        self.handle = handle
+        self.fields = tuple(fields)
+        self.expires = expires
+        self.dirty_set_key = dirty_set_key
+        self._incr_script = handle.register_script(COUNTER_INCR_SCRIPT)
+        self._init_script = handle.register_script(COUNTER_INIT_SCRIPT)
+        self._compare_and_set_script = handle.register_script(COUNTER_COMPARE_AND_SET_SCRIPT)
+        self._pop_dirty_script = handle.register_script(COUNTER_POP_DIRTY_SCRIPT)
+
+    def make_counts_dict(self, values):
+        if values is None or all(value is None for value in values):
+            return None
+        return {field: int(value or 0) for field, value in zip(self.fields, values)}
+
+    def get_counts(self, key):
+        """
+        获取全部计数，计数器不存在时返回None
+        """
+        return self.make_counts_dict(self.handle.hmget(key, self.fields))
+
+    def get_counts_many(self, keys):
+        """
+        批量获取计数（一次往返），返回与keys顺序一致的列表
+        """
+        if not keys:
+            return []
+        pipe = self.handle.pipeline(transaction=False)
+        for key in keys:
+            pipe.hmget(key, self.fields)
+        return [self.make_counts_dict(values) for values in pipe.execute()]
+
+    def init_counts(self, key, counts_dict):
+        """
+        用数据库中的数据初始化计数器，返回初始化后的全部计数
+        """
+        args = [self.expires]
+        for field in self.fields:
+            args.extend([field, int(counts_dict.get(field) or 0)])
+        self._init_script(keys=[key], args=args)
+        return self.get_counts(key)
+
+    def incr(self, key, field, amount=1):
+        """
+        原子加减计数，返回操作后的全部计数；计数器不存在时返回None
+        """
+        if field not in self.fields:
+            raise ValueError('Field %s is not in %s' % (field, list(self.fields)))
+        keys = [key]
+        if self.dirty_set_key:
+            keys.append(self.dirty_set_key)
+        args = [field, amount, self.expires]
+        args.extend(self.fields)
+        values = self._incr_script(keys=keys, args=args)
+        return self.make_counts_dict(values)
+
+    def set_counts(self, key, counts_dict, old_counts_dict):
+        """
+        校正计数（服务端原子操作）：只修改当前值仍等于old_counts_dict中的值的字段，
+        计数器不存在时不做处理
+        返回：修改的字段数量
+        """
+        args = []
+        for field, count in counts_dict.items():
+            if field in self.fields and field in old_counts_dict:
+                args.extend([field, int(old_counts_dict[field]), int(count)])
+        if not args:
+            return 0
+        return self._compare_and_set_script(keys=[key], args=args)
+
+    def pop_dirty_keys(self, count=500):
+        """
+        取出（并移除）一批有变动的计数器Key
+        """
+        if not self.dirty_set_key:
+            return []
+        return self._pop_dirty_script(keys=[self.dirty_set_key], args=[count])
+
+    def mark_dirty(self, *keys):
+        """
+        重新标记计数器Key为有变动（写回数据库失败时调用）
+        """
+        if not self.dirty_set_key or not keys:
+            return 0
+        return self.handle.sadd(self.dirty_set_key, *keys)
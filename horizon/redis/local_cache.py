@@ -0,0 +1,183 @@
+# -*- coding:utf8 -*-
+"""
+进程内（每个uwsgi worker一份）LRU + TTL缓存，位于Redis缓存之前。
+缓存的是Redis中存储的原始字符串，每次读取都重新反序列化，调用方修改返回的数据不会影响缓存。
+任意进程修改或删除缓存时，通过Redis发布/订阅通知其他进程删除对应的本地缓存。
+"""
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+# 本地缓存失效通知频道
+LOCAL_CACHE_INVALIDATE_CHANNEL = 'local_cache:invalidate'
+# 清空全部本地缓存
+INVALIDATE_ALL = '*'
+
+
+class LocalCache(object):
+    def __init__(self, max_entries=10000, max_bytes=32 * 1024 * 1024, timeout=60):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+
+        self._lock = threading.RLock()
+        self._handle = None
+        self._listener = None
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._origin = uuid.uuid4().hex
+        self._data = OrderedDict()
+        self._bytes = 0
+        self._listener = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _check_process(self):
+        # uwsgi fork出worker后，丢弃从master进程继承的数据及订阅线程
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._reset()
+
+    def bind(self, handle):
+        """
+        绑定Redis客户端（用于发布失效通知），并在当前进程启动订阅线程
+        """
+        self._check_process()
+        if self._handle is None:
+            self._handle = handle
+        if self._listener is None or not self._listener.is_alive():
+            with self._lock:
+                if self._listener is None or not self._listener.is_alive():
+                    self._listener = threading.Thread(target=self._listen,
+                                                      name='local-cache-invalidation')
+                    self._listener.daemon = True
+                    self._listener.start()
+
+    def _listen(self):
+        pid = os.getpid()
+        while pid == os.getpid():
+            try:
+                pubsub = self._handle.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(LOCAL_CACHE_INVALIDATE_CHANNEL)
+                # 订阅（重新订阅）期间可能漏掉通知，清空本地缓存
+                self.clear()
+                # 连接池设置了socket_timeout，不能使用阻塞的listen()
+                while pid == os.getpid():
+                    message = pubsub.get_message(timeout=1.0)
+                    if not message or message.get('type') != 'message':
+                        continue
+                    self._on_message(message['data'])
+            except Exception:
+                time.sleep(1)
+
+    def _on_message(self, data):
+        origin, _, key = data.partition(' ')
+        if origin == self._origin:
+            return
+        with self._lock:
+            self.invalidations += 1
+        if key == INVALIDATE_ALL:
+            self.clear()
+        else:
+            self.delete(key)
+
+    def get(self, key):
+        self._check_process()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            expires, value, size = item
+            if expires < time.time():
+                self._pop(key)
+                self.misses += 1
+                return None
+            # LRU：移到最后
+            del self._data[key]
+            self._data[key] = item
+            self.hits += 1
+            return value
+
+    def set(self, key, value, timeout=None):
+        self._check_process()
+        size = self.get_size(value)
+        if size > self.max_bytes:
+            return
+        expires = time.time() + (timeout or self.timeout)
+        with self._lock:
+            self._pop(key)
+            self._data[key] = (expires, value, size)
+            self._bytes += size
+            while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+                oldest_key = next(iter(self._data))
+                self._pop(oldest_key)
+                self.evictions += 1
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def _pop(self, key):
+        item = self._data.pop(key, None)
+        if item is not None:
+            self._bytes -= item[2]
+
+    def get_size(self, value):
+        if isinstance(value, (list, tuple)):
+            return sum(len(item) for item in value)
+        return len(value)
+
+    def publish_invalidation(self, *keys):
+        """
+        通知其他进程删除本地缓存
+        """
+        if self._handle is None:
+            return 0
+        self._check_process()
+        if len(keys) == 1:
+            self._handle.publish(LOCAL_CACHE_INVALIDATE_CHANNEL, '%s %s' % (self._origin, keys[0]))
+        elif keys:
+            pipe = self._handle.pipeline(transaction=False)
+            for key in keys:
+                pipe.publish(LOCAL_CACHE_INVALIDATE_CHANNEL, '%s %s' % (self._origin, key))
+            pipe.execute()
+        return len(keys)
+
+    def invalidate(self, *keys):
+        """
+        删除本进程及其他进程中的本地缓存
+        """
+        self.delete(*keys)
+        return self.publish_invalidation(*keys)
+
+    def invalidate_all(self):
+        self.clear()
+        return self.publish_invalidation(INVALIDATE_ALL)
+
+    def get_stats(self):
+        with self._lock:
+            requests = self.hits + self.misses
+            return {'pid': self._pid,
+                    'entries': len(self._data),
+                    'bytes': self._bytes,
+                    'max_entries': self.max_entries,
+                    'max_bytes': self.max_bytes,
+                    'hits': self.hits,
+                    'misses': self.misses,
+                    'hit_ratio': float(self.hits) / requests if requests else 0.0,
+                    'evictions': self.evictions,
+                    'invalidations': self.invalidations}
@@ -0,0 +1,141 @@
+# -*- coding:utf8 -*-
+"""
+进程内共享的Redis连接池及客户端：每个(host, port, db)只创建一个连接池和一个客户端，
+所有缓存类共用，避免每次实例化缓存类都新建连接。
+uwsgi fork出worker后，丢弃从master进程继承的连接池，在worker进程中重新创建。
+"""
+import os
+import threading
+import time
+
+import redis
+
+from horizon.redis.client import Redis
+
+
+class HealthCheckConnectionPool(redis.ConnectionPool):
+    """
+    取出空闲时间超过health_check_interval的连接时先发送PING，连接失效则断开重连；
+    并记录连接池使用情况
+    """
+    def __init__(self, health_check_interval=30, **kwargs):
+        self.health_check_interval = health_check_interval
+        self.checkouts = 0
+        self.health_checks = 0
+        self.health_check_failures = 0
+        super(HealthCheckConnectionPool, self).__init__(**kwargs)
+
+    def get_connection(self, command_name, *keys, **options):
+        connection = super(HealthCheckConnectionPool, self).get_connection(
+            command_name, *keys, **options)
+        self.checkouts += 1
+        last_used = getattr(connection, '_last_used', None)
+        if (self.health_check_interval and last_used and
+                time.time() - last_used > self.health_check_interval):
+            self.check_connection(connection)
+        return connection
+
+    def release(self, connection):
+        connection._last_used = time.time()
+        super(HealthCheckConnectionPool, self).release(connection)
+
+    def check_connection(self, connection):
+        self.health_checks += 1
+        try:
+            connection.send_command('PING')
+            connection.read_response()
+        except (redis.ConnectionError, redis.TimeoutError):
+            # 断开后，下次发送命令时自动重连
+            self.health_check_failures += 1
+            connection.disconnect()
+
+    def get_stats(self):
+        return {'created_connections': self._created_connections,
+                'available_connections': len(self._available_connections),
+                'in_use_connections': len(self._in_use_connections),
+                'max_connections': self.max_connections,
+                'checkouts': self.checkouts,
+                'health_checks': self.health_checks,
+                'health_check_failures': self.health_check_failures}
+
+
+class ClientRegistry(object):
+    def __init__(self, socket_timeout=5, socket_connect_timeout=2, max_connections=64,
+                 health_check_interval=30, **options):
+        """
+        options: 其他传给ConnectionPool的参数（如socket_keepalive、retry_on_timeout）
+        """
+        self.options = dict(options,
+                            socket_timeout=socket_timeout,
+                            socket_connect_timeout=socket_connect_timeout,
+                            max_connections=max_connections,
+                            health_check_interval=health_check_interval)
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._pools = {}
+        self._clients = {}
+
+    def _check_process(self):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._reset()
+
+    def get_pool(self, host='127.0.0.1', port=6379, db=0):
+        self._check_process()
+        key = (host, port, db)
+        pool = self._pools.get(key)
+        if pool is None:
+            with self._lock:
+                pool = self._pools.get(key)
+                if pool is None:
+                    pool = HealthCheckConnectionPool(host=host, port=port, db=db,
+                                                     **self.options)
+                    self._pools[key] = pool
+        return pool
+
+    def get_client(self, host='127.0.0.1', port=6379, db=0):
+        """
+        获取共享的客户端（线程安全，可在多个线程中同时使用）
+        """
+        self._check_process()
+        key = (host, port, db)
+        client = self._clients.get(key)
+        if client is None:
+            pool = self.get_pool(host, port, db)
+            with self._lock:
+                client = self._clients.get(key)
+                if client is None:
+                    client = Redis(connection_pool=pool)
+                    self._clients[key] = client
+        return client
+
+    def health_check(self):
+        """
+        检查全部客户端的连接，返回：{'host:port/db': True/False}
+        """
+        self._check_process()
+        result = {}
+        for (host, port, db), client in list(self._clients.items()):
+            try:
+                result['%s:%s/%s' % (host, port, db)] = bool(client.ping())
+            except (redis.ConnectionError, redis.TimeoutError):
+                result['%s:%s/%s' % (host, port, db)] = False
+        return result
+
+    def get_stats(self):
+        self._check_process()
+        stats = {}
+        for (host, port, db), pool in list(self._pools.items()):
+            pool_stats = pool.get_stats()
+            pool_stats['pid'] = self._pid
+            stats['%s:%s/%s' % (host, port, db)] = pool_stats
+        return stats
+
+    def disconnect_all(self):
+        with self._lock:
+            for pool in self._pools.values():
+                pool.disconnect()
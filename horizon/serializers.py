@@ -16,7 +16,61 @@ import datetime
 import urllib
 
 
+class LazyList(object):
+    """
+    延迟获取数据的列表：只保存ID列表，切片时才调用hydrate_function获取该部分ID的数据，
+    用于分页时只获取当前页的数据
+    hydrate_function: 参数为ID列表，返回数据列表或Exception
+    """
+    def __init__(self, ids_list, hydrate_function):
+        self.ids_list = ids_list
+        self.hydrate_function = hydrate_function
+
+    def __len__(self):
+        return len(self.ids_list)
+
+    def count(self):
+        return len(self.ids_list)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            result = self.hydrate_function(self.ids_list[index])
+        else:
+            result = self.hydrate_function([self.ids_list[index]])
+        if isinstance(result, Exception):
+            raise result
+        if isinstance(index, slice):
+            return result
+        if not result:
+            raise IndexError('Data of index %s does not exist.' % index)
+        return result[0]
+
+
 class BaseListSerializer(serializers.ListSerializer):
+    @classmethod
+    def lazy_list_data(cls, lazy_list, page_size=settings.PAGE_SIZE, page_index=1, **kwargs):
+        """
+        函数功能：分页（lazy_list为LazyList，只获取、校验及处理当前页的数据）
+        返回数据格式与list_data相同，数据校验不通过时返回Exception
+        """
+        if page_size > settings.MAX_PAGE_SIZE:
+            page_size = settings.MAX_PAGE_SIZE
+        paginator = Paginator(lazy_list, page_size)
+        try:
+            page = paginator.page(page_index)
+        except Exception as e:
+            return e
+
+        serializer = cls(data=list(page.object_list))
+        if not serializer.is_valid():
+            return Exception(serializer.errors)
+        data = serializer.perfect_result()
+        results = {'count': len(data),
+                   'all_count': paginator.count,
+                   'has_next': page_size * page_index < paginator.count,
+                   'data': data}
+        return results
+
     def list_data(self, page_size=settings.PAGE_SIZE, page_index=1, **kwargs):
         """
         函数功能：分页
@@ -49,6 +103,36 @@ class BaseListSerializer(serializers.ListSerializer):
                    'data': page.object_list}
         return results
 
+    def page_data(self, all_count, page_size=settings.PAGE_SIZE, page_index=1, **kwargs):
+        """
+        函数功能：数据已在查询时分页（只包含当前页的数据），返回与list_data相同格式的数据
+        """
+        if page_size > settings.MAX_PAGE_SIZE:
+            page_size = settings.MAX_PAGE_SIZE
+        if page_index > 1 and page_size * (page_index - 1) >= all_count:
+            return Exception('That page contains no results')
+
+        serializer = self.perfect_result()
+        results = {'count': len(serializer),
+                   'all_count': all_count,
+                   'has_next': page_size * page_index < all_count,
+                   'data': serializer}
+        return results
+
+    def cursor_data(self, next_cursor=None):
+        """
+        函数功能：游标分页（数据只包含当前页），返回数据格式为：
+                 {'count': 当前返回的数据量,
+                  'has_next': 是否有下一页,
+                  'next_cursor': 下一页的游标,
+                  'data': [...]}
+        """
+        serializer = self.perfect_result()
+        return {'count': len(serializer),
+                'has_next': next_cursor is not None,
+                'next_cursor': next_cursor,
+                'data': serializer}
+
     def perfect_result(self):
         dict_format = {}
         if hasattr(self, 'initial_data'):
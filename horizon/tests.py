@@ -0,0 +1,293 @@
+# -*- coding:utf8 -*-
+from __future__ import unicode_literals
+
+import base64
+import datetime
+import json
+import pickle
+import time
+import uuid
+from decimal import Decimal
+
+from django.core.paginator import Paginator
+from django.db.models.fields.files import FieldFile
+from django.test import SimpleTestCase
+
+from horizon import redis
+from horizon.caches import get_redis_client
+from horizon.pagination import CURSOR_START, encode_cursor, decode_cursor
+
+from horizon.redis.codec import (json_codec,
+                                 pickle_codec,
+                                 encode_value,
+                                 decode_value,
+                                 JSON_CODEC_VERSION,
+                                 NOT_FOUND,
+                                 NOT_FOUND_STRING)
+from horizon.redis.local_cache import LocalCache, INVALIDATE_ALL
+from horizon.serializers import LazyList
+from media.models import Media
+
+
+class JsonCodecTestCase(SimpleTestCase):
+    def round_trip(self, value):
+        string = encode_value(value)
+        self.assertEqual(string[:1], JSON_CODEC_VERSION)
+        return decode_value(string)
+
+    def test_plain_values(self):
+        value = {'int': 1, 'float': 1.5, 'bool': True, 'none': None,
+                 'text': '中文', 'list': [1, 'a', [2]]}
+        self.assertEqual(self.round_trip(value), value)
+
+    def test_datetime(self):
+        value = datetime.datetime(2017, 6, 1, 12, 30, 45, 123456)
+        self.assertEqual(self.round_trip(value), value)
+        self.assertEqual(self.round_trip(datetime.datetime(2017, 6, 1)),
+                         datetime.datetime(2017, 6, 1))
+
+    def test_date(self):
+        value = datetime.date(2017, 6, 1)
+        result = self.round_trip(value)
+        self.assertEqual(result, value)
+        self.assertNotIsInstance(result, datetime.datetime)
+
+    def test_decimal(self):
+        value = Decimal('12.30')
+        result = self.round_trip(value)
+        self.assertIsInstance(result, Decimal)
+        self.assertEqual(str(result), '12.30')
+
+    def test_non_string_keys(self):
+        value = {1: 'a', 2: {'__x': [3]}}
+        self.assertEqual(self.round_trip(value), value)
+
+    def test_tuple_values(self):
+        value = {'pair': (1, '中文'), 'items': [(1, 2), ()]}
+        result = self.round_trip(value)
+        self.assertEqual(result, value)
+        self.assertIsInstance(result['pair'], tuple)
+        self.assertIsInstance(result['items'][0], tuple)
+
+    def test_file_field(self):
+        result = self.round_trip({'picture': Media(picture='media/a.png').picture})
+        self.assertIsInstance(result['picture'], FieldFile)
+        self.assertEqual(result['picture'].name, 'media/a.png')
+        self.assertTrue(hasattr(result['picture'], 'storage'))
+
+    def test_model_instance(self):
+        created = datetime.datetime(2017, 6, 1, 12, 30, 45, 123456)
+        instance = Media(id=5, title='标题', subtitle='副标题', tags='[1, 2]',
+                         picture='media/a.png', created=created, updated=created)
+        result = self.round_trip(instance)
+        self.assertIsInstance(result, Media)
+        self.assertEqual(result.pk, 5)
+        self.assertFalse(result._state.adding)
+        for field in Media._meta.concrete_fields:
+            value = getattr(instance, field.attname)
+            if isinstance(value, FieldFile):
+                self.assertEqual(getattr(result, field.attname).name, value.name)
+            else:
+                self.assertEqual(getattr(result, field.attname), value)
+
+    def test_missing_model_field_is_deferred(self):
+        # 模拟Model增加字段前写入的缓存
+        plain = json_codec.to_plain(Media(id=5, title='标题'))
+        del plain['v']['subtitle']
+        result = json_codec.decode(
+            JSON_CODEC_VERSION + json.dumps(plain).encode('utf8'))
+        self.assertEqual(result.title, '标题')
+        self.assertIn('subtitle', result.get_deferred_fields())
+
+
+class PickleFallbackTestCase(SimpleTestCase):
+    def test_unsupported_value_uses_pickle(self):
+        value = {'ids': {1, 2, 3}}
+        string = encode_value(value)
+        self.assertNotEqual(string[:1], JSON_CODEC_VERSION)
+        self.assertEqual(decode_value(string), value)
+
+    def test_tuple_keys_use_pickle(self):
+        value = {(1, 2): 'a', (3, 'b'): [1]}
+        string = encode_value(value)
+        self.assertNotEqual(string[:1], JSON_CODEC_VERSION)
+        self.assertEqual(decode_value(string), value)
+
+    def test_legacy_pickle_data(self):
+        value = {'id': 1, 'created': datetime.datetime(2017, 6, 1)}
+        self.assertEqual(decode_value(pickle.dumps(value)), value)
+        self.assertEqual(pickle_codec.decode(pickle_codec.encode(value)), value)
+
+    def test_not_found(self):
+        self.assertEqual(encode_value(NOT_FOUND), NOT_FOUND_STRING)
+        self.assertIs(decode_value(NOT_FOUND_STRING), NOT_FOUND)
+        self.assertFalse(decode_value(NOT_FOUND_STRING))
+
+
+class LocalCacheTestCase(SimpleTestCase):
+    def test_lru_eviction(self):
+        cache = LocalCache(max_entries=2)
+        cache.set('a', b'1')
+        cache.set('b', b'2')
+        self.assertEqual(cache.get('a'), b'1')
+        # b最久未使用，被淘汰
+        cache.set('c', b'3')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), b'1')
+        self.assertEqual(cache.get('c'), b'3')
+        self.assertEqual(cache.evictions, 1)
+
+    def test_max_bytes(self):
+        cache = LocalCache(max_bytes=10)
+        cache.set('a', b'12345')
+        cache.set('b', [b'123', b'45'])
+        cache.set('c', b'1')
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.get('b'), [b'123', b'45'])
+        self.assertEqual(cache.get_stats()['bytes'], 6)
+        # 超过上限的数据不缓存
+        cache.set('d', b'12345678901')
+        self.assertIsNone(cache.get('d'))
+        self.assertEqual(cache.get('c'), b'1')
+
+    def test_timeout(self):
+        cache = LocalCache(timeout=60)
+        cache.set('a', b'1', timeout=0.01)
+        cache.set('b', b'2')
+        time.sleep(0.02)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.get('b'), b'2')
+        self.assertEqual(cache.get_stats()['entries'], 1)
+
+    def test_invalidation_message(self):
+        cache = LocalCache()
+        other = LocalCache()
+        cache.set('a', b'1')
+        cache.set('b', b'2')
+        # 自己发出的通知不处理
+        cache._on_message('%s a' % cache._origin)
+        self.assertEqual(cache.get('a'), b'1')
+        cache._on_message('%s a' % other._origin)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.get('b'), b'2')
+        cache._on_message('%s %s' % (other._origin, INVALIDATE_ALL))
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.invalidations, 2)
+
+    def test_invalidate_without_handle(self):
+        cache = LocalCache()
+        cache.set('a', b'1')
+        self.assertEqual(cache.invalidate('a'), 0)
+        self.assertIsNone(cache.get('a'))
+
+    def test_reset_after_fork(self):
+        cache = LocalCache()
+        cache.set('a', b'1')
+        cache._pid = -1
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.get_stats()['entries'], 0)
+
+
+class RedisLockTestCase(SimpleTestCase):
+    def setUp(self):
+        self.handle = get_redis_client()
+        try:
+            self.handle.ping()
+        except redis.ConnectionError:
+            self.skipTest('Redis is not available.')
+        self.name = 'test_lock:%s' % uuid.uuid4().hex
+
+    def tearDown(self):
+        self.handle.delete(self.name)
+
+    def test_acquire_release(self):
+        lock = self.handle.lock(self.name, timeout=10)
+        self.assertTrue(lock.acquire(blocking=False))
+        # 锁的值为原始token，未经过编码
+        self.assertEqual(self.handle.get_string(self.name), lock.local.token)
+        other = self.handle.lock(self.name, timeout=10)
+        self.assertFalse(other.acquire(blocking=False))
+
+        lock.release()
+        self.assertIsNone(self.handle.get_string(self.name))
+        self.assertTrue(other.acquire(blocking=False))
+        other.release()
+        self.assertTrue(lock.acquire(blocking=True, blocking_timeout=1))
+        lock.release()
+
+
+class CursorTestCase(SimpleTestCase):
+    def make_cursor(self, value):
+        return base64.urlsafe_b64encode(json.dumps(value)).rstrip('=')
+
+    def test_start(self):
+        self.assertEqual(decode_cursor(CURSOR_START, float), (None, None))
+        self.assertEqual(decode_cursor(CURSOR_START, datetime.datetime), (None, None))
+
+    def test_float_round_trip(self):
+        for score in (1497000000.123456, 0.1, -3.5, 0.0):
+            cursor = encode_cursor(score, 12)
+            self.assertEqual(decode_cursor(cursor, float), (score, 12))
+        sort_value, item_id = decode_cursor(encode_cursor(100, 12), float)
+        self.assertIsInstance(sort_value, float)
+        self.assertEqual((sort_value, item_id), (100.0, 12))
+
+    def test_datetime_round_trip(self):
+        value = datetime.datetime(2017, 6, 1, 12, 30, 45, 123456)
+        cursor = encode_cursor(value, 12)
+        self.assertEqual(decode_cursor(cursor, datetime.datetime), (value, 12))
+
+    def test_wrong_sort_type(self):
+        float_cursor = encode_cursor(1.5, 12)
+        datetime_cursor = encode_cursor(datetime.datetime(2017, 6, 1), 12)
+        self.assertIsInstance(decode_cursor(float_cursor, datetime.datetime), Exception)
+        self.assertIsInstance(decode_cursor(datetime_cursor, float), Exception)
+
+    def test_bad_cursor(self):
+        bad_cursors = ['', '!!!', 'bm90IGpzb24', '中文',
+                       self.make_cursor([1.5]),
+                       self.make_cursor([1.5, 12, 3]),
+                       self.make_cursor({'a': 1}),
+                       self.make_cursor(['1.5', 12]),
+                       self.make_cursor([True, 12]),
+                       self.make_cursor([None, 12]),
+                       self.make_cursor([[1.5], 12]),
+                       self.make_cursor([1.5, '12']),
+                       self.make_cursor([1.5, 12.0]),
+                       self.make_cursor([1.5, True]),
+                       self.make_cursor([1.5, None]),
+                       base64.urlsafe_b64encode('[NaN,12]'),
+                       base64.urlsafe_b64encode('[Infinity,12]')]
+        for cursor in bad_cursors:
+            result = decode_cursor(cursor, float)
+            self.assertIsInstance(result, Exception, cursor)
+            self.assertEqual(str(result), 'Params [cursor] is incorrect.')
+
+        bad_datetime_cursors = [self.make_cursor([{'dt': '2017-06-01'}, 12]),
+                                self.make_cursor([{'dt': 1}, 12]),
+                                self.make_cursor([{'dt': '2017-06-01 00:00:00.0', 'x': 1}, 12]),
+                                self.make_cursor(['2017-06-01 00:00:00.0', 12])]
+        for cursor in bad_datetime_cursors:
+            self.assertIsInstance(decode_cursor(cursor, datetime.datetime), Exception, cursor)
+
+
+class LazyListTestCase(SimpleTestCase):
+    def test_hydrate_page_only(self):
+        calls = []
+
+        def hydrate(ids_list):
+            calls.append(list(ids_list))
+            # 已删除的数据不返回
+            return [{'id': item_id} for item_id in ids_list if item_id != 7]
+
+        lazy_list = LazyList(list(range(1, 11)), hydrate)
+        page = Paginator(lazy_list, 4).page(2)
+        self.assertEqual(page.paginator.count, 10)
+        self.assertEqual(list(page.object_list), [{'id': 5}, {'id': 6}, {'id': 8}])
+        self.assertEqual(calls, [[5, 6, 7, 8]])
+        self.assertEqual(lazy_list[0], {'id': 1})
+        self.assertRaises(IndexError, lambda: lazy_list[6])
+
+    def test_hydrate_error(self):
+        lazy_list = LazyList([1, 2], lambda ids_list: ValueError('Database is not available.'))
+        self.assertRaises(ValueError, lambda: lazy_list[:1])
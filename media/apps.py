@@ -1,3 +1,4 @@
+# -*- coding:utf8 -*-
 from __future__ import unicode_literals
 
 from django.apps import AppConfig
@@ -5,3 +6,7 @@ from django.apps import AppConfig
 
 class MediaConfig(AppConfig):
     name = 'media'
+
+    def ready(self):
+        # 注册数据变更时更新缓存的信号处理函数
+        import media.signals
@@ -3,8 +3,8 @@ from __future__ import unicode_literals
 import json
 import datetime
 
-from django.conf import settings
 from horizon import redis
+from horizon.caches import BaseCache
 from django.utils.timezone import now
 
 from media.models import (Media,
@@ -15,13 +15,16 @@ from media.models import (Media,
                           Information,
                           Case,
                           ResourceOpinionRecord,
-                          AdvertResource)
+                          AdvertResource,
+                          base_get_tags_key)
 from comment.models import Comment, SOURCE_TYPE_DB
 from collect.models import Collect
 
 # 过期时间（单位：秒）
 EXPIRES_24_HOURS = 24 * 60 * 60
 EXPIRES_10_HOURS = 10 * 60 * 60
+EXPIRES_7_DAYS = 7 * 24 * 60 * 60
+EXPIRES_30_DAYS = 30 * 24 * 60 * 60
 
 RELEVANT_COUNT_CONFIG = {
     'like': ResourceOpinionRecord.get_like_count,
@@ -29,6 +32,12 @@ RELEVANT_COUNT_CONFIG = {
     'collection': Collect.get_collection_count,
     'read': None,
 }
+# 以资源ID为Key的相关数量字典（数据校正用）
+RELEVANT_COUNT_DICT_CONFIG = {
+    'like': ResourceOpinionRecord.get_like_count_dict,
+    'comment': Comment.get_comment_count_dict,
+    'collection': Collect.get_collection_count_dict,
+}
 COUNT_COLUMN_LIST = ('read', 'like', 'collection', 'comment')
 COUNT_COLUMN_KEY_DICT = {
     'read': 'read_count',
@@ -38,12 +47,61 @@ COUNT_COLUMN_KEY_DICT = {
 }
 
 
-class MediaCache(object):
+def get_relevant_count_dict_from_db(source_type, source_id):
+    """
+    从数据库中读取资源的相关数量（用于初始化计数器）
+    """
+    model_class = SOURCE_TYPE_DB.get(source_type)
+    if not model_class:
+        return Exception('Params [source_type] is incorrect.')
+    instance = model_class.get_object(pk=source_id)
+    if isinstance(instance, Exception):
+        return instance
+
+    counts = {'read': instance.read_count}
+    for column in COUNT_COLUMN_LIST:
+        if RELEVANT_COUNT_CONFIG[column]:
+            counts[column] = RELEVANT_COUNT_CONFIG[column](source_type=source_type,
+                                                           source_id=source_id)
+    return counts
+
+
+# 资源（媒体资源、资讯、案例）相关缓存Key的生成方法
+SOURCE_CACHE_KEY_CONFIG = {
+    Media: {'instance': 'get_media_instance_id_key',
+            'detail': 'get_media_id_key',
+            'tags_dict': 'get_media_tags_dict_key',
+            'sort_order_list': 'get_media_sort_order_list_key',
+            'search_dict': 'get_media_search_dict_title_tags_key'},
+    Information: {'instance': 'get_information_instance_id_key',
+                  'detail': 'get_information_id_key',
+                  'tags_dict': 'get_information_tags_dict_key',
+                  'sort_order_list': 'get_information_sort_order_list_key',
+                  'search_dict': 'get_information_search_dict_title_tags_key'},
+    Case: {'instance': 'get_case_instance_id_key',
+           'detail': 'get_case_id_key',
+           'tags_dict': 'get_case_tags_dict_key',
+           'sort_order_list': 'get_case_sort_order_list_key',
+           'search_dict': 'get_case_search_dict_title_tags_key'},
+}
+# 媒体资源详情中引用的类型数据：{Model: (媒体资源字段, 缓存Key的生成方法)}
+MEDIA_ATTRIBUTE_CACHE_CONFIG = {
+    MediaType: ('media_type', 'get_media_type_id_key'),
+    ThemeType: ('theme_type', 'get_theme_type_id_key'),
+    ProjectProgress: ('progress', 'get_progress_id_key'),
+}
+
+
+class MediaCache(BaseCache):
+    use_local_cache = True
+    # 数据变更时由media.signals更新缓存
+    expires = EXPIRES_30_DAYS
+
     def __init__(self):
-        pool = redis.ConnectionPool(host=settings.REDIS_SETTINGS['host'],
-                                    port=settings.REDIS_SETTINGS['port'],
-                                    db=settings.REDIS_SETTINGS['db_set']['web'])
-        self.handle = redis.Redis(connection_pool=pool)
+        super(MediaCache, self).__init__()
+        self.counter = redis.HashCounter(self.handle, COUNT_COLUMN_LIST,
+                                         expires=EXPIRES_7_DAYS,
+                                         dirty_set_key=self.get_relevant_count_dirty_set_key())
 
     # def get_dimension_id_key(self, dimension_id):
     #     return 'dimension_id:%s' % dimension_id
@@ -55,136 +113,93 @@ class MediaCache(object):
     #     return 'tag_id:%s' % tag_id
 
     def get_media_instance_id_key(self, media_id):
-        return 'media:instance:id:%s' % media_id
+        return self.make_key('media:instance:id', media_id)
 
     def get_media_id_key(self, media_id):
-        return 'media:id:%s' % media_id
+        return self.make_key('media:id', media_id)
 
     def get_media_type_id_key(self, media_type_id):
-        return 'media_type:id:%s' % media_type_id
+        return self.make_key('media_type:id', media_type_id)
 
     def get_theme_type_id_key(self, theme_type_id):
-        return 'theme_type:id:%s' % theme_type_id
+        return self.make_key('theme_type:id', theme_type_id)
 
     def get_progress_id_key(self, progress_id):
-        return 'progress:id:%s' % progress_id
+        return self.make_key('progress:id', progress_id)
 
     def get_resource_tag_id_key(self, resource_tag_id):
-        return 'resource_tag:id:%s' % resource_tag_id
+        return self.make_key('resource_tag:id', resource_tag_id)
 
     def get_information_instance_id_key(self, information_id):
-        return 'information:instance:id:%s' % information_id
+        return self.make_key('information:instance:id', information_id)
 
     def get_information_id_key(self, information_id):
-        return 'information:id:%s' % information_id
+        return self.make_key('information:id', information_id)
 
     def get_case_instance_id_key(self, case_id):
-        return 'case:instance:id:%s' % case_id
+        return self.make_key('case:instance:id', case_id)
 
     def get_case_id_key(self, case_id):
-        return 'case:id:%s' % case_id
+        return self.make_key('case:id', case_id)
 
     def get_case_tags_dict_key(self):
-        return 'case_tags_dict:tags'
+        return self.make_key('case_tags_dict:tags')
 
     def get_media_tags_dict_key(self):
-        return 'media_tags_dict:tags'
+        return self.make_key('media_tags_dict:tags')
 
     def get_information_tags_dict_key(self):
-        return 'information_tags_dict:tags'
+        return self.make_key('information_tags_dict:tags')
 
     def get_media_sort_order_list_key(self):
-        return 'media_sort_order_list:updated'
+        return self.make_key('media_sort_order_list:updated')
 
     def get_information_sort_order_list_key(self):
-        return 'information_sort_order_list:updated'
+        return self.make_key('information_sort_order_list:updated')
 
     def get_case_sort_order_list_key(self):
-        return 'case_sort_order_list:updated'
+        return self.make_key('case_sort_order_list:updated')
 
     def get_media_search_dict_title_tags_key(self):
-        return 'media_search_dict:title_tags'
+        return self.make_key('media_search_dict:title_tags')
 
     def get_information_search_dict_title_tags_key(self):
-        return 'information_search_dict:title_tags'
+        return self.make_key('information_search_dict:title_tags')
 
     def get_case_search_dict_title_tags_key(self):
-        return 'case_search_dict:title_tags'
-
-    def get_media_relevant_count_id_key(self, media_id, column='read'):
-        column_list = ('read', 'like', 'collection', 'comment')
-        if column not in column_list:
-            return None
-        return 'media_%s_count:id:%s' % (column, media_id)
-
-    def get_information_relevant_count_id_key(self, information_id, column='read'):
-        column_list = ('read', 'like', 'collection', 'comment')
-        if column not in column_list:
-            return None
-        return 'information_%s_count:id:%s' % (column, information_id)
-
-    def get_case_relevant_count_id_key(self, case_id, column='read'):
-        column_list = ('read', 'like', 'collection', 'comment')
-        if column not in column_list:
-            return None
-        return 'case_%s_count:id:%s' % (column, case_id)
+        return self.make_key('case_search_dict:title_tags')
+
+    def get_source_relevant_count_key(self, source_type, source_id):
+        return 'source_relevant_count:%s:%s' % (source_type, source_id)
+
+    def parse_source_relevant_count_key(self, key):
+        source_type, source_id = key.rsplit(':', 2)[1:]
+        return int(source_type), int(source_id)
+
+    def get_relevant_count_dirty_set_key(self):
+        return 'source_relevant_count:dirty'
 
     def get_advert_list_source_type_key(self, source_type):
-        return 'advert_list:source_type:%s' % source_type
+        return self.make_key('advert_list:source_type', source_type)
 
     def get_advert_detail_id_key(self, advert_id):
-        return 'advert_detail:id:%s' % advert_id
-
-    def set_instance_to_cache(self, key, data):
-        self.handle.set(key, data)
-        self.handle.expire(key, EXPIRES_24_HOURS)
-
-    def set_list_to_cache(self, key, *list_data):
-        self.handle.delete(key)
-        self.handle.rpush(key, *list_data)
-        self.handle.expire(key, EXPIRES_24_HOURS)
-
-    def get_instance_from_cache(self, key):
-        return self.handle.get(key)
-
-    def get_list_from_cache(self, key, start=0, end=-1):
-        return self.handle.lrange(key, start, end)
-
-    def get_perfect_data(self, key, model_function, **kwargs):
-        data = self.get_instance_from_cache(key)
-        if not data:
-            data = model_function(**kwargs)
-            if isinstance(data, Exception):
-                return data
-            self.set_instance_to_cache(key, data)
-        return data
-
-    def get_perfect_list_data(self, key, model_function, **kwargs):
-        list_data = self.get_list_from_cache(key)
-        if not list_data:
-            list_data = model_function(**kwargs)
-            if isinstance(list_data, Exception) or not list_data:
-                return list_data
-            self.set_list_to_cache(key, *list_data)
-        return list_data
+        return self.make_key('advert_detail:id', advert_id)
 
     def get_perfect_ids_list_data(self, key, model_function, detail_key_function, **kwargs):
-        list_data = self.get_list_from_cache(key)
-        if not list_data:
+        strings = self.get_list_strings_from_cache(key)
+        if not strings:
             list_data = model_function(**kwargs)
             if isinstance(list_data, Exception):
                 return list_data
 
-            # 把每条数据逐次添加都缓存中
-            for item_data in list_data:
-                detail_key = detail_key_function(item_data['id'])
-                if not self.get_instance_from_cache(detail_key):
-                    self.set_instance_to_cache(detail_key, item_data)
+            # 详情数据在一个pipeline中批量写入缓存
+            self.set_instances_to_cache({detail_key_function(item_data['id']): item_data
+                                         for item_data in list_data})
             # 生成列表
             perfect_list_data = [item['id'] for item in list_data]
             self.set_list_to_cache(key, *perfect_list_data)
             return perfect_list_data
-        return list_data
+        return self.translate_list_strings(strings)
 
     # # 获取维度model对象
     # def get_dimension_by_id(self, dimension_id):
@@ -215,11 +230,15 @@ class MediaCache(object):
         detail = self.get_perfect_data(key, Media.get_detail, **kwargs)
         if isinstance(detail, Exception):
             return detail
-        for column in COUNT_COLUMN_LIST:
-            count = self.get_media_relevant_count(media_id, column=column)
-            count_key = COUNT_COLUMN_KEY_DICT[column]
-            detail[count_key] = count
-        return detail
+        return self.set_relevant_count_to_detail(detail, 1, media_id)
+
+    # 批量获取媒体资源detail
+    def get_media_details_by_ids(self, media_ids):
+        details = self.get_perfect_data_by_ids(media_ids, self.get_media_id_key,
+                                               Media.filter_details)
+        if isinstance(details, Exception):
+            return details
+        return self.set_relevant_count_to_details(details, 1)
 
     # 获取媒体资源的标签为Key的列表
     def get_media_tags_dict(self):
@@ -228,7 +247,7 @@ class MediaCache(object):
 
     # 获取资源类型model对象
     def get_media_type_by_id(self, media_type_id):
-        key = self.get_media_id_key(media_type_id)
+        key = self.get_media_type_id_key(media_type_id)
         kwargs = {'pk': media_type_id}
         return self.get_perfect_data(key, MediaType.get_object, **kwargs)
 
@@ -264,11 +283,15 @@ class MediaCache(object):
         detail = self.get_perfect_data(key, Information.get_detail, **kwargs)
         if isinstance(detail, Exception):
             return detail
-        for column in COUNT_COLUMN_LIST:
-            count = self.get_information_relevant_count(information_id, column=column)
-            count_key = COUNT_COLUMN_KEY_DICT[column]
-            detail[count_key] = count
-        return detail
+        return self.set_relevant_count_to_detail(detail, 3, information_id)
+
+    # 批量获取资讯详情
+    def get_information_details_by_ids(self, information_ids):
+        details = self.get_perfect_data_by_ids(information_ids, self.get_information_id_key,
+                                               Information.filter_details)
+        if isinstance(details, Exception):
+            return details
+        return self.set_relevant_count_to_details(details, 3)
 
     # 获取资讯的标签为Key的列表
     def get_information_tags_dict(self):
@@ -289,11 +312,15 @@ class MediaCache(object):
         detail = self.get_perfect_data(key, Case.get_detail, **kwargs)
         if isinstance(detail, Exception):
             return detail
-        for column in COUNT_COLUMN_LIST:
-            count = self.get_case_relevant_count(case_id, column=column)
-            count_key = COUNT_COLUMN_KEY_DICT[column]
-            detail[count_key] = count
-        return detail
+        return self.set_relevant_count_to_detail(detail, 2, case_id)
+
+    # 批量获取案例详情
+    def get_case_details_by_ids(self, case_ids):
+        details = self.get_perfect_data_by_ids(case_ids, self.get_case_id_key,
+                                               Case.filter_details)
+        if isinstance(details, Exception):
+            return details
+        return self.set_relevant_count_to_details(details, 2)
 
     # 获取案例的标签为Key的列表
     def get_case_tags_dict(self):
@@ -330,117 +357,189 @@ class MediaCache(object):
         key = self.get_case_search_dict_title_tags_key()
         return self.get_perfect_data(key, Case.get_search_dict)
 
+    # 资源（媒体资源、资讯、案例）变更后更新缓存
+    def update_source_cache(self, model_class, source_id, instance=None):
+        """
+        删除Model对象及详情缓存，原地修改标签字典、排序列表及搜索字典
+        instance: 变更后的数据，为None时表示数据已删除
+        """
+        config = SOURCE_CACHE_KEY_CONFIG[model_class]
+        is_valid = instance is not None and instance.status == 1
+        tags_key = base_get_tags_key(instance) if is_valid else None
+        search_detail = instance.search_detail if is_valid else None
+
+        def update_tags_dict(tags_dict):
+            for key in list(tags_dict.keys()):
+                if source_id in tags_dict[key]:
+                    tags_dict[key].remove(source_id)
+                    if not tags_dict[key]:
+                        tags_dict.pop(key)
+            if tags_key is not None:
+                tags_dict.setdefault(tags_key, []).insert(0, source_id)
+            return tags_dict
+
+        def update_sort_order_list(sort_order_list):
+            if source_id in sort_order_list:
+                sort_order_list.remove(source_id)
+            # 排序顺序为updated倒序，刚修改的数据排在最前面
+            if is_valid:
+                sort_order_list.insert(0, source_id)
+            return sort_order_list
+
+        def update_search_dict(search_dict):
+            if is_valid:
+                search_dict[source_id] = search_detail
+            else:
+                search_dict.pop(source_id, None)
+            return search_dict
+
+        self.delete_data_from_cache(getattr(self, config['instance'])(source_id),
+                                    getattr(self, config['detail'])(source_id))
+        self.update_instance_in_cache(getattr(self, config['tags_dict'])(), update_tags_dict)
+        self.update_instance_in_cache(getattr(self, config['sort_order_list'])(),
+                                      update_sort_order_list)
+        self.update_instance_in_cache(getattr(self, config['search_dict'])(), update_search_dict)
+
+    # 资源标签变更后更新缓存（标签名称保存在资源详情及搜索字典中）
+    def update_resource_tag_cache(self, tag_id):
+        self.delete_data_from_cache(self.get_resource_tag_id_key(tag_id))
+        for model_class, config in SOURCE_CACHE_KEY_CONFIG.items():
+            instances = model_class.filter_objects(tags__contains=str(tag_id))
+            if isinstance(instances, Exception):
+                continue
+            search_detail_dict = {}
+            for ins in instances:
+                try:
+                    tag_ids = json.loads(ins.tags)
+                except:
+                    continue
+                if tag_id in tag_ids or str(tag_id) in tag_ids:
+                    search_detail_dict[ins.pk] = ins.search_detail
+            if not search_detail_dict:
+                continue
+
+            def update_search_dict(search_dict):
+                for source_id, search_detail in search_detail_dict.items():
+                    if source_id in search_dict:
+                        search_dict[source_id] = search_detail
+                return search_dict
+
+            detail_key_function = getattr(self, config['detail'])
+            self.delete_data_from_cache(*[detail_key_function(source_id)
+                                          for source_id in search_detail_dict])
+            self.update_instance_in_cache(getattr(self, config['search_dict'])(),
+                                          update_search_dict)
+
+    # 资源类型、题材类别、项目进度变更后更新缓存（名称保存在媒体资源详情中）
+    def update_media_attribute_cache(self, model_class, attribute_id):
+        attr, key_function_name = MEDIA_ATTRIBUTE_CACHE_CONFIG[model_class]
+        keys = [getattr(self, key_function_name)(attribute_id)]
+        instances = Media.filter_objects(**{attr: attribute_id})
+        if not isinstance(instances, Exception):
+            keys.extend([self.get_media_id_key(media_id)
+                         for media_id in instances.values_list('id', flat=True)])
+        self.delete_data_from_cache(*keys)
+
+    # 广告变更后更新缓存
+    def update_advert_cache(self, advert_id):
+        # 广告的资源类型可能被修改，删除全部资源类型的广告列表
+        keys = [self.get_advert_detail_id_key(advert_id)]
+        keys.extend([self.get_advert_list_source_type_key(source_type)
+                     for source_type in SOURCE_TYPE_DB])
+        self.delete_data_from_cache(*keys)
+
+    # 获取资源（媒体资源、案例及资讯）的全部相关数量（一次往返）
+    def get_relevant_count_dict(self, source_type, source_id):
+        key = self.get_source_relevant_count_key(source_type, source_id)
+        counts = self.counter.get_counts(key)
+        if counts is None:
+            init_counts = get_relevant_count_dict_from_db(source_type, source_id)
+            if isinstance(init_counts, Exception):
+                return init_counts
+            counts = self.counter.init_counts(key, init_counts)
+        return counts
+
+    def set_relevant_count_to_detail(self, detail, source_type, source_id):
+        counts = self.get_relevant_count_dict(source_type, source_id)
+        if isinstance(counts, Exception):
+            return counts
+        for column, count in counts.items():
+            detail[COUNT_COLUMN_KEY_DICT[column]] = count
+        return detail
+
+    def set_relevant_count_to_details(self, details, source_type):
+        """
+        批量设置详情中的相关数量（一次往返读取全部计数器）
+        """
+        keys = [self.get_source_relevant_count_key(source_type, detail['id'])
+                for detail in details]
+        perfect_details = []
+        for detail, counts in zip(details, self.counter.get_counts_many(keys)):
+            if counts is None:
+                counts = self.get_relevant_count_dict(source_type, detail['id'])
+                if isinstance(counts, Exception):
+                    continue
+            for column, count in counts.items():
+                detail[COUNT_COLUMN_KEY_DICT[column]] = count
+            perfect_details.append(detail)
+        return perfect_details
+
     # 获取媒体资源相关数量
     def get_media_relevant_count(self, media_id, column='read'):
-        column_list = ('read', 'like', 'collection', 'comment')
-        if column not in column_list:
-            return Exception('Params [column] is must in %s' % list(column_list))
-
-        source_type = None
-        for m_key, model_class in SOURCE_TYPE_DB.items():
-            if model_class == Media:
-                source_type = m_key
-                break
-        key = self.get_media_relevant_count_id_key(media_id, column)
-        if column != 'read':
-            kwargs = {'source_type': source_type, 'source_id': media_id}
-            model_function = RELEVANT_COUNT_CONFIG[column]
-            return self.get_perfect_data(key, model_function, **kwargs)
-        else:
-            kwargs = {'media_id': media_id, 'column': column}
-            return self.get_perfect_data(key, Media.get_relevant_count, **kwargs)
+        return self.get_relevant_count(1, media_id, column=column)
 
     # 获取资讯相关数量
     def get_information_relevant_count(self, information_id, column='read'):
-        column_list = ('read', 'like', 'collection', 'comment')
-        if column not in column_list:
-            return Exception('Params [column] is must in %s' % list(column_list))
-
-        source_type = None
-        for m_key, model_class in SOURCE_TYPE_DB.items():
-            if model_class == Information:
-                source_type = m_key
-                break
-        key = self.get_information_relevant_count_id_key(information_id, column)
-        if column != 'read':
-            kwargs = {'source_type': source_type, 'source_id': information_id}
-            model_function = RELEVANT_COUNT_CONFIG[column]
-            return self.get_perfect_data(key, model_function, **kwargs)
-        else:
-            kwargs = {'information_id': information_id, 'column': column}
-            return self.get_perfect_data(key, Information.get_relevant_count, **kwargs)
+        return self.get_relevant_count(3, information_id, column=column)
 
     # 获取案例相关数量
     def get_case_relevant_count(self, case_id, column='read'):
-        column_list = ('read', 'like', 'collection', 'comment')
-        if column not in column_list:
-            return Exception('Params [column] is must in %s' % list(column_list))
-
-        source_type = None
-        for m_key, model_class in SOURCE_TYPE_DB.items():
-            if model_class == Case:
-                source_type = m_key
-                break
-        key = self.get_case_relevant_count_id_key(case_id, column)
-        if column != 'read':
-            kwargs = {'source_type': source_type, 'source_id': case_id}
-            model_function = RELEVANT_COUNT_CONFIG[column]
-            return self.get_perfect_data(key, model_function, **kwargs)
-        else:
-            kwargs = {'case_id': case_id, 'column': column}
-            return self.get_perfect_data(key, Case.get_relevant_count, **kwargs)
+        return self.get_relevant_count(2, case_id, column=column)
+
+    def get_relevant_count(self, source_type, source_id, column='read'):
+        if column not in COUNT_COLUMN_LIST:
+            return Exception('Params [column] is must in %s' % list(COUNT_COLUMN_LIST))
+        counts = self.get_relevant_count_dict(source_type, source_id)
+        if isinstance(counts, Exception):
+            return counts
+        return counts[column]
+
+    # 资源相关数量加、减操作（服务端原子操作）
+    def relevant_count_action(self, source_type, source_id, column='read',
+                              action='plus', amount=1):
+        if column not in COUNT_COLUMN_LIST:
+            return Exception('Params [column] is must in %s' % list(COUNT_COLUMN_LIST))
+        if action != 'plus':
+            amount = -amount
+
+        key = self.get_source_relevant_count_key(source_type, source_id)
+        counts = self.counter.incr(key, column, amount)
+        if counts is None:
+            init_counts = self.get_relevant_count_dict(source_type, source_id)
+            if isinstance(init_counts, Exception):
+                return init_counts
+            counts = self.counter.incr(key, column, amount)
+            # 初始化后计数器仍可能被淘汰或过期
+            if counts is None:
+                return Exception('Relevant count of source %s:%s is not available.'
+                                 % (source_type, source_id))
+        return counts[column]
 
     # 媒体资源相关数量加、减操作
     def media_relevant_count_action(self, media_id, column='read', action='plus', amount=1):
-        self.get_media_relevant_count(media_id, column=column)
-        key = self.get_media_relevant_count_id_key(media_id, column)
-        if action == 'plus':
-            return self.handle.incr(key, amount)
-        else:
-            return self.handle.decr(key, amount)
+        return self.relevant_count_action(1, media_id, column=column,
+                                          action=action, amount=amount)
 
     # 资讯相关数量加、减操作
     def information_relevant_count_action(self, information_id, column='read',
                                           action='plus', amount=1):
-        self.get_information_relevant_count(information_id, column=column)
-        key = self.get_information_relevant_count_id_key(information_id, column)
-        if action == 'plus':
-            return self.handle.incr(key, amount)
-        else:
-            return self.handle.decr(key, amount)
+        return self.relevant_count_action(3, information_id, column=column,
+                                          action=action, amount=amount)
 
     # 案例相关数量加、减操作
     def case_relevant_count_action(self, case_id, column='read', action='plus', amount=1):
-        self.get_case_relevant_count(case_id, column=column)
-        key = self.get_case_relevant_count_id_key(case_id, column)
-        if action == 'plus':
-            return self.handle.incr(key, amount)
-        else:
-            return self.handle.decr(key, amount)
-
-    # def base_relevant_count_action(self, source_type, source_id, column='read',
-    #                                action='plus', amount=1):
-    #     source_type_key_dict = {
-    #         # 媒体资源
-    #         1: {'init': self.get_media_relevant_count,
-    #             'key': self.get_media_relevant_count_id_key},
-    #         # 案例
-    #         2: {'init': self.get_case_relevant_count,
-    #             'key': self.get_case_relevant_count_id_key},
-    #         # 资讯
-    #         3: {'init': self.get_information_relevant_count,
-    #             'key': self.get_information_relevant_count}
-    #     }
-    #     get_count_function = source_type_key_dict[source_type]['init']
-    #     key_function = source_type_key_dict[source_type]['key']
-    #
-    #     # 获取相关数量
-    #     get_count_function(source_id, column=column)
-    #     key = key_function(source_id, column)
-    #     if action == 'plus':
-    #         return self.handle.incr(key, amount)
-    #     else:
-    #         return self.handle.decr(key, amount)
+        return self.relevant_count_action(2, case_id, column=column,
+                                          action=action, amount=amount)
 
     # 获取广告列表
     def get_advert_list(self, source_type):
@@ -453,27 +552,8 @@ class MediaCache(object):
         return self.get_perfect_list_data_by_ids(ids_list, self.get_advert_detail_id_key)
 
     def get_perfect_list_data_by_ids(self, ids_list, key_function):
-        perfect_list_data = []
-        for item_id in ids_list:
-            id_key = key_function(item_id)
-            kwargs = {'id': item_id}
-            detail = self.get_perfect_data(id_key, AdvertResource.get_detail, **kwargs)
-            if isinstance(detail, Exception):
-                continue
-            perfect_list_data.append(detail)
-        return perfect_list_data
-
-
-SOURCE_TYPE_CACHE_FUNCTION = {
-    1: MediaCache().media_relevant_count_action,          # 媒体资源
-    2: MediaCache().case_relevant_count_action,           # 案例
-    3: MediaCache().information_relevant_count_action,    # 资讯
-}
-SYNC_CACHE_TO_DB = {
-    1: Media.update_relevant_count_action,          # 媒体资源
-    2: Case.update_relevant_count_action,           # 案例
-    3: Information.update_relevant_count_action,    # 资讯
-}
+        return self.get_perfect_data_by_ids(ids_list, key_function,
+                                            AdvertResource.filter_detail)
 
 
 class SourceModelAction(object):
@@ -482,50 +562,40 @@ class SourceModelAction(object):
     """
     @classmethod
     def update_read_count(cls, source_type, source_id):
-        if source_type not in SOURCE_TYPE_CACHE_FUNCTION:
+        if source_type not in SOURCE_TYPE_DB:
             return Exception('Params [resource_type] is incorrect.')
 
-        action_function = SOURCE_TYPE_CACHE_FUNCTION[source_type]
-        count = action_function(source_id, column='read', action='plus')
-        if count % 50 == 0:
-            # 通过缓存数据到数据库
-            sync_function = SYNC_CACHE_TO_DB[source_type]
-            sync_function(source_id, attr=COUNT_COLUMN_KEY_DICT['read'], amount=count)
-        return count
+        # 计数只写缓存，由定时任务（media.tasks.flush_relevant_count_to_db）批量写回数据库
+        return MediaCache().relevant_count_action(source_type, source_id,
+                                                  column='read', action='plus')
 
     @classmethod
     def update_like_count(cls, source_type, source_id):
-        if source_type not in SOURCE_TYPE_CACHE_FUNCTION:
+        if source_type not in SOURCE_TYPE_DB:
             return Exception('Params [resource_type] is incorrect.')
 
-        action_function = SOURCE_TYPE_CACHE_FUNCTION[source_type]
-        return action_function(source_id, column='like', action='plus')
+        return MediaCache().relevant_count_action(source_type, source_id,
+                                                  column='like', action='plus')
 
     @classmethod
     def update_collection_count(cls, source_type, source_id, method='plus'):
-        if source_type not in SOURCE_TYPE_CACHE_FUNCTION:
+        if source_type not in SOURCE_TYPE_DB:
             return Exception('Params [resource_type] is incorrect.')
         if method not in ['plus', 'reduce']:
             return Exception('Params [resource_type] is incorrect.')
 
-        action_function = SOURCE_TYPE_CACHE_FUNCTION[source_type]
-        if method == 'plus':
-            return action_function(source_id, column='collection', action='plus')
-        else:
-            return action_function(source_id, column='collection', action='reduce')
+        return MediaCache().relevant_count_action(source_type, source_id,
+                                                  column='collection', action=method)
 
     @classmethod
     def update_comment_count(cls, source_type, source_id, method='plus'):
-        if source_type not in SOURCE_TYPE_CACHE_FUNCTION:
+        if source_type not in SOURCE_TYPE_DB:
             return Exception('Params [resource_type] is incorrect.')
         if method not in ['plus', 'reduce']:
             return Exception('Params [resource_type] is incorrect.')
 
-        action_function = SOURCE_TYPE_CACHE_FUNCTION[source_type]
-        if method == 'plus':
-            return action_function(source_id, column='collection', action='plus')
-        else:
-            return action_function(source_id, column='collection', action='reduce')
+        return MediaCache().relevant_count_action(source_type, source_id,
+                                                  column='comment', action=method)
 
     @classmethod
     def create_like_record(cls, request, source_type, source_id):
@@ -549,3 +619,119 @@ class SourceModelAction(object):
             return source_ins
         return record, source_ins
 
+
+class RelevantCountSyncAction(object):
+    """
+    资源相关数量（计数器）写回数据库及数据校正
+    """
+    @classmethod
+    def save_counts_to_db(cls, source_type, column_dict):
+        """
+        column_dict: {column: {资源ID: 数量}}，每个字段执行一条批量UPDATE
+        """
+        model_class = SOURCE_TYPE_DB[source_type]
+        updated_count = 0
+        for column, count_dict in column_dict.items():
+            result = model_class.bulk_update_relevant_count(
+                attr=COUNT_COLUMN_KEY_DICT[column], count_dict=count_dict)
+            if isinstance(result, Exception):
+                raise result
+            updated_count += result
+        return updated_count
+
+    @classmethod
+    def flush_dirty_counts(cls, batch_size=500):
+        """
+        把有变动的计数器批量写回数据库
+        返回：写回的计数器数量
+        """
+        cache = MediaCache()
+        flush_count = 0
+        while True:
+            keys = cache.counter.pop_dirty_keys(batch_size)
+            if not keys:
+                break
+
+            table_dict = {}
+            for key, counts in zip(keys, cache.counter.get_counts_many(keys)):
+                if counts is None:
+                    continue
+                source_type, source_id = cache.parse_source_relevant_count_key(key)
+                column_dict = table_dict.setdefault(source_type, {})
+                for column, count in counts.items():
+                    column_dict.setdefault(column, {})[source_id] = count
+            try:
+                for source_type, column_dict in table_dict.items():
+                    cls.save_counts_to_db(source_type, column_dict)
+            except Exception:
+                # 写回失败，重新标记，等待下次写回
+                cache.counter.mark_dirty(*keys)
+                raise
+            flush_count += len(keys)
+            if len(keys) < batch_size:
+                break
+        return flush_count
+
+    @classmethod
+    def reconcile_counts(cls, source_type=None, repair=True, batch_size=500):
+        """
+        根据点赞记录、评论及收藏数据重新计算相关数量（浏览数除外），
+        修正数据库及缓存中的偏差
+        返回：偏差列表 [{'source_type': x, 'source_id': x, 'column': x,
+                        'db': x, 'cache': x, 'expected': x}, ...]
+        """
+        source_types = [source_type] if source_type else SOURCE_TYPE_DB.keys()
+        cache = MediaCache()
+        drift_list = []
+        for item_type in source_types:
+            model_class = SOURCE_TYPE_DB[item_type]
+            db_columns = ['id'] + [COUNT_COLUMN_KEY_DICT[column]
+                                   for column in RELEVANT_COUNT_DICT_CONFIG]
+            last_id = 0
+            while True:
+                # 按ID分批读取，不一次加载整张表
+                batch_rows = list(model_class.objects.filter(id__gt=last_id).order_by('id')
+                                  .values(*db_columns)[:batch_size])
+                if not batch_rows:
+                    break
+                last_id = batch_rows[-1]['id']
+                keys = [cache.get_source_relevant_count_key(item_type, row['id'])
+                        for row in batch_rows]
+                cache_counts_list = cache.counter.get_counts_many(keys)
+                # 先读取缓存再统计：读取缓存后的加减操作会改变缓存中的值，校正时跳过
+                expected_dict = {}
+                source_ids = [row['id'] for row in batch_rows]
+                for column, count_dict_function in RELEVANT_COUNT_DICT_CONFIG.items():
+                    count_dict = count_dict_function(item_type, source_ids=source_ids)
+                    if isinstance(count_dict, Exception):
+                        return count_dict
+                    expected_dict[column] = count_dict
+                db_repair_dict = {}
+                for key, row, cache_counts in zip(keys, batch_rows, cache_counts_list):
+                    cache_repair_dict = {}
+                    cache_old_dict = {}
+                    for column in RELEVANT_COUNT_DICT_CONFIG:
+                        expected = expected_dict[column].get(row['id'], 0)
+                        db_value = row[COUNT_COLUMN_KEY_DICT[column]]
+                        cache_value = cache_counts[column] if cache_counts else None
+                        if db_value == expected and cache_value in (None, expected):
+                            continue
+                        drift_list.append({'source_type': item_type,
+                                           'source_id': row['id'],
+                                           'column': column,
+                                           'db': db_value,
+                                           'cache': cache_value,
+                                           'expected': expected})
+                        if db_value != expected:
+                            db_repair_dict.setdefault(column, {})[row['id']] = expected
+                        if cache_value not in (None, expected):
+                            cache_repair_dict[column] = expected
+                            cache_old_dict[column] = cache_value
+                    if repair and cache_repair_dict:
+                        # 读取后被加减过的字段不修改，避免覆盖并发的操作
+                        cache.counter.set_counts(key, cache_repair_dict, cache_old_dict)
+                if repair and db_repair_dict:
+                    cls.save_counts_to_db(item_type, db_repair_dict)
+                if len(batch_rows) < batch_size:
+                    break
+        return drift_list
@@ -1,5 +1,6 @@
 # -*- encoding: utf-8 -*-
 from horizon import forms
+from media.suggest import SUGGEST_MAX_COUNT
 
 
 class MediaTypeListForm(forms.Form):
@@ -35,6 +36,8 @@ class MediaListForm(forms.Form):
                              required=False)
     page_index = forms.IntegerField(min_value=1, required=False)
     page_size = forms.IntegerField(min_value=1, required=False)
+    # 游标分页：第一页传"start"，之后传上一页返回的next_cursor
+    cursor = forms.CharField(max_length=128, required=False)
 
 
 class MediaDetailForm(forms.Form):
@@ -45,6 +48,16 @@ class InformationDetailForm(forms.Form):
     id = forms.IntegerField(min_value=1)
 
 
+class InformationDetailForNextForm(forms.Form):
+    id = forms.IntegerField(min_value=1)
+    # 栏目：只在该栏目中查找上一篇、下一篇
+    column = forms.IntegerField(min_value=1, required=False)
+    # 方向：next：下一篇 previous：上一篇
+    direction = forms.ChoiceField(choices=(('next', 1),
+                                           ('previous', 2)),
+                                  required=False)
+
+
 class InformationListForm(forms.Form):
     # 运营标记：0：无标示 1：重磅发布
     mark = forms.IntegerField(min_value=1, required=False)
@@ -52,12 +65,24 @@ class InformationListForm(forms.Form):
     column = forms.IntegerField(min_value=1, required=False)
     page_index = forms.IntegerField(min_value=1, required=False)
     page_size = forms.IntegerField(min_value=1, required=False)
+    # 游标分页：第一页传"start"，之后传上一页返回的next_cursor
+    cursor = forms.CharField(max_length=128, required=False)
 
 
 class CaseDetailForm(forms.Form):
     id = forms.IntegerField(min_value=1)
 
 
+class CaseDetailForNextForm(forms.Form):
+    id = forms.IntegerField(min_value=1)
+    # 栏目：只在该栏目中查找上一篇、下一篇
+    column = forms.IntegerField(min_value=1, required=False)
+    # 方向：next：下一篇 previous：上一篇
+    direction = forms.ChoiceField(choices=(('next', 1),
+                                           ('previous', 2)),
+                                  required=False)
+
+
 class CaseListForm(forms.Form):
     # 运营标记：0：无标示 1：重磅发布
     mark = forms.IntegerField(min_value=1, required=False)
@@ -65,6 +90,8 @@ class CaseListForm(forms.Form):
     column = forms.IntegerField(min_value=1, required=False)
     page_index = forms.IntegerField(min_value=1, required=False)
     page_size = forms.IntegerField(min_value=1, required=False)
+    # 游标分页：第一页传"start"，之后传上一页返回的next_cursor
+    cursor = forms.CharField(max_length=128, required=False)
 
 
 class SourceLikeActionForm(forms.Form):
@@ -113,4 +140,18 @@ class SearchResourceActionForm(forms.Form):
                                     })
     # 搜索关键词
     keywords = forms.CharField(max_length=200)
+    page_index = forms.IntegerField(min_value=1, required=False)
+    page_size = forms.IntegerField(min_value=1, required=False)
+
 
+class SuggestResourceActionForm(forms.Form):
+    # 资源类型： 1：资源 2：案例 3：资讯
+    source_type = forms.ChoiceField(choices=((1, 1),
+                                             (2, 2),
+                                             (3, 3)),
+                                    error_messages={
+                                        'required': 'Param source_type must in [1, 2, 3]'
+                                    })
+    # 已输入的内容
+    keyword = forms.CharField(max_length=64)
+    count = forms.IntegerField(min_value=1, max_value=SUGGEST_MAX_COUNT, required=False)
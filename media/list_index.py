@@ -0,0 +1,292 @@
+# -*- coding:utf8 -*-
+"""
+资源列表（媒体资源、案例、资讯）的筛选及排序索引
+
+索引：每个筛选条件的每个值一个集合（成员为资源ID），每个排序字段一个有序集合（分数为排序字段的值），
+     每个资源一个Hash记录其筛选条件的值（用于修改、删除时从集合中移除）
+查询：筛选条件的集合与排序字段的有序集合取交集（集合的权重为0，保留排序字段的分数），
+     再按分数倒序只取出当前页的ID；游标分页时按分数范围读取游标之后的ID
+"""
+from __future__ import unicode_literals
+
+import calendar
+import datetime
+import uuid
+
+from django.core.exceptions import ObjectDoesNotExist
+
+from horizon.caches import BaseIndexCache
+from comment.models import SOURCE_TYPE_DB
+from media.models import Media, Information, Case
+
+# facets：{筛选条件: Model字段}，sorts：排序字段（第一个为默认排序），
+# sorted_facets：按默认排序另外为每个值建立有序集合的筛选条件（用于上一篇、下一篇）
+LIST_INDEX_CONFIG = {
+    Media: {'facets': {'media_type_id': 'media_type',
+                       'theme_type_id': 'theme_type',
+                       'progress_id': 'progress',
+                       'mark': 'mark'},
+            'sorts': ('updated', 'temperature', 'air_time'),
+            'sorted_facets': ()},
+    Information: {'facets': {'mark': 'mark',
+                             'column': 'column'},
+                  'sorts': ('updated',),
+                  'sorted_facets': ('column',)},
+    Case: {'facets': {'mark': 'mark',
+                      'column': 'column'},
+           'sorts': ('updated',),
+           'sorted_facets': ('column',)},
+}
+
+# 重建索引时每批写入的资源数量
+BUILD_BATCH_SIZE = 500
+# 游标分页时筛选结果的临时Key的过期时间（秒，正常情况下读取完即删除）
+TEMP_KEY_EXPIRES = 60
+
+
+def get_sort_score(value):
+    """
+    排序字段的值转为有序集合的分数（时间转为时间戳）
+    """
+    if value is None:
+        return 0
+    if isinstance(value, datetime.datetime):
+        return calendar.timegm(value.utctimetuple()) + value.microsecond / 1000000.0
+    if isinstance(value, datetime.date):
+        return calendar.timegm(value.timetuple())
+    return float(value)
+
+
+def get_document(model_class, instance):
+    """
+    资源的筛选条件的值及排序分数：({筛选条件: 值}, {排序字段: 分数})
+    """
+    config = LIST_INDEX_CONFIG[model_class]
+    facets = {facet: getattr(instance, attname) for facet, attname in config['facets'].items()}
+    sorts = {sort_key: get_sort_score(getattr(instance, sort_key)) for sort_key in config['sorts']}
+    return facets, sorts
+
+
+class ListIndex(BaseIndexCache):
+    def get_source_type(self, model_class):
+        for source_type, source_class in SOURCE_TYPE_DB.items():
+            if source_class is model_class:
+                return source_type
+        raise ValueError('%s is not a listable model.' % model_class.__name__)
+
+    def get_index_namespace(self, source_type):
+        return 'list_index:%s' % source_type
+
+    def get_facet_key(self, prefix, facet, value):
+        return '%s:facet:%s:%s' % (prefix, facet, value)
+
+    def get_sort_key(self, prefix, sort_key):
+        return '%s:sort:%s' % (prefix, sort_key)
+
+    def get_facet_sort_key(self, prefix, facet, value):
+        return '%s:facet_sort:%s:%s' % (prefix, facet, value)
+
+    def get_document_key(self, prefix, source_id):
+        return '%s:doc:%s' % (prefix, source_id)
+
+    def get_temp_key(self):
+        return 'list_index_tmp:%s' % uuid.uuid4().hex
+
+    def write_document(self, pipe, prefix, model_class, source_id, document=None,
+                       old_facets=None):
+        """
+        document为None时从索引中移除
+        old_facets: 原有的{筛选条件: 值}
+        """
+        config = LIST_INDEX_CONFIG[model_class]
+        for facet, value in (old_facets or {}).items():
+            pipe.srem(self.get_facet_key(prefix, facet, value), source_id)
+            if facet in config['sorted_facets']:
+                pipe.zrem(self.get_facet_sort_key(prefix, facet, value), source_id)
+        pipe.delete(self.get_document_key(prefix, source_id))
+        if document is None:
+            for sort_key in config['sorts']:
+                pipe.zrem(self.get_sort_key(prefix, sort_key), source_id)
+            return
+        facets, sorts = document
+        for facet, value in facets.items():
+            pipe.sadd(self.get_facet_key(prefix, facet, value), source_id)
+            if facet in config['sorted_facets']:
+                pipe.execute_command(b'ZADD', self.get_facet_sort_key(prefix, facet, value),
+                                     sorts[config['sorts'][0]], source_id)
+        for sort_key, score in sorts.items():
+            pipe.execute_command(b'ZADD', self.get_sort_key(prefix, sort_key), score, source_id)
+        pipe.hmset(self.get_document_key(prefix, source_id), facets)
+
+    def get_instance_document(self, model_class, instance):
+        """
+        instance为None（已删除）或状态无效时返回None（从索引中移除）
+        """
+        if instance is None or instance.status != 1:
+            return None
+        return get_document(model_class, instance)
+
+    def write_item(self, prefix, model_class, source_id, document=None):
+        old_facets = self.handle.hgetall(self.get_document_key(prefix, source_id))
+        pipe = self.handle.pipeline()
+        self.write_document(pipe, prefix, model_class, source_id, document, old_facets)
+        pipe.execute()
+
+    def write_index_item(self, prefix, member, source_type):
+        model_class = SOURCE_TYPE_DB[source_type]
+        instance = model_class.get_object(pk=int(member))
+        if isinstance(instance, ObjectDoesNotExist):
+            instance = None
+        elif isinstance(instance, Exception):
+            return
+        self.write_item(prefix, model_class, int(member),
+                        self.get_instance_document(model_class, instance))
+
+    def update_document(self, model_class, source_id, instance=None):
+        """
+        增量更新一个资源的索引，instance为None（已删除）或状态无效时从索引中移除
+        """
+        document = self.get_instance_document(model_class, instance)
+        return self.update_index_item(
+            source_id, lambda prefix: self.write_item(prefix, model_class, source_id, document),
+            self.get_source_type(model_class))
+
+    def write_index(self, prefix, source_type):
+        model_class = SOURCE_TYPE_DB[source_type]
+        instances = model_class.filter_objects()
+        if isinstance(instances, Exception):
+            return instances
+        count = 0
+        pipe = self.handle.pipeline(transaction=False)
+        for ins in instances.iterator():
+            self.write_document(pipe, prefix, model_class, ins.pk, get_document(model_class, ins))
+            count += 1
+            if count % BUILD_BATCH_SIZE == 0:
+                pipe.execute()
+        pipe.execute()
+        return count
+
+    def check_params(self, source_type, filters, sort_key):
+        """
+        返回：排序字段（未指定时为默认排序字段），参数不正确时返回Exception
+        """
+        config = LIST_INDEX_CONFIG[SOURCE_TYPE_DB[source_type]]
+        sort_key = sort_key or config['sorts'][0]
+        if sort_key not in config['sorts']:
+            return ValueError('Sort key %s is not supported.' % sort_key)
+        for facet in filters or {}:
+            if facet not in config['facets']:
+                return ValueError('Filter %s is not supported.' % facet)
+        return sort_key
+
+    def range_by_cursor(self, key, count, last_score=None, last_id=None):
+        """
+        按分数倒序读取游标(last_score, last_id)之后的count条数据
+        分数相同的成员按成员字符串倒序排列，跳过已读取过的成员
+        返回：[(ID, 分数), ...]
+        """
+        max_score = '+inf' if last_score is None else repr(float(last_score))
+        last_member = None if last_id is None else str(last_id)
+        result = []
+        offset = 0
+        while len(result) < count:
+            members = self.handle.zrevrangebyscore(key, max_score, '-inf', start=offset,
+                                                   num=count - len(result) + 1,
+                                                   withscores=True)
+            if not members:
+                break
+            offset += len(members)
+            for member, score in members:
+                if last_member is not None and score == last_score and member >= last_member:
+                    continue
+                result.append((int(member), score))
+        return result[:count]
+
+    def filter_ids_by_cursor(self, source_type, filters=None, sort_key=None, count=10,
+                             cursor=None):
+        """
+        游标分页：按筛选条件及排序字段取出游标之后的count个资源ID
+        cursor: 上一页最后一个资源的(分数（float）, ID)，第一页为None
+        返回：(资源ID列表, 下一页的游标（没有下一页时为None）)
+        """
+        sort_key = self.check_params(source_type, filters, sort_key)
+        if isinstance(sort_key, Exception):
+            return sort_key
+        last_score, last_id = cursor or (None, None)
+
+        prefix = self.ensure_index(source_type)
+        sort_set_key = self.get_sort_key(prefix, sort_key)
+        if not filters:
+            members = self.range_by_cursor(sort_set_key, count + 1, last_score, last_id)
+        else:
+            result_key = self.get_temp_key()
+            weights = {sort_set_key: 1}
+            for facet, value in filters.items():
+                weights[self.get_facet_key(prefix, facet, value)] = 0
+            pipe = self.handle.pipeline()
+            pipe.zinterstore(result_key, weights, aggregate='SUM')
+            pipe.expire(result_key, TEMP_KEY_EXPIRES)
+            pipe.execute()
+            try:
+                members = self.range_by_cursor(result_key, count + 1, last_score, last_id)
+            finally:
+                self.handle.delete(result_key)
+
+        next_cursor = None
+        if len(members) > count:
+            members = members[:count]
+            next_cursor = (members[-1][1], members[-1][0])
+        return [source_id for source_id, _ in members], next_cursor
+
+    def filter_ids(self, source_type, filters=None, sort_key=None, start=0, end=-1):
+        """
+        按筛选条件及排序字段取出排名在[start, end]之间的资源ID
+        filters: {筛选条件: 值}
+        返回：(资源ID列表, 匹配总数)
+        """
+        sort_key = self.check_params(source_type, filters, sort_key)
+        if isinstance(sort_key, Exception):
+            return sort_key
+
+        prefix = self.ensure_index(source_type)
+        sort_set_key = self.get_sort_key(prefix, sort_key)
+        pipe = self.handle.pipeline()
+        if filters:
+            result_key = self.get_temp_key()
+            weights = {sort_set_key: 1}
+            for facet, value in filters.items():
+                weights[self.get_facet_key(prefix, facet, value)] = 0
+            pipe.zinterstore(result_key, weights, aggregate='SUM')
+            pipe.zrevrange(result_key, start, end)
+            pipe.zcard(result_key)
+            pipe.delete(result_key)
+            ids, all_count = pipe.execute()[-3:-1]
+        else:
+            pipe.zrevrange(sort_set_key, start, end)
+            pipe.zcard(sort_set_key)
+            ids, all_count = pipe.execute()
+        return [int(source_id) for source_id in ids], all_count
+
+    def get_neighbor_ids(self, source_type, source_id, facet=None, value=None):
+        """
+        按默认排序（倒序）的上一个及下一个资源ID，facet不为None时只在该筛选条件的值为value的资源中查找
+        返回：(上一个资源ID, 下一个资源ID)，不存在时为None
+        """
+        config = LIST_INDEX_CONFIG[SOURCE_TYPE_DB[source_type]]
+        prefix = self.ensure_index(source_type)
+        if facet is None:
+            key = self.get_sort_key(prefix, config['sorts'][0])
+        elif facet in config['sorted_facets']:
+            key = self.get_facet_sort_key(prefix, facet, value)
+        else:
+            return ValueError('Filter %s is not supported.' % facet)
+
+        rank = self.handle.zrevrank(key, source_id)
+        if rank is None:
+            return None, None
+        start = max(rank - 1, 0)
+        ids_list = [int(item_id) for item_id in self.handle.zrevrange(key, start, rank + 1)]
+        position = rank - start
+        previous_id = ids_list[position - 1] if position > 0 else None
+        next_id = ids_list[position + 1] if position + 1 < len(ids_list) else None
+        return previous_id, next_id
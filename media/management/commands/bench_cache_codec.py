@@ -0,0 +1,133 @@
+# -*- coding:utf8 -*-
+"""
+缓存编解码性能对比：pickle（旧格式） vs JsonCodec（带版本号的JSON格式）
+
+用法：
+    python manage.py bench_cache_codec                        # 使用构造的典型数据
+    python manage.py bench_cache_codec --media-id 1 --information-id 1   # 使用数据库中的数据
+"""
+from __future__ import unicode_literals
+
+import json
+import pickle
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils.timezone import now
+
+from horizon.models import model_to_dict
+from horizon.redis.codec import pickle_codec, json_codec
+from media.models import Media, Information
+
+
+def make_sample_media():
+    media = Media(id=1024,
+                  title='流浪地球',
+                  subtitle='中国科幻电影里程碑',
+                  description='太阳即将毁灭，人类在地球表面建造出巨大的推进器，寻找新家园。' * 4,
+                  media_type=10,
+                  theme_type=3,
+                  progress=2,
+                  template_type=1,
+                  tags=json.dumps([1, 5, 8, 13]),
+                  temperature=4.6,
+                  box_office_forecast=46.5,
+                  public_praise_forecast=8.2,
+                  roi='1:5',
+                  media_outline=json.dumps({'导演': ['郭帆'],
+                                            '主演': ['屈楚萧', '吴京', '李光洁'],
+                                            '出品公司': ['中国电影股份有限公司']},
+                                           ensure_ascii=False),
+                  air_time=now(),
+                  read_count=10240,
+                  like=512,
+                  collection_count=128,
+                  comment_count=64,
+                  mark=1,
+                  film_performance=json.dumps({'导演号召力': 3.5, '男主角号召力': 4.0,
+                                               '女主角号召力': 4.2, '类型关注度': 3.8,
+                                               '片方指数': 3.7}, ensure_ascii=False),
+                  picture='/static/web/picture/media/abcdefghijklmnopqrst.png',
+                  picture_profile='/static/web/picture/media/bcdefghijklmnopqrstu.png',
+                  picture_detail='/static/web/picture/media/cdefghijklmnopqrstuv.png',
+                  created=now(),
+                  updated=now())
+    detail = model_to_dict(media)
+    detail['tags'] = ['科幻', '灾难', '植入', '片头']
+    detail['media_outline'] = json.loads(detail['media_outline'])
+    detail['film_performance'] = json.loads(detail['film_performance'])
+    detail['media_type_name'] = '电影'
+    detail['theme_type_name'] = '科幻'
+    detail['progress_name'] = '策划期'
+    return media, detail
+
+
+def make_sample_information():
+    information = Information(id=2048,
+                              title='2019春节档电影营销观察',
+                              subtitle='品牌植入与档期选择',
+                              description='春节档电影的品牌合作方式盘点。',
+                              content='<p>%s</p>' % ('春节档电影品牌植入案例分析。' * 200),
+                              picture='/static/web/picture/media/defghijklmnopqrstuvw.png',
+                              tags=json.dumps([2, 5, 9]),
+                              read_count=2048,
+                              like=32,
+                              collection_count=16,
+                              comment_count=8,
+                              mark=1,
+                              column=3,
+                              created=now(),
+                              updated=now())
+    detail = model_to_dict(information)
+    detail['tags'] = ['营销', '植入', '春节档']
+    return information, detail
+
+
+class Command(BaseCommand):
+    help = 'Compare pickle and JsonCodec encode/decode time and bytes per key.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--number', type=int, default=2000,
+                            help='Iterations per measurement.')
+        parser.add_argument('--media-id', type=int, default=None,
+                            help='Benchmark a Media row from the database.')
+        parser.add_argument('--information-id', type=int, default=None,
+                            help='Benchmark an Information row from the database.')
+
+    def get_samples(self, media_id=None, information_id=None):
+        if media_id:
+            media = Media.get_object(pk=media_id)
+            media_detail = media.perfect_detail
+        else:
+            media, media_detail = make_sample_media()
+        if information_id:
+            information = Information.get_object(pk=information_id)
+            information_detail = information.perfect_detail
+        else:
+            information, information_detail = make_sample_information()
+        return [('Media instance', media),
+                ('Media detail', media_detail),
+                ('Information instance', information),
+                ('Information detail', information_detail)]
+
+    def measure(self, function, value, number):
+        start = time.time()
+        for _ in range(number):
+            function(value)
+        return (time.time() - start) / number * 1000000
+
+    def handle(self, *args, **options):
+        number = options['number']
+        codecs = [('pickle', pickle.dumps, pickle_codec.decode),
+                  ('pickle-2', lambda value: pickle.dumps(value, 2), pickle_codec.decode),
+                  ('json-v1', json_codec.encode, json_codec.decode)]
+
+        line_format = '%-22s %-9s %8s %12s %12s'
+        self.stdout.write(line_format % ('payload', 'codec', 'bytes', 'encode(us)', 'decode(us)'))
+        for name, value in self.get_samples(options['media_id'], options['information_id']):
+            for codec_name, encode, decode in codecs:
+                string = encode(value)
+                encode_us = self.measure(encode, value, number)
+                decode_us = self.measure(decode, string, number)
+                self.stdout.write(line_format % (name, codec_name, len(string),
+                                                 '%.1f' % encode_us, '%.1f' % decode_us))
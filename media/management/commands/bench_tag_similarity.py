@@ -0,0 +1,120 @@
+# -*- coding:utf8 -*-
+"""
+标签相似度性能对比：逐个资源求交集 vs 倒排表计数 vs 位图（TagMatrix）
+
+用法：
+    python manage.py bench_tag_similarity                           # 1万及10万条构造的数据
+    python manage.py bench_tag_similarity --items 50000 --queries 50
+"""
+from __future__ import division, unicode_literals
+
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from media.tag_similarity import TagMatrix, RANK_OVERLAP, RANK_JACCARD
+
+
+def make_items(count, tag_count, max_tags, seed=0):
+    randomizer = random.Random(seed)
+    tag_pool = range(1, tag_count + 1)
+    return [(item_id, randomizer.sample(tag_pool, randomizer.randint(1, max_tags)))
+            for item_id in range(1, count + 1)]
+
+
+def rank_by_scan(items, tag_ids, top_k, method):
+    """
+    逐个资源求交集（原有的实现方式）
+    """
+    query = set(tag_ids)
+    scores = []
+    for position, (item_id, item_tag_ids) in enumerate(items):
+        item_tags = set(item_tag_ids)
+        count = len(item_tags & query)
+        if not count:
+            continue
+        if method == RANK_JACCARD:
+            score = count / len(item_tags | query)
+        else:
+            score = count
+        scores.append((-score, position, item_id, score))
+    scores.sort()
+    return [(item_id, score) for _, _, item_id, score in scores[:top_k]]
+
+
+def rank_by_inverted_index(tag_index, sizes, tag_ids, top_k, method):
+    """
+    倒排表：{标签ID: [资源位置, ...]}，累加计数后排序
+    """
+    query = set(tag_ids)
+    counts = {}
+    for tag_id in query:
+        for position in tag_index.get(tag_id, ()):
+            counts[position] = counts.get(position, 0) + 1
+    scores = []
+    for position, count in counts.items():
+        if method == RANK_JACCARD:
+            score = count / (sizes[position] + len(query) - count)
+        else:
+            score = count
+        scores.append((-score, position, score))
+    scores.sort()
+    return [(position, score) for _, position, score in scores[:top_k]]
+
+
+class Command(BaseCommand):
+    help = 'Compare tag-similarity ranking by scan, inverted index and bitset.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, nargs='+', default=[10000, 100000],
+                            help='Item counts to benchmark.')
+        parser.add_argument('--tags', type=int, default=300, help='Size of the tag pool.')
+        parser.add_argument('--max-tags', type=int, default=8, help='Max tags per item.')
+        parser.add_argument('--queries', type=int, default=20, help='Queries per measurement.')
+        parser.add_argument('--top-k', type=int, default=20)
+
+    def measure(self, function, queries):
+        start = time.time()
+        results = [function(tag_ids) for tag_ids in queries]
+        return (time.time() - start) / len(queries) * 1000, results
+
+    def handle(self, *args, **options):
+        top_k = options['top_k']
+        line_format = '%-8s %-9s %-16s %12s %10s'
+        self.stdout.write(line_format % ('items', 'method', 'implementation',
+                                         'build(ms)', 'query(ms)'))
+        for count in options['items']:
+            items = make_items(count, options['tags'], options['max_tags'])
+            queries = [tag_ids for _, tag_ids in
+                       make_items(options['queries'], options['tags'], options['max_tags'], seed=1)]
+
+            start = time.time()
+            tag_index = {}
+            sizes = []
+            for position, (_, tag_ids) in enumerate(items):
+                sizes.append(len(set(tag_ids)))
+                for tag_id in set(tag_ids):
+                    tag_index.setdefault(tag_id, []).append(position)
+            index_build_ms = (time.time() - start) * 1000
+
+            start = time.time()
+            matrix = TagMatrix(items)
+            matrix_build_ms = (time.time() - start) * 1000
+
+            for method in (RANK_OVERLAP, RANK_JACCARD):
+                scan_ms, expected = self.measure(
+                    lambda tag_ids: rank_by_scan(items, tag_ids, top_k, method), queries)
+                index_ms, _ = self.measure(
+                    lambda tag_ids: rank_by_inverted_index(tag_index, sizes, tag_ids,
+                                                           top_k, method), queries)
+                matrix_ms, results = self.measure(
+                    lambda tag_ids: matrix.rank(tag_ids, top_k=top_k, method=method), queries)
+                if results != expected:
+                    self.stderr.write('%s %s: bitset result differs from scan.' % (count, method))
+
+                self.stdout.write(line_format % (count, method, 'scan', '-', '%.2f' % scan_ms))
+                self.stdout.write(line_format % (count, method, 'inverted index',
+                                                 '%.1f' % index_build_ms, '%.2f' % index_ms))
+                self.stdout.write(line_format % (count, method, 'bitset',
+                                                 '%.1f' % matrix_build_ms, '%.2f' % matrix_ms))
@@ -0,0 +1,30 @@
+# -*- coding:utf8 -*-
+"""
+全量重建资源列表的筛选及排序索引（平时由media.signals增量更新）
+
+用法：
+    python manage.py rebuild_list_index                  # 全部资源类型
+    python manage.py rebuild_list_index --source-type 1  # 只重建媒体资源
+"""
+from django.core.management.base import BaseCommand
+
+from comment.models import SOURCE_TYPE_DB
+from media.list_index import ListIndex
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the Redis facet and sort indexes used by resource lists.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source-type', type=int, choices=sorted(SOURCE_TYPE_DB.keys()),
+                            default=None, help='1: media, 2: case, 3: information.')
+
+    def handle(self, *args, **options):
+        source_types = [options['source_type']] if options['source_type'] else SOURCE_TYPE_DB.keys()
+        index = ListIndex()
+        for source_type in sorted(source_types):
+            count = index.build_index(source_type)
+            if isinstance(count, Exception):
+                self.stderr.write('source_type %s: %s' % (source_type, count))
+                continue
+            self.stdout.write('source_type %s: %d documents indexed' % (source_type, count))
@@ -24,6 +24,30 @@ RESOURCE_COLUMN_CONFIG = {
 
 MEDIA_PICTURE_PATH = settings.PICTURE_DIRS['web']['media']
 
+RELEVANT_COUNT_ATTRS = ('like', 'collection_count', 'comment_count', 'read_count')
+
+
+def base_get_tags_key(instance):
+    """
+    获取资源在标签字典中的Key（标签ID排序后以":"连接），标签数据格式错误时返回None
+    """
+    try:
+        tags = json.loads(instance.tags)
+    except:
+        return None
+    tags = [str(tag) for tag in sorted(tags)]
+    return ':'.join(tags)
+
+
+def get_tag_ids(instance):
+    """
+    资源的标签ID列表，标签数据格式错误时返回空列表
+    """
+    try:
+        return [int(tag_id) for tag_id in json.loads(instance.tags)]
+    except (TypeError, ValueError):
+        return []
+
 
 def base_get_tags_key_dict(cls):
     """
@@ -32,18 +56,34 @@ def base_get_tags_key_dict(cls):
     instances = cls.filter_objects()
     tags_dict = {}
     for ins in instances:
-        try:
-            tags = json.loads(ins.tags)
-        except:
+        tags_key = base_get_tags_key(ins)
+        if tags_key is None:
             continue
-        tags = [str(tag) for tag in sorted(tags)]
-        tags_key = ':'.join(tags)
         id_list = tags_dict.get(tags_key, [])
         id_list.append(ins.id)
         tags_dict[tags_key] = id_list
     return tags_dict
 
 
+def base_bulk_update_relevant_count(cls, attr, count_dict):
+    """
+    批量更新资源的相关数量（点赞、阅读、收藏及评论数量）
+    每张表每个字段只执行一条UPDATE语句，且不修改updated字段（不影响排序）
+    count_dict: {资源ID: 数量}
+    返回：更新的数据条数
+    """
+    if attr not in RELEVANT_COUNT_ATTRS:
+        return Exception('Params [attr] is incorrect.')
+    if not count_dict:
+        return 0
+
+    whens = [models.When(pk=pk, then=models.Value(int(count)))
+             for pk, count in count_dict.items()]
+    case_value = models.Case(*whens, default=models.F(attr),
+                             output_field=models.IntegerField())
+    return cls.objects.filter(pk__in=list(count_dict.keys())).update(**{attr: case_value})
+
+
 class Media(models.Model):
     """
     媒体资源
@@ -192,6 +232,22 @@ class Media(models.Model):
         detail['progress_name'] = getattr(progress_ins, 'name', None)
         return detail
 
+    @property
+    def search_detail(self):
+        """
+        搜索字典中的数据
+        """
+        return {'title': self.title,
+                'subtitle': self.subtitle,
+                'tags': self.perfect_detail['tags'],
+                'media_type_id': self.media_type,
+                'theme_type_id': self.theme_type,
+                'progress_id': self.progress,
+                'mark': self.mark,
+                'temperature': self.temperature,
+                'updated': self.updated,
+                'air_time': self.air_time}
+
     @classmethod
     def get_object(cls, **kwargs):
         kwargs = get_perfect_filter_params(cls, **kwargs)
@@ -286,6 +342,13 @@ class Media(models.Model):
             media = _media
         return media
 
+    @classmethod
+    def bulk_update_relevant_count(cls, attr, count_dict):
+        """
+        批量更新相关数量（不修改updated字段）
+        """
+        return base_bulk_update_relevant_count(cls, attr, count_dict)
+
     @classmethod
     def get_relevant_count(cls, media_id, column='read'):
         instance = cls.get_object(pk=media_id)
@@ -320,17 +383,7 @@ class Media(models.Model):
         instances = cls.filter_objects()
         search_dict = {}
         for ins in instances:
-            item_dict = {'title': ins.title,
-                         'subtitle': ins.subtitle,
-                         'tags': ins.perfect_detail['tags'],
-                         'media_type_id': ins.media_type,
-                         'theme_type_id': ins.theme_type,
-                         'progress_id': ins.progress,
-                         'mark': ins.mark,
-                         'temperature': ins.temperature,
-                         'updated': ins.updated,
-                         'air_time': ins.air_time}
-            search_dict[ins.id] = item_dict
+            search_dict[ins.id] = ins.search_detail
         return search_dict
 
 
@@ -639,6 +692,18 @@ class Information(models.Model):
                     detail[key] = json.loads(detail[key])
         return detail
 
+    @property
+    def search_detail(self):
+        """
+        搜索字典中的数据
+        """
+        return {'title': self.title,
+                'subtitle': self.subtitle,
+                'tags': self.perfect_detail['tags'],
+                'mark': self.mark,
+                'column': self.column,
+                'updated': self.updated}
+
     @classmethod
     def plus_action(cls, information_id, attr='read_count'):
         information = None
@@ -733,6 +798,13 @@ class Information(models.Model):
             details.append(ins.perfect_detail)
         return details
 
+    @classmethod
+    def bulk_update_relevant_count(cls, attr, count_dict):
+        """
+        批量更新相关数量（不修改updated字段）
+        """
+        return base_bulk_update_relevant_count(cls, attr, count_dict)
+
     @classmethod
     def get_relevant_count(cls, information_id, column='read'):
         instance = cls.get_object(pk=information_id)
@@ -767,13 +839,7 @@ class Information(models.Model):
         instances = cls.filter_objects()
         search_dict = {}
         for ins in instances:
-            item_dict = {'title': ins.title,
-                         'subtitle': ins.subtitle,
-                         'tags': ins.perfect_detail['tags'],
-                         'mark': ins.mark,
-                         'column': ins.column,
-                         'updated': ins.updated}
-            search_dict[ins.id] = item_dict
+            search_dict[ins.id] = ins.search_detail
         return search_dict
 
 
@@ -846,6 +912,18 @@ class Case(models.Model):
                     detail[key] = json.loads(detail[key])
         return detail
 
+    @property
+    def search_detail(self):
+        """
+        搜索字典中的数据
+        """
+        return {'title': self.title,
+                'subtitle': self.subtitle,
+                'tags': self.perfect_detail['tags'],
+                'mark': self.mark,
+                'column': self.column,
+                'updated': self.updated}
+
     # @classmethod
     # def plus_action(cls, case_id, attr='read_count'):
     #     case = None
@@ -940,6 +1018,13 @@ class Case(models.Model):
             details.append(ins.perfect_detail)
         return details
 
+    @classmethod
+    def bulk_update_relevant_count(cls, attr, count_dict):
+        """
+        批量更新相关数量（不修改updated字段）
+        """
+        return base_bulk_update_relevant_count(cls, attr, count_dict)
+
     @classmethod
     def get_relevant_count(cls, case_id, column='read'):
         instance = cls.get_object(pk=case_id)
@@ -974,13 +1059,7 @@ class Case(models.Model):
         instances = cls.filter_objects()
         search_dict = {}
         for ins in instances:
-            item_dict = {'title': ins.title,
-                         'subtitle': ins.subtitle,
-                         'tags': ins.perfect_detail['tags'],
-                         'mark': ins.mark,
-                         'column': ins.column,
-                         'updated': ins.updated}
-            search_dict[ins.id] = item_dict
+            search_dict[ins.id] = ins.search_detail
         return search_dict
 
 
@@ -1029,7 +1108,23 @@ class ResourceOpinionRecord(models.Model):
         instances = cls.filter_objects(**kwargs)
         if isinstance(instances, Exception):
             return 0
-        return len(instances)
+        return instances.count()
+
+    @classmethod
+    def get_like_count_dict(cls, source_type, source_ids=None):
+        """
+        获取某类资源的点赞数字典（以资源ID为Key，点赞数为Value）
+        source_ids: 只统计这些资源（为None时统计全部资源）
+        """
+        kwargs = {'source_type': source_type}
+        if source_ids is not None:
+            kwargs['source_id__in'] = source_ids
+        instances = cls.filter_objects(**kwargs)
+        if isinstance(instances, Exception):
+            return instances
+        # 清除Meta.ordering，否则排序字段会加入GROUP BY，同一资源被拆成多行
+        count_list = instances.order_by().values('source_id').annotate(count=models.Count('id'))
+        return {item['source_id']: item['count'] for item in count_list}
 
 
 ADVERT_PICTURE_PATH = settings.PICTURE_DIRS['web']['advert']
@@ -0,0 +1,255 @@
+# -*- coding:utf8 -*-
+"""
+预先计算的相关资源（推荐资源、相关案例、相关文章）
+
+每个资源保存按标签重合数量倒序排列的前RELATED_TOP_K个相关资源ID（重合数量相同时较新的资源在前，
+不足时用最新的资源补足），以及计算时的标签（标签变更时据此找出受影响的资源）。
+定时任务全量重新计算；资源保存后只重新计算受影响的资源；
+请求时缓存不存在则先返回最新的资源，由异步任务计算（请求中不建立全表的标签矩阵）。
+"""
+from __future__ import unicode_literals
+
+import logging
+import operator
+import time
+
+from django.db.models import Q
+
+from horizon.caches import BaseCache, EXPIRES_24_HOURS
+from media.models import Media, Information, Case, get_tag_ids
+from media.tag_similarity import TagMatrix
+
+logger = logging.getLogger(__name__)
+
+# 每个资源保存的相关资源数量
+RELATED_TOP_K = 20
+# 过期时间（定时任务每天重新计算）
+RELATED_EXPIRES = 3 * EXPIRES_24_HOURS
+# 全量计算时每批写入的数量
+BUILD_BATCH_SIZE = 500
+# 异步任务中标签矩阵的最长复用时间（秒）
+TAG_INDEX_MAX_AGE = 60
+# 同一资源的计算任务的最短提交间隔（秒）
+REFRESH_PENDING_EXPIRES = 60
+
+# {类型: (资源的Model, 相关资源的Model)}
+RELATED_CONFIG = {
+    'media': (Media, Media),
+    'media_case': (Media, Case),
+    'information': (Information, Information),
+    'case': (Case, Case),
+}
+
+
+class TagIndex(object):
+    """
+    相关资源的标签矩阵（位图），以及最新的资源ID（用于补足）
+    """
+    def __init__(self, model_class):
+        self.matrix = TagMatrix.from_model(model_class)
+        self.latest_ids = self.matrix.item_ids[:RELATED_TOP_K + 1]
+
+    def rank(self, tag_ids, exclude_id=None, top_k=RELATED_TOP_K):
+        ids_list = [item_id for item_id, _ in
+                    self.matrix.rank(tag_ids, exclude_id=exclude_id, top_k=top_k)]
+        matched = set(ids_list)
+        for item_id in self.latest_ids:
+            if len(ids_list) >= top_k:
+                break
+            if item_id != exclude_id and item_id not in matched:
+                ids_list.append(item_id)
+        return ids_list
+
+
+# 当前进程的标签矩阵：{相关资源的Model: (建立时间, TagIndex)}
+_tag_indexes = {}
+
+
+def build_tag_index(model_class):
+    """
+    建立标签矩阵，并作为当前进程中最新的标签矩阵
+    """
+    tag_index = TagIndex(model_class)
+    _tag_indexes[model_class] = (time.time(), tag_index)
+    return tag_index
+
+
+def get_tag_index(model_class):
+    """
+    当前进程的标签矩阵（建立超过TAG_INDEX_MAX_AGE秒后重新建立），供异步任务逐个计算时复用
+    """
+    entry = _tag_indexes.get(model_class)
+    if entry is None or time.time() - entry[0] > TAG_INDEX_MAX_AGE:
+        return build_tag_index(model_class)
+    return entry[1]
+
+
+class RelatedItems(BaseCache):
+    expires = RELATED_EXPIRES
+
+    def get_related_key(self, kind, source_id):
+        return self.make_key('related:%s' % kind, source_id)
+
+    def get_refresh_pending_key(self, kind, source_id):
+        return self.make_key('related_refresh_pending:%s' % kind, source_id)
+
+    def compute_related(self, kind, source_id, tag_index=None):
+        """
+        计算一个资源的相关资源：{'tags': [标签ID, ...], 'ids': [相关资源ID, ...]}
+        """
+        source_class, target_class = RELATED_CONFIG[kind]
+        instance = source_class.get_object(pk=source_id)
+        if isinstance(instance, Exception):
+            return instance
+        tag_index = tag_index or get_tag_index(target_class)
+        exclude_id = source_id if source_class is target_class else None
+        tag_ids = get_tag_ids(instance)
+        return {'tags': tag_ids, 'ids': tag_index.rank(tag_ids, exclude_id=exclude_id)}
+
+    def refresh_item(self, kind, source_id):
+        """
+        计算一个资源的相关资源并写入缓存（在异步任务中执行）
+        """
+        return self.recompute_data(self.get_related_key(kind, source_id), self.compute_related,
+                                   kind=kind, source_id=source_id)
+
+    def schedule_refresh(self, kind, source_id):
+        """
+        提交计算任务（同一资源REFRESH_PENDING_EXPIRES秒内只提交一次），任务队列不可用时只记录日志
+        """
+        from media.tasks import refresh_related_item
+
+        if not self.handle.set_string(self.get_refresh_pending_key(kind, source_id), 1,
+                                      ex=REFRESH_PENDING_EXPIRES, nx=True):
+            return False
+        try:
+            refresh_related_item.delay(kind, source_id)
+        except Exception:
+            logger.exception('Failed to schedule related items refresh for %s %s.',
+                             kind, source_id)
+            return False
+        return True
+
+    def get_latest_ids(self, model_class, exclude_id=None):
+        """
+        最新的RELATED_TOP_K个资源ID（相关资源尚未计算时使用）
+        """
+        instances = model_class.filter_objects()
+        if isinstance(instances, Exception):
+            return instances
+        ids_list = instances.order_by('-updated', '-id').values_list('id', flat=True)
+        return [item_id for item_id in ids_list[:RELATED_TOP_K + 1]
+                if item_id != exclude_id][:RELATED_TOP_K]
+
+    def get_related_ids(self, kind, source_id):
+        """
+        相关资源ID列表：缓存不存在时提交异步任务计算，本次先返回最新的资源
+        """
+        related = self.get_instance_from_cache(self.get_related_key(kind, source_id))
+        if related is not None:
+            related = self.perfect_cache_data(related)
+            if isinstance(related, Exception):
+                return related
+            return related['ids']
+
+        source_class, target_class = RELATED_CONFIG[kind]
+        instance = source_class.get_object(pk=source_id)
+        if isinstance(instance, Exception):
+            return instance
+        self.schedule_refresh(kind, source_id)
+        return self.get_latest_ids(target_class,
+                                   exclude_id=source_id if source_class is target_class else None)
+
+    def build(self, kind):
+        """
+        全量计算一类相关资源，返回计算的资源数量
+        """
+        source_class, target_class = RELATED_CONFIG[kind]
+        instances = source_class.filter_objects()
+        if isinstance(instances, Exception):
+            return instances
+        tag_index = build_tag_index(target_class)
+        exclude = source_class is target_class
+        count = 0
+        data_dict = {}
+        for ins in instances.only('id', 'tags').iterator():
+            tag_ids = get_tag_ids(ins)
+            ids_list = tag_index.rank(tag_ids, exclude_id=ins.id if exclude else None)
+            data_dict[self.get_related_key(kind, ins.id)] = {'tags': tag_ids, 'ids': ids_list}
+            count += 1
+            if len(data_dict) >= BUILD_BATCH_SIZE:
+                self.set_instances_to_cache(data_dict)
+                data_dict = {}
+        self.set_instances_to_cache(data_dict)
+        return count
+
+    def get_items_with_tags(self, model_class, tag_ids):
+        """
+        带有tag_ids中任一标签的资源（一次查询）：{资源ID: [标签ID, ...]}
+        """
+        instances = model_class.filter_objects()
+        if isinstance(instances, Exception) or not tag_ids:
+            return {}
+        query = reduce(operator.or_, [Q(tags__contains=str(tag_id)) for tag_id in tag_ids])
+        items = {}
+        for ins in instances.filter(query).only('id', 'tags').iterator():
+            item_tag_ids = get_tag_ids(ins)
+            # tags__contains按字符串匹配（如1匹配11），需再次确认
+            if tag_ids.intersection(item_tag_ids):
+                items[ins.id] = item_tag_ids
+        return items
+
+    def update_item(self, model_class, source_id, old_tag_ids=None):
+        """
+        资源变更（新增、修改标签、删除）后，重新计算受影响的资源：
+        该资源自己的相关资源，以及与其原标签或新标签有重合的资源
+        old_tag_ids: 原有的标签（不传时从缓存中读取）
+        返回：重新计算的资源数量
+        """
+        if old_tag_ids is None:
+            old_tag_ids = self.get_cached_tags(model_class, source_id)
+        instance = model_class.get_object(pk=source_id)
+        new_tag_ids = [] if isinstance(instance, Exception) else get_tag_ids(instance)
+        changed_tag_ids = set(old_tag_ids) | set(new_tag_ids)
+
+        count = 0
+        # 每个相关资源的Model只建立一次标签矩阵
+        tag_indexes = {}
+        for kind, (source_class, target_class) in RELATED_CONFIG.items():
+            if model_class not in (source_class, target_class):
+                continue
+            # {需要重新计算的资源ID: [标签ID, ...]}
+            items = {}
+            if target_class is model_class:
+                items.update(self.get_items_with_tags(source_class, changed_tag_ids))
+            if source_class is model_class:
+                if isinstance(instance, Exception):
+                    self.delete_data_from_cache(self.get_related_key(kind, source_id))
+                else:
+                    items[source_id] = new_tag_ids
+            if not items:
+                continue
+
+            if target_class not in tag_indexes:
+                tag_indexes[target_class] = build_tag_index(target_class)
+            tag_index = tag_indexes[target_class]
+            exclude = source_class is target_class
+            self.set_instances_to_cache(
+                {self.get_related_key(kind, item_id):
+                    {'tags': tag_ids,
+                     'ids': tag_index.rank(tag_ids, exclude_id=item_id if exclude else None)}
+                 for item_id, tag_ids in items.items()})
+            count += len(items)
+        return count
+
+    def get_cached_tags(self, model_class, source_id):
+        """
+        上次计算时资源的标签
+        """
+        for kind, (source_class, _) in RELATED_CONFIG.items():
+            if source_class is not model_class:
+                continue
+            related = self.get_instance_from_cache(self.get_related_key(kind, source_id))
+            if related:
+                return related['tags']
+        return []
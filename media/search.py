@@ -0,0 +1,376 @@
+# -*- coding:utf8 -*-
+"""
+资源（媒体资源、案例、资讯）搜索：基于Redis有序集合的倒排索引
+
+索引：每个词一个有序集合（成员为资源ID，分数为该词在各字段中出现次数 x 字段权重），
+     每个资源一个Hash记录其全部词及分数（用于修改、删除时从倒排索引中移除）
+分词：中日文字符按单字及相邻两字切分，字母数字按单词切分，并索引单词的全部前缀（前缀查询）
+查询：每个关键词内的各个词取交集（分数取最小值），多个关键词的结果取并集（分数相加）
+结果缓存：按规范化的关键词、资源类型及分页缓存查询结果，Key中带内容版本（命名空间代数），
+        任意资源的可搜索字段变更时版本加1；并记录热门查询，定时预热
+"""
+from __future__ import unicode_literals
+
+import hashlib
+import logging
+import re
+import uuid
+
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist
+
+from horizon.caches import BaseIndexCache
+from comment.models import SOURCE_TYPE_DB
+
+logger = logging.getLogger(__name__)
+
+# 字段权重
+SEARCH_FIELD_WEIGHTS = {
+    'title': 3,
+    'subtitle': 1,
+    'tags': 2,
+}
+# 中日文字符
+CJK_CHARACTERS = '\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff'
+TOKEN_RE = re.compile('([%s]+)|([0-9a-z\u00c0-\u024f]+)' % CJK_CHARACTERS, re.UNICODE)
+
+# 字母数字单词索引的最长前缀（更长的单词另外索引整个单词）
+SEARCH_MAX_PREFIX_LENGTH = 20
+
+# 重建索引时每批写入的资源数量
+BUILD_BATCH_SIZE = 200
+
+# 查询结果缓存的过期时间（秒）
+SEARCH_RESULT_EXPIRES = 10 * 60
+# 预热的热门查询数量
+HOT_QUERY_TOP_N = 50
+# 最多记录的热门查询数量
+HOT_QUERY_MAX_COUNT = 1000
+# 每次预热后热门查询计数的衰减系数
+HOT_QUERY_DECAY = 0.9
+
+
+def to_unicode(text):
+    if text is None:
+        return ''
+    if isinstance(text, bytes):
+        return text.decode('utf8')
+    return '%s' % text
+
+
+def split_text(text):
+    """
+    切分为连续的中日文字符串及单词：[(是否为中日文, 字符串), ...]
+    """
+    runs = []
+    for cjk_run, word in TOKEN_RE.findall(to_unicode(text).lower()):
+        if cjk_run:
+            runs.append((True, cjk_run))
+        else:
+            runs.append((False, word))
+    return runs
+
+
+def tokenize(text):
+    """
+    索引用分词（保留重复的词，用于计算出现次数）
+    字母数字单词索引其全部前缀（不超过SEARCH_MAX_PREFIX_LENGTH），如open、iphone可以找到
+    Opening、iPhone12
+    """
+    tokens = []
+    for is_cjk, run in split_text(text):
+        if is_cjk:
+            tokens.extend(run)
+            tokens.extend(run[index:index + 2] for index in range(len(run) - 1))
+        else:
+            tokens.extend(run[:length] for length in
+                          range(1, min(len(run), SEARCH_MAX_PREFIX_LENGTH) + 1))
+            if len(run) > SEARCH_MAX_PREFIX_LENGTH:
+                tokens.append(run)
+    return tokens
+
+
+def tokenize_keyword(keyword):
+    """
+    查询用分词：关键词需包含的全部词（单个中日文字符按单字查询，多个字符按相邻两字查询）
+    """
+    tokens = []
+    for is_cjk, run in split_text(keyword):
+        if not is_cjk or len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[index:index + 2] for index in range(len(run) - 1))
+    return sorted(set(tokens))
+
+
+def normalize_keywords(keywords):
+    """
+    规范化查询：每个关键词替换为其分词结果（用"+"连接），去重后排序，
+    再次分词的结果与原查询相同
+    """
+    if isinstance(keywords, basestring):
+        keywords = keywords.split()
+    groups = set('+'.join(tokens) for tokens in (tokenize_keyword(keyword) for keyword in keywords)
+                 if tokens)
+    return ' '.join(sorted(groups))
+
+
+def get_document_tokens(search_detail):
+    """
+    资源的全部词及分数：{词: 分数}
+    """
+    token_scores = {}
+    for field, weight in SEARCH_FIELD_WEIGHTS.items():
+        value = search_detail.get(field)
+        if isinstance(value, (list, tuple)):
+            value = ' '.join(to_unicode(item) for item in value)
+        for token in tokenize(value):
+            token_scores[token] = token_scores.get(token, 0) + weight
+    return token_scores
+
+
+class SearchIndex(BaseIndexCache):
+    def get_source_type(self, model_class):
+        for source_type, source_class in SOURCE_TYPE_DB.items():
+            if source_class is model_class:
+                return source_type
+        raise ValueError('%s is not a searchable model.' % model_class.__name__)
+
+    def get_index_namespace(self, source_type):
+        return 'search_index:%s' % source_type
+
+    def get_token_key(self, prefix, token):
+        return '%s:token:%s' % (prefix, token)
+
+    def get_document_key(self, prefix, source_id):
+        return '%s:doc:%s' % (prefix, source_id)
+
+    def get_temp_key(self):
+        return 'search_index_tmp:%s' % uuid.uuid4().hex
+
+    def get_content_version_namespace(self, source_type):
+        return 'search_result:%s' % source_type
+
+    def get_result_key(self, source_type, query, start, end):
+        query_hash = hashlib.md5(query.encode('utf8')).hexdigest()
+        return self.make_key(self.get_content_version_namespace(source_type),
+                             query_hash, start, end)
+
+    def get_hot_query_key(self, source_type):
+        return 'search_hot_queries:%s' % source_type
+
+    def get_build_pending_key(self, source_type):
+        return '%s:build_pending' % self.get_index_namespace(source_type)
+
+    def bump_content_version(self, source_type):
+        """
+        内容版本加1，使该类资源的全部查询结果缓存失效
+        """
+        return self.bump_generation(self.get_content_version_namespace(source_type))
+
+    def get_instance_tokens(self, instance):
+        """
+        instance为None（已删除）或状态无效时返回空字典（从索引中移除）
+        """
+        if instance is None or instance.status != 1:
+            return {}
+        return get_document_tokens(instance.search_detail)
+
+    def write_document(self, pipe, prefix, source_id, token_scores, old_tokens=()):
+        document_key = self.get_document_key(prefix, source_id)
+        for token in old_tokens:
+            if token not in token_scores:
+                pipe.zrem(self.get_token_key(prefix, token), source_id)
+        pipe.delete(document_key)
+        if token_scores:
+            for token, score in token_scores.items():
+                pipe.execute_command(b'ZADD', self.get_token_key(prefix, token), score, source_id)
+            pipe.hmset(document_key, token_scores)
+
+    def write_item(self, prefix, source_id, token_scores):
+        old_tokens = [to_unicode(token) for token in
+                      self.handle.hkeys(self.get_document_key(prefix, source_id))]
+        pipe = self.handle.pipeline()
+        self.write_document(pipe, prefix, source_id, token_scores, old_tokens)
+        pipe.execute()
+
+    def write_index_item(self, prefix, member, source_type):
+        instance = SOURCE_TYPE_DB[source_type].get_object(pk=int(member))
+        if isinstance(instance, ObjectDoesNotExist):
+            instance = None
+        elif isinstance(instance, Exception):
+            return
+        self.write_item(prefix, int(member), self.get_instance_tokens(instance))
+
+    def update_document(self, model_class, source_id, instance=None, bump_version=True):
+        """
+        增量更新一个资源的索引，instance为None（已删除）或状态无效时从索引中移除
+        写入索引后再增加内容版本：期间的查询结果只会写入旧版本的Key
+        """
+        source_type = self.get_source_type(model_class)
+        token_scores = self.get_instance_tokens(instance)
+        result = self.update_index_item(
+            source_id, lambda prefix: self.write_item(prefix, source_id, token_scores),
+            source_type)
+        if bump_version:
+            self.bump_content_version(source_type)
+        return result
+
+    def update_tag(self, tag_id):
+        """
+        资源标签变更后，重建包含该标签的资源的索引
+        """
+        for source_type, model_class in SOURCE_TYPE_DB.items():
+            instances = model_class.filter_objects(tags__contains=str(tag_id))
+            if isinstance(instances, Exception):
+                continue
+            for ins in instances:
+                self.update_document(model_class, ins.pk, ins, bump_version=False)
+            self.bump_content_version(source_type)
+
+    def write_index(self, prefix, source_type):
+        instances = SOURCE_TYPE_DB[source_type].filter_objects()
+        if isinstance(instances, Exception):
+            return instances
+        count = 0
+        pipe = self.handle.pipeline(transaction=False)
+        for ins in instances.iterator():
+            self.write_document(pipe, prefix, ins.pk, get_document_tokens(ins.search_detail))
+            count += 1
+            if count % BUILD_BATCH_SIZE == 0:
+                pipe.execute()
+        pipe.execute()
+        return count
+
+    def build_next_generation(self, namespace, source_type):
+        count = super(SearchIndex, self).build_next_generation(namespace, source_type)
+        if not isinstance(count, Exception):
+            self.bump_content_version(source_type)
+        return count
+
+    def schedule_build(self, source_type):
+        """
+        提交建立索引的任务（建立期间只提交一次），任务队列不可用时只记录日志
+        """
+        from media.tasks import build_search_index
+
+        if not self.handle.set_string(self.get_build_pending_key(source_type), 1,
+                                      ex=self.build_lock_timeout, nx=True):
+            return False
+        try:
+            build_search_index.delay(source_type)
+        except Exception:
+            logger.exception('Failed to schedule search index build for source_type %s.',
+                             source_type)
+            return False
+        return True
+
+    def build_if_missing(self, source_type):
+        """
+        索引尚未建立时建立（在异步任务中执行），返回写入的数量，已建立时返回None
+        """
+        try:
+            self.refresh_generation(self.get_index_namespace(source_type))
+            if self.is_index_built(self.get_index_prefix(source_type)):
+                return None
+            return self.build_index(source_type)
+        finally:
+            self.handle.delete(self.get_build_pending_key(source_type))
+
+    def search(self, source_type, keywords, start=0, end=-1):
+        """
+        搜索资源：只取出排名在[start, end]之间的结果（有序集合按得分倒序取出，无需全部排序）
+        返回：(按得分倒序排列的列表 [{'resource_id': x, 'match_count': x}, ...], 匹配总数)
+        索引尚未建立时提交建立索引的任务（不在请求中建立），返回Exception
+        """
+        if isinstance(keywords, (str, unicode)):
+            keywords = keywords.split()
+        token_groups = [tokens for tokens in (tokenize_keyword(keyword) for keyword in keywords)
+                        if tokens]
+        if not token_groups:
+            return [], 0
+
+        prefix = self.get_index_prefix(source_type)
+        if not self.is_index_built(prefix):
+            self.schedule_build(source_type)
+            return Exception('Search index is being built, please try again later.')
+        pipe = self.handle.pipeline()
+        temp_keys = []
+        keyword_keys = []
+        for tokens in token_groups:
+            token_keys = [self.get_token_key(prefix, token) for token in tokens]
+            if len(token_keys) == 1:
+                keyword_keys.append(token_keys[0])
+                continue
+            temp_key = self.get_temp_key()
+            pipe.zinterstore(temp_key, token_keys, aggregate='MIN')
+            temp_keys.append(temp_key)
+            keyword_keys.append(temp_key)
+        result_key = self.get_temp_key()
+        temp_keys.append(result_key)
+        pipe.zunionstore(result_key, keyword_keys, aggregate='SUM')
+        pipe.zrevrange(result_key, start, end, withscores=True)
+        pipe.zcard(result_key)
+        pipe.delete(*temp_keys)
+        members, all_count = pipe.execute()[-3:-1]
+        return [{'resource_id': int(member), 'match_count': int(score)}
+                for member, score in members], all_count
+
+    def record_hot_query(self, source_type, query):
+        self.handle.execute_command(b'ZINCRBY', self.get_hot_query_key(source_type), 1, query)
+
+    def cached_search(self, source_type, keywords, start=0, end=-1):
+        """
+        带结果缓存的搜索，返回值与search相同（出错时不缓存）
+        """
+        query = normalize_keywords(keywords)
+        if not query:
+            return [], 0
+        self.record_hot_query(source_type, query)
+        key = self.get_result_key(source_type, query, start, end)
+        result = self.get_instance_from_cache(key)
+        if result is not None:
+            return result['match_result'], result['all_count']
+        return self.search_to_cache(source_type, query, start, end, key)
+
+    def search_to_cache(self, source_type, query, start, end, key):
+        # 先取得Key（内容版本）；资源变更时先写入索引，后增加版本，
+        # 查询期间资源变更时，结果写入已失效的旧版本Key
+        result = self.search(source_type, query, start=start, end=end)
+        if isinstance(result, Exception):
+            return result
+        match_result, all_count = result
+        self.set_instance_to_cache(key, {'match_result': match_result, 'all_count': all_count},
+                                   expires=SEARCH_RESULT_EXPIRES)
+        return match_result, all_count
+
+    def get_hot_queries(self, source_type, top_n=HOT_QUERY_TOP_N):
+        """
+        热门查询：[(query, 次数), ...]
+        """
+        return [(to_unicode(query), score) for query, score in
+                self.handle.zrevrange(self.get_hot_query_key(source_type), 0, top_n - 1,
+                                      withscores=True)]
+
+    def warm_hot_queries(self, source_type, top_n=HOT_QUERY_TOP_N, page_size=None):
+        """
+        预热热门查询的第一页结果，并衰减、清理热门查询计数
+        返回：本次重新生成的查询数量
+        """
+        page_size = page_size or settings.PAGE_SIZE
+        warmed_count = 0
+        for query, _ in self.get_hot_queries(source_type, top_n):
+            key = self.get_result_key(source_type, query, 0, page_size - 1)
+            if self.handle.exists(key):
+                continue
+            if isinstance(self.search_to_cache(source_type, query, 0, page_size - 1, key),
+                          Exception):
+                continue
+            warmed_count += 1
+
+        hot_query_key = self.get_hot_query_key(source_type)
+        pipe = self.handle.pipeline()
+        pipe.zunionstore(hot_query_key, {hot_query_key: HOT_QUERY_DECAY})
+        pipe.zremrangebyrank(hot_query_key, 0, -(HOT_QUERY_MAX_COUNT + 1))
+        pipe.execute()
+        return warmed_count
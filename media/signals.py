@@ -0,0 +1,106 @@
+# -*- coding:utf8 -*-
+"""
+数据变更时更新缓存（在事务提交后执行，避免其他请求用未提交的旧数据重新生成缓存）
+注意：删除数据后instance.pk会被置为None，需在注册回调前取出
+缓存、索引或任务队列不可用时只记录日志，不影响已提交的数据及其他缓存的更新
+"""
+import logging
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from media.models import (Media,
+                          MediaType,
+                          ThemeType,
+                          ProjectProgress,
+                          ResourceTags,
+                          Information,
+                          Case,
+                          AdvertResource)
+from media.caches import MediaCache
+from media.search import SearchIndex
+from media.list_index import ListIndex
+from media.tasks import update_related_items
+from comment.models import SOURCE_TYPE_DB
+from media.suggest import SuggestIndex
+
+logger = logging.getLogger(__name__)
+
+
+def run_safely(function, *args):
+    """
+    执行一项更新，出错时记录日志并继续执行其他更新
+    """
+    try:
+        function(*args)
+    except Exception:
+        logger.exception('Failed to run %s%r after commit.', function.__name__, args)
+
+
+def get_source_type(model_class):
+    for source_type, source_class in SOURCE_TYPE_DB.items():
+        if source_class is model_class:
+            return source_type
+
+
+@receiver(post_save, sender=Media)
+@receiver(post_save, sender=Information)
+@receiver(post_save, sender=Case)
+def source_saved(sender, instance, **kwargs):
+    source_id = instance.pk
+
+    def update_cache():
+        run_safely(MediaCache().update_source_cache, sender, source_id, instance)
+        run_safely(SearchIndex().update_document, sender, source_id, instance)
+        run_safely(ListIndex().update_document, sender, source_id, instance)
+        run_safely(update_related_items.delay, get_source_type(sender), source_id)
+        run_safely(SuggestIndex().update_source, sender, source_id, instance)
+    transaction.on_commit(update_cache)
+
+
+@receiver(post_delete, sender=Media)
+@receiver(post_delete, sender=Information)
+@receiver(post_delete, sender=Case)
+def source_deleted(sender, instance, **kwargs):
+    source_id = instance.pk
+
+    def update_cache():
+        run_safely(MediaCache().update_source_cache, sender, source_id)
+        run_safely(SearchIndex().update_document, sender, source_id)
+        run_safely(ListIndex().update_document, sender, source_id)
+        run_safely(update_related_items.delay, get_source_type(sender), source_id)
+        run_safely(SuggestIndex().update_source, sender, source_id)
+    transaction.on_commit(update_cache)
+
+
+@receiver(post_save, sender=ResourceTags)
+@receiver(post_delete, sender=ResourceTags)
+def resource_tag_changed(sender, instance, **kwargs):
+    tag_id = instance.pk
+
+    def update_cache():
+        run_safely(MediaCache().update_resource_tag_cache, tag_id)
+        run_safely(SearchIndex().update_tag, tag_id)
+        run_safely(SuggestIndex().update_tag, tag_id)
+    transaction.on_commit(update_cache)
+
+
+@receiver(post_save, sender=MediaType)
+@receiver(post_delete, sender=MediaType)
+@receiver(post_save, sender=ThemeType)
+@receiver(post_delete, sender=ThemeType)
+@receiver(post_save, sender=ProjectProgress)
+@receiver(post_delete, sender=ProjectProgress)
+def media_attribute_changed(sender, instance, **kwargs):
+    attribute_id = instance.pk
+    transaction.on_commit(
+        lambda: run_safely(MediaCache().update_media_attribute_cache, sender, attribute_id))
+
+
+@receiver(post_save, sender=AdvertResource)
+@receiver(post_delete, sender=AdvertResource)
+def advert_changed(sender, instance, **kwargs):
+    advert_id = instance.pk
+    transaction.on_commit(
+        lambda: run_safely(MediaCache().update_advert_cache, advert_id))
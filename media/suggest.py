@@ -0,0 +1,267 @@
+# -*- coding:utf8 -*-
+"""
+资源标题及资源标签的前缀联想：预先计算前缀，每个前缀一个有序集合
+
+索引：每个前缀（标题开头及标题中每个词开头，最长SUGGEST_MAX_PREFIX_LENGTH个字符）一个有序集合，
+     成员为"<ID>|<标题>"，分数为排序依据（媒体资源：热度，资讯及案例：浏览数，标签：使用该标签的资源数量）；
+     每条数据一个Hash记录其全部前缀及成员（用于修改、删除时移除）；
+     每个资源一个集合记录其标签（资源的标签变更时，增减相应标签的分数）
+查询：一次ZREVRANGE取出前N条，无需在查询时排序或扫描
+"""
+from __future__ import unicode_literals
+
+from django.core.exceptions import ObjectDoesNotExist
+
+from horizon.caches import BaseIndexCache
+from comment.models import SOURCE_TYPE_DB
+from media.models import Media, Information, Case, ResourceTags, get_tag_ids
+from media.search import TOKEN_RE, to_unicode
+
+# 前缀的最大长度（输入更长时按此长度截断查询）
+SUGGEST_MAX_PREFIX_LENGTH = 10
+# 联想结果的默认数量及最大数量
+SUGGEST_DEFAULT_COUNT = 10
+SUGGEST_MAX_COUNT = 20
+
+# 标签使用的类型名（资源使用资源类型）
+SUGGEST_TAG_KIND = 'tag'
+
+# 资源的排序字段
+SUGGEST_RANK_FIELDS = {
+    Media: 'temperature',
+    Information: 'read_count',
+    Case: 'read_count',
+}
+
+# 重建索引时每批写入的数据数量
+BUILD_BATCH_SIZE = 200
+
+
+def normalize_text(text):
+    """
+    转为小写，合并连续的空白字符
+    """
+    return ' '.join(to_unicode(text).lower().split())
+
+
+def get_prefixes(text):
+    """
+    标题开头及标题中每个词开头的全部前缀
+    """
+    text = normalize_text(text)
+    starts = set([0])
+    starts.update(match.start() for match in TOKEN_RE.finditer(text))
+    prefixes = set()
+    for start in starts:
+        for length in range(1, SUGGEST_MAX_PREFIX_LENGTH + 1):
+            prefix = text[start:start + length].strip()
+            if prefix:
+                prefixes.add(prefix)
+    return prefixes
+
+
+class SuggestIndex(BaseIndexCache):
+    namespace = 'suggest_index'
+
+    def get_index_namespace(self):
+        return self.namespace
+
+    def get_prefix_key(self, index_prefix, kind, prefix):
+        return '%s:%s:%s' % (index_prefix, kind, prefix)
+
+    def get_document_key(self, index_prefix, kind, item_id):
+        return '%s:doc:%s:%s' % (index_prefix, kind, item_id)
+
+    def get_tags_key(self, index_prefix, kind, item_id):
+        return '%s:tags:%s:%s' % (index_prefix, kind, item_id)
+
+    def get_member(self, item_id, text):
+        return '%s|%s' % (item_id, to_unicode(text))
+
+    def write_document(self, pipe, index_prefix, kind, item_id, text=None, score=0,
+                       old_document=None):
+        """
+        text为None时从索引中移除
+        old_document: 原有的{前缀: 成员}
+        """
+        document_key = self.get_document_key(index_prefix, kind, item_id)
+        for prefix, member in (old_document or {}).items():
+            pipe.zrem(self.get_prefix_key(index_prefix, kind, to_unicode(prefix)), member)
+        pipe.delete(document_key)
+        if text:
+            member = self.get_member(item_id, text)
+            prefixes = get_prefixes(text)
+            for prefix in prefixes:
+                pipe.execute_command(b'ZADD', self.get_prefix_key(index_prefix, kind, prefix),
+                                     score or 0, member)
+            if prefixes:
+                pipe.hmset(document_key, {prefix: member for prefix in prefixes})
+
+    def write_item(self, index_prefix, kind, item_id, text=None, score=0):
+        old_document = self.handle.hgetall(self.get_document_key(index_prefix, kind, item_id))
+        pipe = self.handle.pipeline()
+        self.write_document(pipe, index_prefix, kind, item_id, text, score, old_document)
+        pipe.execute()
+
+    def write_source_tags(self, index_prefix, kind, item_id, tag_ids):
+        """
+        更新资源的标签集合，并按增减的标签增减标签的分数（使用该标签的资源数量）
+        WATCH标签集合，同一资源并发更新时重试，不会重复增减
+        """
+        tags_key = self.get_tags_key(index_prefix, kind, item_id)
+        new_tag_ids = set(tag_ids)
+
+        def write_tags(pipe):
+            old_tag_ids = set(int(tag_id) for tag_id in pipe.smembers(tags_key))
+            deltas = {tag_id: 1 for tag_id in new_tag_ids - old_tag_ids}
+            deltas.update({tag_id: -1 for tag_id in old_tag_ids - new_tag_ids})
+            documents = {tag_id: pipe.hgetall(self.get_document_key(index_prefix,
+                                                                    SUGGEST_TAG_KIND, tag_id))
+                         for tag_id in deltas}
+            pipe.multi()
+            pipe.delete(tags_key)
+            if new_tag_ids:
+                pipe.sadd(tags_key, *new_tag_ids)
+            for tag_id, delta in deltas.items():
+                for prefix, member in documents[tag_id].items():
+                    pipe.execute_command(
+                        b'ZINCRBY',
+                        self.get_prefix_key(index_prefix, SUGGEST_TAG_KIND, to_unicode(prefix)),
+                        delta, member)
+
+        self.handle.transaction(write_tags, tags_key)
+
+    def write_source(self, index_prefix, model_class, item_id, instance=None):
+        kind = self.get_source_type(model_class)
+        self.write_item(index_prefix, kind, item_id, *self.get_source_item(model_class, instance))
+        self.write_source_tags(index_prefix, kind, item_id, self.get_source_tag_ids(instance))
+
+    def write_index_item(self, index_prefix, member):
+        kind, _, item_id = member.partition(':')
+        item_id = int(item_id)
+        if kind == SUGGEST_TAG_KIND:
+            return self.write_tag(index_prefix, item_id)
+        model_class = SOURCE_TYPE_DB[int(kind)]
+        instance = model_class.get_object(pk=item_id)
+        if isinstance(instance, ObjectDoesNotExist):
+            instance = None
+        elif isinstance(instance, Exception):
+            return
+        self.write_source(index_prefix, model_class, item_id, instance)
+
+    def get_source_type(self, model_class):
+        for source_type, source_class in SOURCE_TYPE_DB.items():
+            if source_class is model_class:
+                return source_type
+        raise ValueError('%s is not a searchable model.' % model_class.__name__)
+
+    def get_source_item(self, model_class, instance=None):
+        """
+        资源的(标题, 排序分数)，instance为None（已删除）或状态无效时为(None, 0)（从索引中移除）
+        """
+        if instance is None or instance.status != 1:
+            return None, 0
+        return instance.title, getattr(instance, SUGGEST_RANK_FIELDS[model_class])
+
+    def get_source_tag_ids(self, instance=None):
+        """
+        资源的标签，instance为None（已删除）或状态无效时为空（不计入标签的分数）
+        """
+        if instance is None or instance.status != 1:
+            return []
+        return get_tag_ids(instance)
+
+    def update_source(self, model_class, source_id, instance=None):
+        """
+        增量更新一个资源的标题及其标签的分数，instance为None（已删除）或状态无效时从索引中移除
+        """
+        return self.update_index_item(
+            '%s:%s' % (self.get_source_type(model_class), source_id),
+            lambda index_prefix: self.write_source(index_prefix, model_class, source_id,
+                                                   instance))
+
+    def get_tag_score(self, index_prefix, tag_id):
+        """
+        标签在索引中的分数（使用该标签的资源数量，由资源更新时增减），不在索引中时为0
+        """
+        document = self.handle.hgetall(self.get_document_key(index_prefix, SUGGEST_TAG_KIND,
+                                                             tag_id))
+        for prefix, member in document.items():
+            score = self.handle.zscore(
+                self.get_prefix_key(index_prefix, SUGGEST_TAG_KIND, to_unicode(prefix)), member)
+            return int(score or 0)
+        return 0
+
+    def write_tag(self, index_prefix, tag_id):
+        """
+        写入标签的名称（保留原有的分数），标签不存在时从索引中移除
+        """
+        tag = ResourceTags.get_object(pk=tag_id)
+        if isinstance(tag, ObjectDoesNotExist):
+            return self.write_item(index_prefix, SUGGEST_TAG_KIND, tag_id)
+        if isinstance(tag, Exception):
+            return
+        self.write_item(index_prefix, SUGGEST_TAG_KIND, tag_id, tag.name,
+                        self.get_tag_score(index_prefix, tag_id))
+
+    def update_tag(self, tag_id):
+        return self.update_index_item(
+            '%s:%s' % (SUGGEST_TAG_KIND, tag_id),
+            lambda index_prefix: self.write_tag(index_prefix, tag_id))
+
+    def write_index(self, index_prefix):
+        count = 0
+        tag_counts = {}
+        pipe = self.handle.pipeline(transaction=False)
+        for source_type, model_class in SOURCE_TYPE_DB.items():
+            instances = model_class.filter_objects()
+            if isinstance(instances, Exception):
+                return instances
+            rank_field = SUGGEST_RANK_FIELDS[model_class]
+            for ins in instances.iterator():
+                self.write_document(pipe, index_prefix, source_type, ins.pk, ins.title,
+                                    getattr(ins, rank_field))
+                tag_ids = get_tag_ids(ins)
+                if tag_ids:
+                    pipe.sadd(self.get_tags_key(index_prefix, source_type, ins.pk), *tag_ids)
+                for tag_id in tag_ids:
+                    tag_counts[tag_id] = tag_counts.get(tag_id, 0) + 1
+                count += 1
+                if count % BUILD_BATCH_SIZE == 0:
+                    pipe.execute()
+
+        tags = ResourceTags.filter_objects()
+        if isinstance(tags, Exception):
+            return tags
+        for tag in tags.iterator():
+            self.write_document(pipe, index_prefix, SUGGEST_TAG_KIND, tag.pk, tag.name,
+                                tag_counts.get(tag.pk, 0))
+            count += 1
+            if count % BUILD_BATCH_SIZE == 0:
+                pipe.execute()
+        pipe.execute()
+        return count
+
+    def suggest(self, source_type, keyword, count=SUGGEST_DEFAULT_COUNT):
+        """
+        联想：返回 {'resources': [{'id': x, 'title': x}, ...], 'tags': [{'id': x, 'name': x}, ...]}
+        """
+        prefix = normalize_text(keyword)[:SUGGEST_MAX_PREFIX_LENGTH].strip()
+        if not prefix:
+            return {'resources': [], 'tags': []}
+
+        index_prefix = self.ensure_index()
+        pipe = self.handle.pipeline(transaction=False)
+        pipe.zrevrange(self.get_prefix_key(index_prefix, source_type, prefix), 0, count - 1)
+        pipe.zrevrange(self.get_prefix_key(index_prefix, SUGGEST_TAG_KIND, prefix), 0, count - 1)
+        resource_members, tag_members = pipe.execute()
+
+        resources = []
+        for member in resource_members:
+            item_id, _, text = to_unicode(member).partition('|')
+            resources.append({'id': int(item_id), 'title': text})
+        tags = []
+        for member in tag_members:
+            item_id, _, text = to_unicode(member).partition('|')
+            tags.append({'id': int(item_id), 'name': text})
+        return {'resources': resources, 'tags': tags}
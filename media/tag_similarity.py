@@ -0,0 +1,141 @@
+# -*- coding:utf8 -*-
+"""
+标签相似度：用位图（Python的长整数）批量计算一个查询与全部资源的标签重合度
+
+每个标签一个位图，第i位表示第i个资源（按更新时间倒序）是否带有该标签；
+查询时把查询标签的位图按位相加（位切片加法器），一次得到全部资源的重合数量，
+每次运算都是对整个位图的按位与、异或，不需要逐个资源循环。
+Jaccard = 重合数量 / (资源标签数 + 查询标签数 - 重合数量)，按(重合数量, 资源标签数)分组计算。
+"""
+from __future__ import division, unicode_literals
+
+import binascii
+
+from media.models import get_tag_ids
+
+RANK_OVERLAP = 'overlap'
+RANK_JACCARD = 'jaccard'
+
+
+def iter_positions(bits):
+    """
+    位图中为1的位置（从低位到高位）
+    """
+    while bits:
+        low_bit = bits & -bits
+        yield low_bit.bit_length() - 1
+        bits ^= low_bit
+
+
+def positions_to_bits(positions):
+    """
+    位置列表转为位图（逐位或运算的开销与位图长度成正比，这里一次生成）
+    """
+    if not positions:
+        return 0
+    buf = bytearray((max(positions) >> 3) + 1)
+    for position in positions:
+        buf[position >> 3] |= 1 << (position & 7)
+    buf.reverse()
+    return int(binascii.hexlify(buf), 16)
+
+
+class TagMatrix(object):
+    """
+    资源-标签矩阵（按列保存为位图）
+    items: [(资源ID, [标签ID, ...]), ...]，位置越靠前排序时越优先
+    """
+    def __init__(self, items=()):
+        self.item_ids = []
+        self.positions = {}
+        tag_positions = {}
+        size_positions = {}
+        for item_id, tag_ids in items:
+            position = len(self.item_ids)
+            tag_ids = set(tag_ids)
+            self.item_ids.append(item_id)
+            self.positions[item_id] = position
+            for tag_id in tag_ids:
+                tag_positions.setdefault(tag_id, []).append(position)
+            size_positions.setdefault(len(tag_ids), []).append(position)
+        # {标签ID: 位图}
+        self.tag_bits = {tag_id: positions_to_bits(positions)
+                         for tag_id, positions in tag_positions.items()}
+        # {资源的标签数量: 位图}
+        self.size_bits = {size: positions_to_bits(positions)
+                          for size, positions in size_positions.items()}
+
+    @classmethod
+    def from_model(cls, model_class):
+        """
+        用数据库中的资源建立矩阵（按更新时间倒序，较新的资源排序时优先）
+        """
+        instances = model_class.filter_objects()
+        if isinstance(instances, Exception):
+            return cls()
+        instances = instances.only('id', 'tags').order_by('-updated', '-id').iterator()
+        return cls((ins.id, get_tag_ids(ins)) for ins in instances)
+
+    def __len__(self):
+        return len(self.item_ids)
+
+    def get_overlap_levels(self, tag_ids, exclude_id=None):
+        """
+        返回：{重合数量: 位图}（只包含重合数量大于0的资源）
+        """
+        # 位切片计数：planes[k]的第i位是第i个资源重合数量的第k个二进制位
+        planes = []
+        for tag_id in set(tag_ids):
+            carry = self.tag_bits.get(tag_id, 0)
+            for index, plane in enumerate(planes):
+                if not carry:
+                    break
+                planes[index], carry = plane ^ carry, plane & carry
+            if carry:
+                planes.append(carry)
+
+        candidates = 0
+        for plane in planes:
+            candidates |= plane
+        if exclude_id in self.positions:
+            candidates &= ~(1 << self.positions[exclude_id])
+
+        levels = {}
+        for count in range(1, 2 ** len(planes)):
+            bits = candidates
+            for index, plane in enumerate(planes):
+                bits &= plane if count >> index & 1 else ~plane
+                if not bits:
+                    break
+            if bits:
+                levels[count] = bits
+        return levels
+
+    def rank(self, tag_ids, exclude_id=None, top_k=20, method=RANK_OVERLAP):
+        """
+        按重合数量（或Jaccard）倒序返回前top_k个资源：[(资源ID, 分数), ...]
+        分数相同时位置靠前的资源在前；没有重合的资源不返回
+        """
+        levels = self.get_overlap_levels(tag_ids, exclude_id=exclude_id)
+        if method == RANK_JACCARD:
+            query_size = len(set(tag_ids))
+            groups = []
+            for count, bits in levels.items():
+                for size, size_bits in self.size_bits.items():
+                    if size >= count and bits & size_bits:
+                        score = count / (size + query_size - count)
+                        groups.append((score, bits & size_bits))
+        else:
+            groups = [(count, bits) for count, bits in levels.items()]
+
+        # 同一分数可能来自多个分组，合并后按位置取出
+        merged = {}
+        for score, bits in groups:
+            merged[score] = merged.get(score, 0) | bits
+        result = []
+        for score in sorted(merged, reverse=True):
+            for position in iter_positions(merged[score]):
+                result.append((self.item_ids[position], score))
+                if len(result) >= top_k:
+                    return result
+        return result
@@ -0,0 +1,95 @@
+# -*- coding:utf8 -*-
+from __future__ import absolute_import
+
+from celery import shared_task
+
+from comment.models import SOURCE_TYPE_DB
+from media.caches import RelevantCountSyncAction
+from media.search import SearchIndex, HOT_QUERY_TOP_N
+from media.suggest import SuggestIndex
+from media.related import RelatedItems, RELATED_CONFIG
+
+
+@shared_task
+def flush_relevant_count_to_db(batch_size=500):
+    """
+    定时把缓存中有变动的资源相关数量批量写回数据库
+    """
+    return RelevantCountSyncAction.flush_dirty_counts(batch_size=batch_size)
+
+
+@shared_task
+def reconcile_relevant_count(source_type=None):
+    """
+    定时校正资源相关数量（以点赞记录、评论及收藏数据为准）
+    """
+    drift_list = RelevantCountSyncAction.reconcile_counts(source_type=source_type)
+    if isinstance(drift_list, Exception):
+        raise drift_list
+    return len(drift_list)
+
+
+@shared_task
+def warm_hot_search_queries(top_n=HOT_QUERY_TOP_N):
+    """
+    定时预热各类资源的热门搜索结果
+    """
+    search_index = SearchIndex()
+    return sum(search_index.warm_hot_queries(source_type, top_n=top_n)
+               for source_type in SOURCE_TYPE_DB)
+
+
+@shared_task
+def build_search_index(source_type):
+    """
+    搜索索引尚未建立时（首次搜索时提交）全量建立
+    """
+    count = SearchIndex().build_if_missing(source_type)
+    if isinstance(count, Exception):
+        raise count
+    return count
+
+
+@shared_task
+def rebuild_suggest_index():
+    """
+    定时重建联想索引（刷新热度、浏览数及标签使用数量等排序数据）
+    """
+    count = SuggestIndex().build_index()
+    if isinstance(count, Exception):
+        raise count
+    return count
+
+
+@shared_task
+def update_related_items(source_type, source_id):
+    """
+    资源变更后重新计算受影响资源的相关资源
+    """
+    return RelatedItems().update_item(SOURCE_TYPE_DB[source_type], source_id)
+
+
+@shared_task
+def refresh_related_item(kind, source_id):
+    """
+    相关资源缓存不存在时计算单个资源的相关资源
+    """
+    result = RelatedItems().refresh_item(kind, source_id)
+    if isinstance(result, Exception):
+        raise result
+    return len(result['ids'])
+
+
+@shared_task
+def rebuild_related_items():
+    """
+    定时全量重新计算相关资源
+    """
+    related_items = RelatedItems()
+    count = 0
+    for kind in RELATED_CONFIG:
+        result = related_items.build(kind)
+        if isinstance(result, Exception):
+            raise result
+        count += result
+    return count
@@ -1,3 +1,438 @@
-from django.test import TestCase
+# -*- coding:utf8 -*-
+from __future__ import unicode_literals
 
-# Create your tests here.
+import datetime
+import json
+import random
+
+from django.conf import settings
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils.timezone import now
+
+from horizon import redis
+from horizon.caches import INDEX_RETIRE_TIMEOUT, generation_cache, get_redis_client
+from media.management.commands.bench_tag_similarity import rank_by_scan
+from media.models import ResourceOpinionRecord, Information, ResourceTags
+from media import caches as media_caches, tasks as media_tasks
+from media.caches import MediaCache, RelevantCountSyncAction
+from media.list_index import ListIndex, get_sort_score
+from media.related import RelatedItems
+from media.search import (SearchIndex,
+                          SEARCH_MAX_PREFIX_LENGTH,
+                          normalize_keywords,
+                          tokenize,
+                          tokenize_keyword)
+from media.suggest import SuggestIndex, SUGGEST_MAX_PREFIX_LENGTH, get_prefixes
+from media.tag_similarity import (TagMatrix,
+                                  RANK_OVERLAP,
+                                  RANK_JACCARD,
+                                  iter_positions,
+                                  positions_to_bits)
+
+
+class LikeCountTestCase(TestCase):
+    def test_get_like_count_dict(self):
+        created = now()
+        rows = [(1, 1, 10), (2, 1, 10), (3, 1, 10), (1, 1, 11), (2, 1, 11), (1, 2, 10)]
+        for index, (user_id, source_type, source_id) in enumerate(rows):
+            ResourceOpinionRecord.objects.create(
+                user_id=user_id, source_type=source_type, source_id=source_id,
+                created=created - datetime.timedelta(minutes=index))
+
+        self.assertEqual(ResourceOpinionRecord.get_like_count_dict(1), {10: 3, 11: 2})
+        self.assertEqual(ResourceOpinionRecord.get_like_count_dict(2), {10: 1})
+        self.assertEqual(ResourceOpinionRecord.get_like_count_dict(3), {})
+
+
+class TagMatrixTestCase(SimpleTestCase):
+    def test_positions_to_bits(self):
+        randomizer = random.Random(0)
+        self.assertEqual(positions_to_bits([]), 0)
+        for _ in range(100):
+            positions = randomizer.sample(range(300), randomizer.randint(1, 50))
+            bits = positions_to_bits(positions)
+            self.assertEqual(bits, sum(1 << position for position in positions))
+            self.assertEqual(list(iter_positions(bits)), sorted(positions))
+
+    def test_same_as_scan(self):
+        randomizer = random.Random(0)
+        for _ in range(30):
+            # 标签可能重复，也可能为空
+            items = [(item_id, [randomizer.randint(1, 40)
+                                for _ in range(randomizer.randint(0, 8))])
+                     for item_id in randomizer.sample(range(1, 10000),
+                                                      randomizer.randint(1, 300))]
+            matrix = TagMatrix(items)
+            self.assertEqual(len(matrix), len(items))
+            for _ in range(10):
+                tag_ids = [randomizer.randint(1, 45) for _ in range(randomizer.randint(0, 10))]
+                top_k = randomizer.choice([1, 5, 20, 1000])
+                exclude_id = randomizer.choice([None, items[0][0],
+                                                randomizer.choice(items)[0], -1])
+                scan_items = [item for item in items if item[0] != exclude_id]
+                for method in (RANK_OVERLAP, RANK_JACCARD):
+                    self.assertEqual(
+                        matrix.rank(tag_ids, exclude_id=exclude_id, top_k=top_k, method=method),
+                        rank_by_scan(scan_items, tag_ids, top_k, method))
+
+
+# 测试使用的Redis数据库（每个测试前后清空）
+TEST_REDIS_SETTINGS = dict(settings.REDIS_SETTINGS, db_set={'web': 15, 'admin': 15})
+
+
+@override_settings(REDIS_SETTINGS=TEST_REDIS_SETTINGS)
+class RedisTestCase(TestCase):
+    def setUp(self):
+        self.handle = get_redis_client()
+        try:
+            self.handle.flushdb()
+        except redis.ConnectionError:
+            self.skipTest('Redis is not available.')
+        generation_cache.clear()
+
+    def tearDown(self):
+        self.handle.flushdb()
+        generation_cache.clear()
+
+
+class RelevantCountTestCase(RedisTestCase):
+    def test_count_action(self):
+        information = Information.objects.create(title='资讯', content='', tags='[]')
+        cache = MediaCache()
+        self.assertEqual(cache.relevant_count_action(3, information.pk, column='like'), 1)
+        self.assertEqual(cache.relevant_count_action(3, information.pk, column='like',
+                                                     action='reduce'), 0)
+
+        # 初始化后计数器被淘汰
+        cache.counter.incr = lambda key, field, amount=1: None
+        self.assertIsInstance(cache.relevant_count_action(3, information.pk, column='like'),
+                              Exception)
+
+
+class ReconcileCountsTestCase(RedisTestCase):
+    def test_reconcile_counts(self):
+        information_list = [Information.objects.create(title='资讯%d' % index, content='',
+                                                       tags='[]')
+                            for index in range(3)]
+        for user_id in (1, 2):
+            ResourceOpinionRecord.objects.create(user_id=user_id, source_type=3,
+                                                 source_id=information_list[0].pk)
+        cache = MediaCache()
+        keys = [cache.get_source_relevant_count_key(3, ins.pk) for ins in information_list]
+        cache.counter.init_counts(keys[0], {'like': 5})
+        cache.counter.init_counts(keys[1], {'like': 3})
+
+        like_count_dict = ResourceOpinionRecord.get_like_count_dict
+
+        def get_like_count_dict(source_type, source_ids=None):
+            # 读取缓存后、统计前，另一个请求点赞
+            if information_list[1].pk in source_ids:
+                cache.counter.incr(keys[1], 'like')
+            return like_count_dict(source_type, source_ids=source_ids)
+
+        media_caches.RELEVANT_COUNT_DICT_CONFIG['like'] = get_like_count_dict
+        try:
+            drift_list = RelevantCountSyncAction.reconcile_counts(source_type=3, batch_size=2)
+        finally:
+            media_caches.RELEVANT_COUNT_DICT_CONFIG['like'] = like_count_dict
+        self.assertEqual(sorted((item['source_id'], item['cache'], item['expected'])
+                                for item in drift_list if item['column'] == 'like'),
+                         [(information_list[0].pk, 5, 2), (information_list[1].pk, 3, 0)])
+        self.assertEqual(cache.counter.get_counts(keys[0])['like'], 2)
+        # 并发的加减操作不被覆盖
+        self.assertEqual(cache.counter.get_counts(keys[1])['like'], 4)
+        self.assertEqual(Information.objects.get(pk=information_list[0].pk).like, 2)
+
+
+class TokenizeTestCase(SimpleTestCase):
+    def test_tokenize(self):
+        self.assertEqual(tokenize('电影 Hello,世界2018'),
+                         ['电', '影', '电影', 'h', 'he', 'hel', 'hell', 'hello',
+                          '世', '界', '世界', '2', '20', '201', '2018'])
+        long_word = 'a' * (SEARCH_MAX_PREFIX_LENGTH + 5)
+        self.assertEqual(tokenize(long_word)[-2:],
+                         [long_word[:SEARCH_MAX_PREFIX_LENGTH], long_word])
+        self.assertEqual(tokenize(b'\xe7\x94\xb5\xe5\xbd\xb1'), ['电', '影', '电影'])
+        self.assertEqual(tokenize(None), [])
+
+    def test_keyword_tokens_in_document(self):
+        # 查询的全部词都是文档的词，才能通过求交集找到文档
+        text = '北京国际电影节 Opening Night'
+        for keyword in ('北', '电影节', '国际电影', 'opening', 'NIGHT', 'open', 'n'):
+            self.assertTrue(set(tokenize_keyword(keyword)) <= set(tokenize(text)), keyword)
+        self.assertEqual(tokenize_keyword('电影电影'), ['影电', '电影'])
+
+    def test_normalize_keywords(self):
+        normalized = normalize_keywords('电影节 Opening')
+        self.assertEqual(normalized, 'opening 影节+电影')
+        for keywords in ('OPENING  电影节', ['电影节', 'opening', 'Opening'], '电影节 opening ,'):
+            self.assertEqual(normalize_keywords(keywords), normalized)
+        self.assertEqual(normalize_keywords(normalized), normalized)
+        self.assertEqual(normalize_keywords('， ,'), '')
+
+
+class SearchIndexTestCase(RedisTestCase):
+    def create_information(self, title):
+        return Information.objects.create(title=title, content='', tags='[]')
+
+    def search_ids(self, index, keyword):
+        return [item['resource_id'] for item in index.search(3, keyword)[0]]
+
+    def test_build_index(self):
+        first = self.create_information('第一篇')
+        second = self.create_information('第二篇')
+        index = SearchIndex()
+        self.assertFalse(index.update_document(Information, first.pk, first))
+
+        # 索引尚未建立：提交一次建立索引的任务，请求中不建立
+        scheduled = []
+
+        class BuildTask(object):
+            def delay(self, source_type):
+                scheduled.append(source_type)
+
+        build_task = media_tasks.build_search_index
+        media_tasks.build_search_index = BuildTask()
+        try:
+            self.assertIsInstance(index.search(3, '第一'), Exception)
+            self.assertIsInstance(index.cached_search(3, '第一'), Exception)
+        finally:
+            media_tasks.build_search_index = build_task
+        self.assertEqual(scheduled, [3])
+        self.assertEqual(index.build_if_missing(3), 2)
+        self.assertIsNone(index.build_if_missing(3))
+        self.assertEqual(index.cached_search(3, '第一')[1], 1)
+        old_prefix = index.get_index_prefix(3)
+
+        self.assertEqual(index.build_index(3), 2)
+        self.assertNotEqual(index.get_index_prefix(3), old_prefix)
+        # 旧索引延迟过期，仍使用旧代数的查询可以继续读取
+        old_keys = list(self.handle.scan_iter(match='%s:*' % old_prefix))
+        self.assertTrue(old_keys)
+        for key in old_keys:
+            self.assertTrue(0 < self.handle.ttl(key) <= INDEX_RETIRE_TIMEOUT)
+        self.assertEqual(self.handle.zrange(index.get_token_key(old_prefix, '第一'), 0, -1),
+                         [str(first.pk).encode('utf8')])
+        self.assertEqual(sorted(self.search_ids(index, '篇')), sorted([first.pk, second.pk]))
+
+        second.status = 0
+        self.assertTrue(index.update_document(Information, second.pk, second))
+        self.assertEqual(self.search_ids(index, '篇'), [first.pk])
+
+    def test_prefix_search(self):
+        first = self.create_information('iPhone12发布')
+        second = self.create_information('Opening Night')
+        index = SearchIndex()
+        index.build_index(3)
+        self.assertEqual(self.search_ids(index, 'iphone'), [first.pk])
+        self.assertEqual(self.search_ids(index, 'IPHONE12'), [first.pk])
+        self.assertEqual(self.search_ids(index, 'open'), [second.pk])
+        self.assertEqual(self.search_ids(index, 'phone'), [])
+
+    def test_update_during_build(self):
+        first = self.create_information('第一篇')
+        second = self.create_information('第二篇')
+        SearchIndex().build_index(3)
+        test_case = self
+
+        class BuildingSearchIndex(SearchIndex):
+            def write_index(self, prefix, source_type):
+                stale_tokens = self.get_instance_tokens(second)
+                count = super(BuildingSearchIndex, self).write_index(prefix, source_type)
+                # 建立期间资源变更：同时写入当前索引及正在建立的索引
+                first.title = '修改后'
+                first.save()
+                self.update_document(Information, first.pk, first)
+                test_case.assertEqual(test_case.search_ids(self, '修改后'), [first.pk])
+                second.title = '另一个'
+                second.save()
+                self.update_document(Information, second.pk, second)
+                # 全量建立时读取的旧数据晚于增量更新写入
+                self.write_item(prefix, second.pk, stale_tokens)
+                return count
+
+        index = BuildingSearchIndex()
+        self.assertEqual(index.build_index(3), 2)
+        self.assertEqual(self.search_ids(index, '修改后'), [first.pk])
+        self.assertEqual(self.search_ids(index, '另一个'), [second.pk])
+        self.assertEqual(self.search_ids(index, '篇'), [])
+        self.assertEqual(self.handle.keys('*building*') + self.handle.keys('*changed*'), [])
+
+    def test_search_during_update(self):
+        first = self.create_information('第一篇')
+        SearchIndex().build_index(3)
+        self.assertEqual(SearchIndex().cached_search(3, '第一')[1], 1)
+
+        class SearchingIndex(SearchIndex):
+            def write_item(self, prefix, source_id, token_scores):
+                # 写入索引前，其他请求执行查询
+                self.cached_search(3, '第一')
+                return super(SearchingIndex, self).write_item(prefix, source_id, token_scores)
+
+        first.status = 0
+        first.save()
+        SearchingIndex().update_document(Information, first.pk, first)
+        self.assertEqual(SearchIndex().cached_search(3, '第一'), ([], 0))
+
+    def test_build_lock(self):
+        index = SearchIndex()
+        index.build_wait_timeout = 0.1
+        lock = self.handle.lock(index.get_build_lock_key(index.get_index_namespace(3)),
+                                timeout=10)
+        self.assertTrue(lock.acquire(blocking=False))
+        try:
+            self.assertIsInstance(index.build_index(3), Exception)
+        finally:
+            lock.release()
+        self.assertEqual(index.build_index(3), 0)
+
+
+class PrefixTestCase(SimpleTestCase):
+    def test_get_prefixes(self):
+        prefixes = get_prefixes('Hello  世界 2018')
+        for prefix in ('h', 'hello', 'hello 世', '世', '世界', '世界 2018', '2', '2018'):
+            self.assertIn(prefix, prefixes)
+        for prefix in ('ello', '界', 'hello  ', ''):
+            self.assertNotIn(prefix, prefixes)
+        self.assertTrue(all(len(prefix) <= SUGGEST_MAX_PREFIX_LENGTH for prefix in prefixes))
+
+
+class SuggestIndexTestCase(RedisTestCase):
+    def suggest_titles(self, index, keyword):
+        return [item['title'] for item in index.suggest(3, keyword)['resources']]
+
+    def test_update_during_build(self):
+        first = Information.objects.create(title='第一篇', content='', tags='[]')
+        second = Information.objects.create(title='第二篇', content='', tags='[]')
+        index = SuggestIndex()
+        self.assertEqual(sorted(self.suggest_titles(index, '第')), ['第一篇', '第二篇'])
+
+        class BuildingSuggestIndex(SuggestIndex):
+            def write_index(self, index_prefix):
+                count = super(BuildingSuggestIndex, self).write_index(index_prefix)
+                first.title = '修改后'
+                first.save()
+                self.update_source(Information, first.pk, first)
+                second_id = second.pk
+                second.delete()
+                self.update_source(Information, second_id)
+                return count
+
+        self.assertEqual(BuildingSuggestIndex().build_index(), 2)
+        self.assertEqual(self.suggest_titles(index, '第'), [])
+        self.assertEqual(self.suggest_titles(index, '修改'), ['修改后'])
+
+    def suggest_tags(self, index, keyword):
+        return [item['name'] for item in index.suggest(3, keyword)['tags']]
+
+    def test_tag_score(self):
+        first = ResourceTags.objects.create(name='标签一')
+        second = ResourceTags.objects.create(name='标签二')
+        resource = Information.objects.create(title='资讯', content='',
+                                              tags=json.dumps([first.pk]))
+        Information.objects.create(title='资讯', content='', tags=json.dumps([first.pk]))
+        index = SuggestIndex()
+        self.assertEqual(self.suggest_tags(index, '标签'), ['标签一', '标签二'])
+
+        resource.tags = json.dumps([second.pk])
+        resource.save()
+        index.update_source(Information, resource.pk, resource)
+        index_prefix = index.ensure_index()
+        tag_key = index.get_prefix_key(index_prefix, 'tag', '标签')
+        self.assertEqual(index.handle.zscore(tag_key, '%s|标签一' % first.pk), 1)
+        self.assertEqual(index.handle.zscore(tag_key, '%s|标签二' % second.pk), 1)
+
+        resource.status = 2
+        resource.save()
+        index.update_source(Information, resource.pk, resource)
+        self.assertEqual(self.suggest_tags(index, '标签'), ['标签一', '标签二'])
+        self.assertEqual(index.handle.zscore(tag_key, '%s|标签二' % second.pk), 0)
+
+        # 改名时保留分数
+        first.name = '改名'
+        first.save()
+        index.update_tag(first.pk)
+        self.assertEqual(self.suggest_tags(index, '标签'), ['标签二'])
+        self.assertEqual(index.handle.zscore(index.get_prefix_key(index_prefix, 'tag', '改名'),
+                                             '%s|改名' % first.pk), 1)
+
+
+class SortScoreTestCase(SimpleTestCase):
+    def test_get_sort_score(self):
+        value = datetime.datetime(2018, 1, 2, 3, 4, 5, 600000)
+        self.assertEqual(get_sort_score(value), 1514862245.6)
+        later = value + datetime.timedelta(microseconds=1)
+        self.assertLess(get_sort_score(value), get_sort_score(later))
+        self.assertEqual(get_sort_score(datetime.date(2018, 1, 2)), 1514851200)
+        self.assertEqual(get_sort_score(None), 0)
+        self.assertEqual(get_sort_score(12), 12.0)
+
+
+class ListIndexTestCase(RedisTestCase):
+    def test_update_during_build(self):
+        updated = now()
+        ids = []
+        for index, column in enumerate([1, 1, 2]):
+            ins = Information.objects.create(title='资讯%d' % index, content='', tags='[]',
+                                             column=column)
+            Information.objects.filter(pk=ins.pk).update(
+                updated=updated - datetime.timedelta(minutes=index))
+            ids.append(ins.pk)
+        index = ListIndex()
+        self.assertEqual(index.filter_ids(3), (ids, 3))
+        self.assertEqual(index.filter_ids(3, filters={'column': 1}), (ids[:2], 2))
+        self.assertEqual(index.get_neighbor_ids(3, ids[1], 'column', 1), (ids[0], None))
+
+        class BuildingListIndex(ListIndex):
+            def write_index(self, prefix, source_type):
+                count = super(BuildingListIndex, self).write_index(prefix, source_type)
+                instance = Information.objects.get(pk=ids[2])
+                instance.column = 1
+                instance.save()
+                self.update_document(Information, instance.pk, instance)
+                return count
+
+        self.assertEqual(BuildingListIndex().build_index(3), 3)
+        self.assertEqual(index.filter_ids(3, filters={'column': 1})[1], 3)
+        self.assertEqual(index.filter_ids(3, filters={'column': 2}), ([], 0))
+        # 保存后更新时间最新
+        self.assertEqual(index.filter_ids(3)[0], [ids[2]] + ids[:2])
+
+
+class RelatedItemsTestCase(RedisTestCase):
+    def create_information(self, title, tags):
+        return Information.objects.create(title=title, content='', tags=json.dumps(tags))
+
+    def test_update_item(self):
+        first = self.create_information('资讯一', [1, 2])
+        second = self.create_information('资讯二', [2, 3])
+        third = self.create_information('资讯三', [4])
+        related = RelatedItems()
+        self.assertEqual(related.build('information'), 3)
+        self.assertEqual(related.get_related_ids('information', first.pk)[0], second.pk)
+
+        third.tags = json.dumps([1, 2])
+        third.save()
+        # 资源本身、受影响的资源、标签矩阵各一次查询
+        with self.assertNumQueries(3):
+            self.assertEqual(related.update_item(Information, third.pk), 3)
+        self.assertEqual(related.get_related_ids('information', first.pk)[0], third.pk)
+        self.assertEqual(related.get_related_ids('information', third.pk)[0], first.pk)
+
+    def test_cache_miss(self):
+        first = self.create_information('资讯一', [1])
+        second = self.create_information('资讯二', [1])
+        scheduled = []
+
+        class ScheduledRelatedItems(RelatedItems):
+            def schedule_refresh(self, kind, source_id):
+                scheduled.append((kind, source_id))
+
+        related = ScheduledRelatedItems()
+        self.assertEqual(related.get_related_ids('information', first.pk), [second.pk])
+        self.assertEqual(scheduled, [('information', first.pk)])
+        self.assertIsInstance(related.get_related_ids('information', 0), Exception)
+
+        related.refresh_item('information', first.pk)
+        self.assertEqual(related.get_related_ids('information', first.pk), [second.pk])
+        self.assertEqual(len(scheduled), 1)
@@ -30,6 +30,8 @@ urlpatterns = [
     url(r'^advert_resource_list/$', views.AdvertResourceList.as_view()),
     # 资源搜索
     url(r'^search_resource_list/$', views.SearchResourceAction.as_view()),
+    # 资源标题及标签联想
+    url(r'^suggest/$', views.SuggestResourceAction.as_view()),
 ]
 
 urlpatterns = format_suffix_patterns(urlpatterns)
@@ -1,5 +1,6 @@
 # -*- coding: utf8 -*-
 from rest_framework import generics
+from django.conf import settings
 from rest_framework.response import Response
 from rest_framework import status
 
@@ -28,7 +29,10 @@ from media.forms import (MediaTypeListForm,
                          RecommendMediaForm,
                          RelevantInformationListForm,
                          RelevantCaseListForm,
-                         SearchResourceActionForm)
+                         SearchResourceActionForm,
+                         SuggestResourceActionForm,
+                         InformationDetailForNextForm,
+                         CaseDetailForNextForm)
 from media.serializers import (MediaTypeListSerailizer,
                                ThemeTypeListSerializer,
                                ProgressListSerializer,
@@ -42,11 +46,55 @@ from media.serializers import (MediaTypeListSerailizer,
                                ResourceListSerializer)
 from comment.models import SOURCE_TYPE_DB
 from media.caches import MediaCache, SourceModelAction
+from media.search import SearchIndex
+from media.list_index import ListIndex, LIST_INDEX_CONFIG
+from media.related import RelatedItems
+from horizon.pagination import encode_cursor, decode_cursor
+from media.suggest import SuggestIndex, SUGGEST_DEFAULT_COUNT
 
-import re
 import copy
 
 
+def get_page_params(cld):
+    """
+    分页参数：(page_size, page_index)
+    """
+    page_size = min(cld.get('page_size') or settings.PAGE_SIZE, settings.MAX_PAGE_SIZE)
+    return page_size, cld.get('page_index') or 1
+
+
+def get_list_ids_by_cursor(source_type, filters, sort_key, page_size, cursor):
+    """
+    游标分页获取资源ID
+    返回：(资源ID列表, 下一页的游标（没有下一页时为None）)
+    """
+    last_position = decode_cursor(cursor, float)
+    if isinstance(last_position, Exception):
+        return last_position
+    if last_position[0] is None:
+        last_position = None
+    result = ListIndex().filter_ids_by_cursor(source_type, filters, sort_key,
+                                              count=page_size, cursor=last_position)
+    if isinstance(result, Exception):
+        return result
+    ids_list, next_position = result
+    return ids_list, encode_cursor(*next_position) if next_position else None
+
+
+def get_neighbor_id(source_type, source_id, column=None, direction='next'):
+    """
+    上一篇、下一篇的ID（按更新时间倒序，指定栏目时只在该栏目中查找），不存在时返回None
+    """
+    kwargs = {}
+    if column and column != RESOURCE_COLUMN_CONFIG['newest']:
+        kwargs = {'facet': 'column', 'value': column}
+    result = ListIndex().get_neighbor_ids(source_type, source_id, **kwargs)
+    if isinstance(result, Exception):
+        return result
+    previous_id, next_id = result
+    return previous_id if direction == 'previous' else next_id
+
+
 class MediaTypeList(APIView):
     """
     资源类型列表
@@ -156,37 +204,29 @@ class MediaList(APIView):
     """
     媒体资源列表
     """
-    def search_action(self, **search_kwargs):
-        media_search_dict = MediaCache().get_media_search_dict()
-        match_result = []
-        for media_id, media_detail in media_search_dict.items():
-            does_match = False
-            for kw, value in search_kwargs.items():
-                if media_detail.get(kw) != value:
-                    break
-            else:
-                does_match = True
-            if does_match:
-                match_result.append({'media_id': media_id,
-                                     'media_detail': media_detail})
-        return match_result
-
-    def get_media_detail_list(self, **kwargs):
-        sort_key = kwargs['sort'] if kwargs.get('sort') else 'updated'
-        pop_keys = ('sort', 'page_size', 'page_index')
-        for key in pop_keys:
-            if key in kwargs:
-                kwargs.pop(key)
-
-        match_media_list = self.search_action(**kwargs)
-        match_media_list = sorted(match_media_list,
-                                  key=lambda x: x['media_detail'][sort_key], reverse=True)
-
-        perfect_details = []
-        for item_media in match_media_list:
-            media_detail = MediaCache().get_media_detail_by_id(item_media['media_id'])
-            perfect_details.append(media_detail)
-        return perfect_details
+    def get_filters(self, **kwargs):
+        return {facet: int(kwargs[facet]) for facet in LIST_INDEX_CONFIG[Media]['facets']
+                if facet in kwargs}
+
+    def get_media_detail_list(self, page_size, page_index, cursor=None, **kwargs):
+        """
+        只获取当前页资源的详情
+        返回：(当前页的资源详情列表, 匹配总数)，游标分页时返回(当前页的资源详情列表, 下一页的游标)
+        """
+        filters = self.get_filters(**kwargs)
+        if cursor:
+            result = get_list_ids_by_cursor(1, filters, kwargs.get('sort'), page_size, cursor)
+        else:
+            start = page_size * (page_index - 1)
+            result = ListIndex().filter_ids(1, filters, kwargs.get('sort'),
+                                            start=start, end=start + page_size - 1)
+        if isinstance(result, Exception):
+            return result
+        media_ids, page_info = result
+        details = MediaCache().get_media_details_by_ids(media_ids)
+        if isinstance(details, Exception):
+            return details
+        return details, page_info
 
     def post(self, request, *args, **kwargs):
         """
@@ -197,14 +237,21 @@ class MediaList(APIView):
             return Response({'Detail': form.errors}, status=status.HTTP_400_BAD_REQUEST)
 
         cld = form.cleaned_data
-        details = self.get_media_detail_list(**cld)
-        if isinstance(details, Exception):
-            return Response({'Detail': details.args}, status=status.HTTP_400_BAD_REQUEST)
+        page_size, page_index = get_page_params(cld)
+        cld.pop('page_size', None)
+        cld.pop('page_index', None)
+        result = self.get_media_detail_list(page_size, page_index, **cld)
+        if isinstance(result, Exception):
+            return Response({'Detail': result.args}, status=status.HTTP_400_BAD_REQUEST)
+        details, page_info = result
 
         serializer = MediaListSerializer(data=details)
         if not serializer.is_valid():
             return Response({'Detail': serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
-        list_data = serializer.list_data(**cld)
+        if cld.get('cursor'):
+            list_data = serializer.cursor_data(page_info)
+        else:
+            list_data = serializer.page_data(page_info, page_size=page_size, page_index=page_index)
         if isinstance(list_data, Exception):
             return Response({'Detail': list_data.args}, status=status.HTTP_400_BAD_REQUEST)
         return Response(list_data, status=status.HTTP_200_OK)
@@ -243,43 +290,28 @@ class InformationList(APIView):
     """
     资讯列表
     """
-    def search_action(self, **search_kwargs):
-        information_search_dict = MediaCache().get_information_search_dict()
-        match_result = []
-        for information_id, information_detail in information_search_dict.items():
-            does_match = False
-            for kw, value in search_kwargs.items():
-                if information_detail.get(kw) != value:
-                    break
-            else:
-                does_match = True
-            if does_match:
-                match_result.append({'information_id': information_id,
-                                     'information_detail': information_detail})
-        return match_result
-
-    def get_information_detail_list(self, **kwargs):
-        sort_key = kwargs['sort'] if 'sort' in kwargs else 'updated'
+    def get_information_detail_list(self, page_size, page_index, cursor=None, **kwargs):
+        """
+        只获取当前页资讯的详情
+        返回：(当前页的资讯详情列表, 匹配总数)，游标分页时返回(当前页的资讯详情列表, 下一页的游标)
+        """
         # 最新发布（栏目）
         if kwargs.get('column') == RESOURCE_COLUMN_CONFIG['newest']:
             kwargs.pop('column')
-        pop_keys = ('page_size', 'page_index')
-        for key in pop_keys:
-            if key in kwargs:
-                kwargs.pop(key)
-
-        match_information_list = self.search_action(**kwargs)
-        match_information_list = sorted(
-            match_information_list,
-            key=lambda x: x['information_detail'][sort_key],
-            reverse=True
-        )
-
-        perfect_details = []
-        for item_media in match_information_list:
-            detail = MediaCache().get_information_detail_by_id(item_media['information_id'])
-            perfect_details.append(detail)
-        return perfect_details
+        filters = {facet: kwargs[facet] for facet in LIST_INDEX_CONFIG[Information]['facets']
+                   if facet in kwargs}
+        if cursor:
+            result = get_list_ids_by_cursor(3, filters, None, page_size, cursor)
+        else:
+            start = page_size * (page_index - 1)
+            result = ListIndex().filter_ids(3, filters, start=start, end=start + page_size - 1)
+        if isinstance(result, Exception):
+            return result
+        information_ids, page_info = result
+        details = MediaCache().get_information_details_by_ids(information_ids)
+        if isinstance(details, Exception):
+            return details
+        return details, page_info
 
     def post(self, request, *args, **kwargs):
         """
@@ -290,14 +322,21 @@ class InformationList(APIView):
             return Response({'Detail': form.errors}, status=status.HTTP_400_BAD_REQUEST)
 
         cld = form.cleaned_data
-        details = self.get_information_detail_list(**cld)
-        if isinstance(details, Exception):
-            return Response({'Detail': details.args}, status=status.HTTP_400_BAD_REQUEST)
+        page_size, page_index = get_page_params(cld)
+        cld.pop('page_size', None)
+        cld.pop('page_index', None)
+        result = self.get_information_detail_list(page_size, page_index, **cld)
+        if isinstance(result, Exception):
+            return Response({'Detail': result.args}, status=status.HTTP_400_BAD_REQUEST)
+        details, page_info = result
 
         serializer = InformationListSerializer(data=details)
         if not serializer.is_valid():
             return Response({'Detail': serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
-        list_data = serializer.list_data(**cld)
+        if cld.get('cursor'):
+            list_data = serializer.cursor_data(page_info)
+        else:
+            list_data = serializer.page_data(page_info, page_size=page_size, page_index=page_index)
         if isinstance(list_data, Exception):
             return Response({'Detail': list_data.args}, status=status.HTTP_400_BAD_REQUEST)
         return Response(list_data, status=status.HTTP_200_OK)
@@ -336,40 +375,28 @@ class CaseList(APIView):
     """
     案例列表
     """
-    def search_action(self, **search_kwargs):
-        case_search_dict = MediaCache().get_case_search_dict()
-        match_result = []
-        for case_id, case_detail in case_search_dict.items():
-            does_match = False
-            for kw, value in search_kwargs.items():
-                if case_detail.get(kw) != value:
-                    break
-            else:
-                does_match = True
-            if does_match:
-                match_result.append({'case_id': case_id,
-                                     'case_detail': case_detail})
-        return match_result
-
-    def get_case_detail_list(self, **kwargs):
-        sort_key = kwargs['sort'] if 'sort' in kwargs else 'updated'
+    def get_case_detail_list(self, page_size, page_index, cursor=None, **kwargs):
+        """
+        只获取当前页案例的详情
+        返回：(当前页的案例详情列表, 匹配总数)，游标分页时返回(当前页的案例详情列表, 下一页的游标)
+        """
         # 最新发布（栏目）
         if kwargs.get('column') == RESOURCE_COLUMN_CONFIG['newest']:
             kwargs.pop('column')
-        pop_keys = ('page_size', 'page_index')
-        for key in pop_keys:
-            if key in kwargs:
-                kwargs.pop(key)
-
-        match_case_list = self.search_action(**kwargs)
-        match_case_list = sorted(match_case_list,
-                                 key=lambda x: x['case_detail'][sort_key], reverse=True)
-
-        perfect_details = []
-        for item_case in match_case_list:
-            detail = MediaCache().get_case_detail_by_id(item_case['case_id'])
-            perfect_details.append(detail)
-        return perfect_details
+        filters = {facet: kwargs[facet] for facet in LIST_INDEX_CONFIG[Case]['facets']
+                   if facet in kwargs}
+        if cursor:
+            result = get_list_ids_by_cursor(2, filters, None, page_size, cursor)
+        else:
+            start = page_size * (page_index - 1)
+            result = ListIndex().filter_ids(2, filters, start=start, end=start + page_size - 1)
+        if isinstance(result, Exception):
+            return result
+        case_ids, page_info = result
+        details = MediaCache().get_case_details_by_ids(case_ids)
+        if isinstance(details, Exception):
+            return details
+        return details, page_info
 
     def post(self, request, *args, **kwargs):
         """
@@ -380,14 +407,21 @@ class CaseList(APIView):
             return Response({'Detail': form.errors}, status=status.HTTP_400_BAD_REQUEST)
 
         cld = form.cleaned_data
-        details = self.get_case_detail_list(**cld)
-        if isinstance(details, Exception):
-            return Response({'Detail': details.args}, status=status.HTTP_400_BAD_REQUEST)
+        page_size, page_index = get_page_params(cld)
+        cld.pop('page_size', None)
+        cld.pop('page_index', None)
+        result = self.get_case_detail_list(page_size, page_index, **cld)
+        if isinstance(result, Exception):
+            return Response({'Detail': result.args}, status=status.HTTP_400_BAD_REQUEST)
+        details, page_info = result
 
         serializer = CaseListSerializer(data=details)
         if not serializer.is_valid():
             return Response({'Detail': serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
-        list_data = serializer.list_data(**cld)
+        if cld.get('cursor'):
+            list_data = serializer.cursor_data(page_info)
+        else:
+            list_data = serializer.page_data(page_info, page_size=page_size, page_index=page_index)
         if isinstance(list_data, Exception):
             return Response({'Detail': list_data.args}, status=status.HTTP_400_BAD_REQUEST)
         return Response(list_data, status=status.HTTP_200_OK)
@@ -448,34 +482,23 @@ class AdvertResourceList(APIView):
         return Response(list_data, status=status.HTTP_200_OK)
 
 
-# 根据提供的标签列表，匹配相关度最高的资源
-def match_resource_action_with_tags(tags_dict, tags):
-    import json
-    if isinstance(tags, (str, unicode)):
-        try:
-            tags = json.loads(tags)
-        except Exception as e:
-            return e
-    else:
-        if not isinstance(tags, list):
-            return Exception('Params tags is incorrect.')
-
-    match_result = []
-    for tags_key, item_ids in tags_dict.items():
-        perfect_key = tags_key.split(':')
-        match_count = 0
-        for item2_key in tags:
-            if str(item2_key) in perfect_key:
-                match_count += 1
-        match_result.append({'tags_key': tags_key,
-                             'match_count': match_count})
-    match_result = sorted(match_result, key=lambda x: x['match_count'], reverse=True)
-    perfect_result = []
-    for match_item in match_result:
-        tags_key = match_item['tags_key']
-        perfect_result.extend(tags_dict[tags_key])
-
-    return perfect_result
+# 按匹配顺序批量获取前match_count个资源详情（跳过重复及已删除的资源）
+def get_matched_details_by_ids(details_function, ids_list, match_count, exclude_id=None):
+    perfect_ids = []
+    for item_id in ids_list:
+        if item_id != exclude_id and item_id not in perfect_ids:
+            perfect_ids.append(item_id)
+
+    details = []
+    index = 0
+    while len(details) < match_count and index < len(perfect_ids):
+        batch_ids = perfect_ids[index:index + match_count - len(details)]
+        index += len(batch_ids)
+        batch_details = details_function(batch_ids)
+        if isinstance(batch_details, Exception):
+            return batch_details
+        details.extend(batch_details)
+    return details[:match_count]
 
 
 class RelevantCaseForMedia(APIView):
@@ -483,27 +506,12 @@ class RelevantCaseForMedia(APIView):
     资源相关案例
     """
     def get_relevant_case_list(self, media_id):
-        media = MediaCache().get_media_by_id(media_id)
-        if isinstance(media, Exception):
-            return media
-
-        case_tags_key_dict = MediaCache().get_case_tags_dict()
-        match_result = match_resource_action_with_tags(case_tags_key_dict, media.tags)
+        match_result = RelatedItems().get_related_ids('media_case', media_id)
         if isinstance(match_result, Exception):
             return match_result
 
-        case_list = []
-        match_count = 2
-        count = 0
-        for case_id in match_result:
-            case = MediaCache().get_case_detail_by_id(case_id)
-            if isinstance(case, Exception):
-                continue
-            case_list.append(case)
-            count += 1
-            if count >= match_count:
-                break
-        return case_list[:2]
+        return get_matched_details_by_ids(MediaCache().get_case_details_by_ids,
+                                          match_result, match_count=2)
 
     def post(self, request, *args, **kwargs):
         form = RelevantCaseForMediaForm(request.data)
@@ -529,29 +537,12 @@ class RecommendMediaList(APIView):
     推荐资源
     """
     def get_recommend_media_list(self, media_id):
-        media = MediaCache().get_media_by_id(media_id)
-        if isinstance(media, Exception):
-            return media
-
-        media_tags_key_dict = MediaCache().get_media_tags_dict()
-        match_result = match_resource_action_with_tags(media_tags_key_dict, media.tags)
+        match_result = RelatedItems().get_related_ids('media', media_id)
         if isinstance(match_result, Exception):
             return match_result
 
-        media_list = []
-        match_count = 2
-        count = 0
-        for item_media_id in match_result:
-            if item_media_id == media_id:
-                continue
-            item_media = MediaCache().get_media_detail_by_id(item_media_id)
-            if isinstance(item_media, Exception):
-                continue
-            media_list.append(item_media)
-            count += 1
-            if count >= match_count:
-                break
-        return media_list[:2]
+        return get_matched_details_by_ids(MediaCache().get_media_details_by_ids,
+                                          match_result, match_count=2, exclude_id=media_id)
 
     def post(self, request, *args, **kwargs):
         form = RecommendMediaForm(request.data)
@@ -575,28 +566,13 @@ class RelevantInformationList(APIView):
     资讯：相关文章
     """
     def get_relevant_information_list(self, information_id, match_count=6):
-        information = MediaCache().get_information_by_id(information_id)
-        if isinstance(information, Exception):
-            return information
-
-        information_tags_key_dict = MediaCache().get_information_tags_dict()
-        match_result = match_resource_action_with_tags(information_tags_key_dict, information.tags)
+        match_result = RelatedItems().get_related_ids('information', information_id)
         if isinstance(match_result, Exception):
             return match_result
 
-        information_list = []
-        count = 0
-        for item_information_id in match_result:
-            if item_information_id == information_id:
-                continue
-            item_information = MediaCache().get_information_detail_by_id(item_information_id)
-            if isinstance(item_information, Exception):
-                continue
-            information_list.append(item_information)
-            count += 1
-            if count >= match_count:
-                break
-        return information_list[:match_count]
+        return get_matched_details_by_ids(MediaCache().get_information_details_by_ids,
+                                          match_result, match_count=match_count,
+                                          exclude_id=information_id)
 
     def post(self, request, *args, **kwargs):
         form = RelevantInformationListForm(request.data)
@@ -625,28 +601,13 @@ class RelevantCaseList(APIView):
     案例：相关文章
     """
     def get_relevant_case_list(self, case_id, match_count=6):
-        case = MediaCache().get_case_by_id(case_id)
-        if isinstance(case, Exception):
-            return case
-
-        case_tags_key_dict = MediaCache().get_case_tags_dict()
-        match_result = match_resource_action_with_tags(case_tags_key_dict, case.tags)
+        match_result = RelatedItems().get_related_ids('case', case_id)
         if isinstance(match_result, Exception):
             return match_result
 
-        case_list = []
-        count = 0
-        for item_case_id in match_result:
-            if item_case_id == case_id:
-                continue
-            item_case = MediaCache().get_case_detail_by_id(item_case_id)
-            if isinstance(item_case, Exception):
-                continue
-            case_list.append(item_case)
-            count += 1
-            if count >= match_count:
-                break
-        return case_list[:match_count]
+        return get_matched_details_by_ids(MediaCache().get_case_details_by_ids,
+                                          match_result, match_count=match_count,
+                                          exclude_id=case_id)
 
     def post(self, request, *args, **kwargs):
         form = RelevantCaseListForm(request.data)
@@ -672,26 +633,22 @@ class RelevantCaseList(APIView):
 
 class InformationDetailForNext(APIView):
     """
-    资讯：下一篇
+    资讯：下一篇（上一篇）
     """
-    def get_next_information_detail(self, information_id):
-        sort_order_list = MediaCache().get_information_sort_order_list()
-        try:
-            index = sort_order_list.index(information_id)
-        except Exception as e:
-            return e
-        if len(sort_order_list) <= index + 1:
-            return None
-        detail = MediaCache().get_information_detail_by_id(sort_order_list[index+1])
-        return detail
+    def get_next_information_detail(self, information_id, column=None, direction='next'):
+        neighbor_id = get_neighbor_id(3, information_id, column=column, direction=direction)
+        if isinstance(neighbor_id, Exception) or neighbor_id is None:
+            return neighbor_id
+        return MediaCache().get_information_detail_by_id(neighbor_id)
 
     def post(self, request, *args, **kwargs):
-        form = InformationDetailForm(request.data)
+        form = InformationDetailForNextForm(request.data)
         if not form.is_valid():
             return Response({'Detail': form.errors}, status=status.HTTP_400_BAD_REQUEST)
 
         cld = form.cleaned_data
-        detail = self.get_next_information_detail(cld['id'])
+        detail = self.get_next_information_detail(cld['id'], column=cld.get('column'),
+                                                  direction=cld.get('direction') or 'next')
         if isinstance(detail, Exception) or not detail:
             return Response({}, status=status.HTTP_200_OK)
         serializer = InformationDetailSerializer(data=detail)
@@ -702,26 +659,22 @@ class InformationDetailForNext(APIView):
 
 class CaseDetailForNext(APIView):
     """
-    案例：下一篇
+    案例：下一篇（上一篇）
     """
-    def get_next_case_detail(self, case_id):
-        sort_order_list = MediaCache().get_case_sort_order_list()
-        try:
-            index = sort_order_list.index(case_id)
-        except Exception as e:
-            return e
-        if len(sort_order_list) <= index + 1:
-            return None
-        detail = MediaCache().get_case_detail_by_id(sort_order_list[index+1])
-        return detail
+    def get_next_case_detail(self, case_id, column=None, direction='next'):
+        neighbor_id = get_neighbor_id(2, case_id, column=column, direction=direction)
+        if isinstance(neighbor_id, Exception) or neighbor_id is None:
+            return neighbor_id
+        return MediaCache().get_case_detail_by_id(neighbor_id)
 
     def post(self, request, *args, **kwargs):
-        form = CaseDetailForm(request.data)
+        form = CaseDetailForNextForm(request.data)
         if not form.is_valid():
             return Response({'Detail': form.errors}, status=status.HTTP_400_BAD_REQUEST)
 
         cld = form.cleaned_data
-        detail = self.get_next_case_detail(cld['id'])
+        detail = self.get_next_case_detail(cld['id'], column=cld.get('column'),
+                                           direction=cld.get('direction') or 'next')
         if isinstance(detail, Exception) or not detail:
             return Response({}, status=status.HTTP_200_OK)
         serializer = CaseDetailSerializer(data=detail)
@@ -734,53 +687,35 @@ class SearchResourceAction(APIView):
     """
     搜索资源
     """
-    search_dict_config = {
-        Media: MediaCache().get_media_search_dict(),
-        Information: MediaCache().get_information_search_dict(),
-        Case: MediaCache().get_case_search_dict(),
-    }
-    resource_detail_config = {
-        Media: MediaCache().get_media_detail_by_id,
-        Information: MediaCache().get_information_detail_by_id,
-        Case: MediaCache().get_case_detail_by_id,
+    resource_details_config = {
+        Media: MediaCache().get_media_details_by_ids,
+        Information: MediaCache().get_information_details_by_ids,
+        Case: MediaCache().get_case_details_by_ids,
     }
 
-    def search_action(self, search_dict, keywords):
-        if isinstance(keywords, (str, unicode)):
-            keywords = keywords.split()
-        match_result = []
-        re_com_list = [re.compile(keyword) for keyword in keywords]
-        for source_id in search_dict:
-            count = 0
-            for key2, value2 in search_dict[source_id].items():
-                if key2 == 'tags':
-                    value2 = ' '.join(value2)
-                for re_com in re_com_list:
-                    try:
-                        count += len(re_com.findall(value2))
-                    except:
-                        continue
-            if count > 0:
-                item_result = {'resource_id': source_id,
-                               'match_count': count}
-                match_result.append(item_result)
-
-        return sorted(match_result, key=lambda x: x['match_count'], reverse=True)
-
-    def get_search_resource_list(self, source_type, keywords):
+    def search_action(self, source_type, keywords, start=0, end=-1):
+        return SearchIndex().cached_search(source_type, keywords, start=start, end=end)
+
+    def get_search_resource_list(self, source_type, keywords, page_size, page_index):
+        """
+        只获取当前页资源的详情
+        返回：(当前页的资源详情列表, 匹配总数)
+        """
         model_class = SOURCE_TYPE_DB[source_type]
-        search_dict = self.search_dict_config[model_class]
-        match_result = self.search_action(search_dict, keywords)
-
-        detail_function = self.resource_detail_config[model_class]
-        perfect_result = []
-        for item in match_result:
-            resource_id = item['resource_id']
-            detail = detail_function(resource_id)
-            if model_class == Media:
+        start = page_size * (page_index - 1)
+        result = self.search_action(source_type, keywords, start=start, end=start + page_size - 1)
+        if isinstance(result, Exception):
+            return result
+        match_result, all_count = result
+
+        details_function = self.resource_details_config[model_class]
+        perfect_result = details_function([item['resource_id'] for item in match_result])
+        if isinstance(perfect_result, Exception):
+            return perfect_result
+        if model_class == Media:
+            for detail in perfect_result:
                 detail['picture'] = detail['picture_profile']
-            perfect_result.append(detail)
-        return perfect_result
+        return perfect_result, all_count
 
     def post(self, request, *args, **kwargs):
         form = SearchResourceActionForm(request.data)
@@ -788,12 +723,32 @@ class SearchResourceAction(APIView):
             return Response({'Detail': form.errors}, status=status.HTTP_400_BAD_REQUEST)
 
         cld = form.cleaned_data
-        details = self.get_search_resource_list(cld['source_type'], cld['keywords'])
+        page_size, page_index = get_page_params(cld)
+        result = self.get_search_resource_list(int(cld['source_type']), cld['keywords'],
+                                               page_size=page_size, page_index=page_index)
+        if isinstance(result, Exception):
+            return Response({'Detail': result.args}, status=status.HTTP_400_BAD_REQUEST)
+        details, all_count = result
         serializer = ResourceListSerializer(data=details)
         if not serializer.is_valid():
             return Response({'Detail': serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
-        list_data = serializer.list_data()
+        list_data = serializer.page_data(all_count, page_size=page_size, page_index=page_index)
         if isinstance(list_data, Exception):
             return Response({'Detail': list_data.args}, status=status.HTTP_400_BAD_REQUEST)
         return Response(list_data, status=status.HTTP_200_OK)
 
+
+
+class SuggestResourceAction(APIView):
+    """
+    资源标题及资源标签联想（输入提示）
+    """
+    def post(self, request, *args, **kwargs):
+        form = SuggestResourceActionForm(request.data)
+        if not form.is_valid():
+            return Response({'Detail': form.errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        cld = form.cleaned_data
+        result = SuggestIndex().suggest(int(cld['source_type']), cld['keyword'],
+                                        count=cld.get('count') or SUGGEST_DEFAULT_COUNT)
+        return Response(result, status=status.HTTP_200_OK)
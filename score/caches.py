@@ -3,8 +3,7 @@ from __future__ import unicode_literals
 import json
 import datetime
 
-from django.conf import settings
-from horizon import redis
+from horizon.caches import BaseCache
 from django.utils.timezone import now
 
 from score.models import (Score,
@@ -16,35 +15,13 @@ EXPIRES_24_HOURS = 24 * 60 * 60
 EXPIRES_10_HOURS = 10 * 60 * 60
 
 
-class ScoreCache(object):
-    def __init__(self):
-        pool = redis.ConnectionPool(host=settings.REDIS_SETTINGS['host'],
-                                    port=settings.REDIS_SETTINGS['port'],
-                                    db=settings.REDIS_SETTINGS['db_set']['web'])
-        self.handle = redis.Redis(connection_pool=pool)
-
+class ScoreCache(BaseCache):
     def get_score_id_key(self, user_id):
         return 'score:user_id:%s' % user_id
 
     def get_score_record_id_key(self, user_id):
         return 'score_record:user_id:%s' % user_id
 
-    def set_instance_to_cache(self, key, data):
-        self.handle.set(key, data)
-        self.handle.expire(key, EXPIRES_24_HOURS)
-
-    def get_instance_from_cache(self, key):
-        return self.handle.get(key)
-
-    def get_perfect_data(self, key, model_function, **kwargs):
-        data = self.get_instance_from_cache(key)
-        if not data:
-            data = model_function(**kwargs)
-            if isinstance(data, Exception):
-                return data
-            self.set_instance_to_cache(key, data)
-        return data
-
     # 获取score model
     def get_score_instance_by_user_id(self, user_id):
         key = self.get_score_id_key(user_id)
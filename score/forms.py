@@ -5,4 +5,6 @@ from horizon import forms
 class ScoreRecordListForm(forms.Form):
     page_index = forms.IntegerField(min_value=1, required=False)
     page_size = forms.IntegerField(min_value=1, required=False)
+    # 游标分页：第一页传"start"，之后传上一页返回的next_cursor
+    cursor = forms.CharField(max_length=128, required=False)
 
@@ -3,6 +3,7 @@ from rest_framework import generics
 from rest_framework.response import Response
 from rest_framework import status
 from django.utils.timezone import now
+from django.conf import settings
 
 from score.serializers import (ScoreSerializer,
                                ScoreRecordListSerializer)
@@ -10,6 +11,7 @@ from score.permissions import IsOwnerOrReadOnly
 from score.models import (Score, ScoreRecord)
 from score.forms import (ScoreRecordListForm,)
 from score.caches import ScoreCache
+from horizon.pagination import keyset_page
 
 import json
 
@@ -41,12 +43,27 @@ class ScoreRecordList(generics.GenericAPIView):
     def get_score_record_list(self, request):
         return ScoreCache().get_score_record_by_user_id(request.user.id)
 
+    def get_score_record_list_by_cursor(self, request, cursor, page_size):
+        instances = ScoreRecord.filter_objects(user_id=request.user.id)
+        if isinstance(instances, Exception):
+            return instances
+        return keyset_page(instances, cursor, page_size)
+
     def post(self, request, *args, **kwargs):
         form = ScoreRecordListForm(request.data)
         if not form.is_valid():
             return Response({'Detail': form.errors}, status=status.HTTP_400_BAD_REQUEST)
 
         cld = form.cleaned_data
+        if cld.get('cursor'):
+            page_size = min(cld.get('page_size') or settings.PAGE_SIZE, settings.MAX_PAGE_SIZE)
+            result = self.get_score_record_list_by_cursor(request, cld['cursor'], page_size)
+            if isinstance(result, Exception):
+                return Response({'Detail': result.args}, status=status.HTTP_400_BAD_REQUEST)
+            instances, next_cursor = result
+            serializer = ScoreRecordListSerializer(instances)
+            return Response(serializer.cursor_data(next_cursor), status=status.HTTP_200_OK)
+
         instances = self.get_score_record_list(request)
         serializer = ScoreRecordListSerializer(instances)
         data_list = serializer.list_data(**cld)
@@ -3,8 +3,7 @@ from __future__ import unicode_literals
 import json
 import datetime
 
-from django.conf import settings
-from horizon import redis
+from horizon.caches import BaseCache
 from django.utils.timezone import now
 
 from users.models import User, Role
@@ -15,13 +14,7 @@ EXPIRES_24_HOURS = 24 * 60 * 60
 EXPIRES_10_HOURS = 10 * 60 * 60
 
 
-class UserCache(object):
-    def __init__(self):
-        pool = redis.ConnectionPool(host=settings.REDIS_SETTINGS['host'],
-                                    port=settings.REDIS_SETTINGS['port'],
-                                    db=settings.REDIS_SETTINGS['db_set']['web'])
-        self.handle = redis.Redis(connection_pool=pool)
-
+class UserCache(BaseCache):
     def get_user_id_key(self, user_id):
         return 'user_instance_id:%s' % user_id
 